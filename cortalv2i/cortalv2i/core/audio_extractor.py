@@ -1,7 +1,10 @@
 import os
+import re
+import json
 import logging
 import subprocess
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +14,7 @@ class AudioExtractor:
 
     def extract_audio(self, video_path: str, format: str = 'mp3', bitrate: str = '192k',
                       progress_callback=None, start_time: float = None, end_time: float = None,
-                      chunk_index: int = None):
+                      chunk_index: int = None, output_filename: str = None):
         """
         Extract audio from video file, optionally in chunks.
 
@@ -23,23 +26,27 @@ class AudioExtractor:
             start_time: Start time in seconds for chunk extraction
             end_time: End time in seconds for chunk extraction
             chunk_index: Index of current chunk (for filename)
+            output_filename: Explicit output file name, overrides the chunk naming
         """
         try:
             video_name = Path(video_path).stem
-            if chunk_index is not None:
-                output_filename = f"{video_name}_chunk{chunk_index}.{format}"
-            else:
-                output_filename = f"{video_name}.{format}"
+            if output_filename is None:
+                if chunk_index is not None:
+                    output_filename = f"{video_name}_chunk{chunk_index}.{format}"
+                else:
+                    output_filename = f"{video_name}.{format}"
             output_path = os.path.join(self.output_dir, output_filename)
 
             # Base ffmpeg command
-            cmd = ['ffmpeg', '-y', '-i', video_path]
+            cmd = ['ffmpeg', '-y']
 
-            # Add time parameters if chunking
+            # Add time parameters if chunking, seeking on the input avoids decoding everything before start_time
             if start_time is not None and end_time is not None:
                 duration = end_time - start_time
                 cmd.extend(['-ss', str(start_time), '-t', str(duration)])
 
+            cmd.extend(['-i', video_path])
+
             # Add encoding parameters
             cmd.extend([
                 '-vn',  # No video
@@ -73,6 +80,123 @@ class AudioExtractor:
             logger.error(f"Error extracting audio: {str(e)}")
             raise
 
+    def detect_silence(self, video_path: str, noise_db: float = -40.0,
+                       min_silence: float = 0.5) -> List[Tuple[float, Optional[float]]]:
+        """
+        Find silent spans with ffmpeg's silencedetect filter.
+
+        Only the audio stream is decoded and nothing is encoded, so this runs much
+        faster than real time.
+
+        Returns:
+            List of (silence_start, silence_end) in seconds, silence_end is None when
+            the silence lasts until the end of the input
+        """
+        cmd = [
+            'ffmpeg', '-hide_banner', '-nostats',
+            '-i', video_path,
+            '-vn',
+            '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}',
+            '-f', 'null', '-'
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg silence detection failed with return code {result.returncode}")
+
+        silences = []
+        for line in result.stderr.splitlines():
+            start_match = re.search(r'silence_start: (-?[\d.]+)', line)
+            if start_match:
+                silences.append((max(0.0, float(start_match.group(1))), None))
+                continue
+            end_match = re.search(r'silence_end: ([\d.]+)', line)
+            if end_match and silences and silences[-1][1] is None:
+                silences[-1] = (silences[-1][0], float(end_match.group(1)))
+        return silences
+
+    @staticmethod
+    def get_speech_segments(silences: List[Tuple[float, Optional[float]]], duration: float,
+                            padding: float = 0.25, min_segment: float = 0.5,
+                            max_segment: float = 15 * 60) -> List[Tuple[float, float]]:
+        """
+        Turn silent spans into the non-silent segments worth encoding.
+
+        Segments are padded on both sides so words are not clipped, overlapping
+        segments are merged, segments shorter than min_segment are dropped and
+        segments longer than max_segment are split into equal parts.
+        """
+        spans = []
+        position = 0.0
+        for silence_start, silence_end in silences:
+            if silence_start > position:
+                spans.append((position, silence_start))
+            position = duration if silence_end is None else max(position, silence_end)
+        if position < duration:
+            spans.append((position, duration))
+
+        segments = []
+        for start, end in spans:
+            start, end = max(0.0, start - padding), min(duration, end + padding)
+            if segments and start <= segments[-1][1]:
+                segments[-1] = (segments[-1][0], end)
+            else:
+                segments.append((start, end))
+
+        result = []
+        for start, end in segments:
+            length = end - start
+            if length < min_segment:
+                continue
+            parts = max(1, int(-(-length // max_segment)))
+            step = length / parts
+            result.extend((start + i * step, start + (i + 1) * step) for i in range(parts))
+        return result
+
+    def find_speech_segments(self, video_path: str, noise_db: float = -40.0, min_silence: float = 0.5,
+                             padding: float = 0.25, max_segment: float = 15 * 60,
+                             duration: float = None) -> List[Tuple[float, float]]:
+        """Detect silence and return the (start, end) segments that contain sound"""
+        if duration is None:
+            duration = self._get_duration(video_path)
+        silences = self.detect_silence(video_path, noise_db=noise_db, min_silence=min_silence)
+        segments = self.get_speech_segments(silences, duration, padding=padding, max_segment=max_segment)
+
+        kept = sum(end - start for start, end in segments)
+        logger.info(f"Kept {len(segments)} non-silent segments ({kept:.1f}s of {duration:.1f}s) from {video_path}")
+        return segments
+
+    @staticmethod
+    def get_segment_filename(video_path: str, index: int, format: str) -> str:
+        return f"{Path(video_path).stem}_segment{index:04d}.{format}"
+
+    def write_segment_index(self, video_path: str, segments: List[Tuple[float, float]], format: str,
+                            duration: float, settings: dict = None) -> str:
+        """
+        Write a sidecar JSON file mapping every encoded segment back to source time.
+
+        Returns:
+            Path of the written index file
+        """
+        index = {
+            'source': video_path,
+            'duration': duration,
+            'settings': settings or {},
+            'segments': [
+                {
+                    'index': i,
+                    'file': self.get_segment_filename(video_path, i, format),
+                    'start': round(start, 3),
+                    'end': round(end, 3),
+                    'duration': round(end - start, 3)
+                }
+                for i, (start, end) in enumerate(segments, start=1)
+            ]
+        }
+        index_path = os.path.join(self.output_dir, f"{Path(video_path).stem}_segments.json")
+        with open(index_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        return index_path
+
     def _get_codec(self, format: str) -> str:
         """Map format to ffmpeg codec name."""
         codec_map = {
@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import logging
+import subprocess
+import concurrent.futures
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ClipExporter:
+    """
+    Cut short video clips out of a source.
+
+    By default clips are stream copied, so they start on the keyframe at or before
+    the requested start and cost little more than the bytes they contain. Set
+    accurate=True to re-encode and cut on the exact frame instead.
+    """
+    def __init__(self, output_dir: str, max_workers: int = 4):
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+
+    @staticmethod
+    def merge_ranges(ranges: Sequence[Tuple[float, float]],
+                     duration: Optional[float] = None) -> List[Tuple[float, float]]:
+        """Clamp ranges to the video and merge the ones that overlap"""
+        merged = []
+        for start, end in sorted((float(start), float(end)) for start, end in ranges):
+            start = max(0.0, start)
+            if duration is not None:
+                end = min(end, duration)
+            if end <= start:
+                continue
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @classmethod
+    def ranges_around(cls, timestamps: Sequence[float], before: float, after: float,
+                      duration: Optional[float] = None) -> List[Tuple[float, float]]:
+        """Build clip ranges around event timestamps"""
+        return cls.merge_ranges([(t - before, t + after) for t in timestamps], duration)
+
+    def detect_scene_changes(self, video_path: str, threshold: float = 0.3) -> List[float]:
+        """Timestamps of scene changes, using ffmpeg's scene score"""
+        cmd = [
+            'ffmpeg', '-hide_banner', '-nostats',
+            '-i', video_path,
+            '-an',
+            '-vf', f"select='gt(scene,{threshold})',showinfo",
+            '-f', 'null', '-'
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg scene detection failed with return code {result.returncode}")
+        return [float(match) for match in re.findall(r'pts_time:([\d.]+)', result.stderr)]
+
+    def get_clip_filename(self, video_path: str, index: int, start: float, end: float, format: str) -> str:
+        return f"{Path(video_path).stem}_clip{index:04d}_{start:.2f}-{end:.2f}.{format}"
+
+    def _cut_clip(self, video_path: str, start: float, end: float, output_path: str, accurate: bool) -> None:
+        # Seeking on the input jumps straight to the nearest keyframe instead of reading from the start
+        cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+               '-ss', f"{start:.3f}", '-i', video_path, '-t', f"{end - start:.3f}", '-map', '0']
+        if accurate:
+            cmd.extend(['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-c:a', 'aac'])
+        else:
+            cmd.extend(['-c', 'copy', '-avoid_negative_ts', 'make_zero'])
+        cmd.append(output_path)
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg clip export failed with return code {result.returncode}: {result.stderr.strip()}")
+
+    def export_clips(self, video_path: str, ranges: Sequence[Tuple[float, float]], accurate: bool = False,
+                     format: Optional[str] = None, progress_callback: Callable = None) -> List[dict]:
+        """
+        Export one clip per (start, end) range in seconds, clips are cut concurrently.
+
+        Returns:
+            List of clip records with index, file, start and end
+        """
+        format = format or Path(video_path).suffix.lstrip('.') or 'mp4'
+        clips = [
+            {'index': index, 'file': self.get_clip_filename(video_path, index, start, end, format),
+             'start': round(start, 3), 'end': round(end, 3)}
+            for index, (start, end) in enumerate(ranges, start=1)
+        ]
+
+        done = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._cut_clip, video_path, clip['start'], clip['end'],
+                                os.path.join(self.output_dir, clip['file']), accurate): clip
+                for clip in clips
+            }
+            for future in concurrent.futures.as_completed(futures):
+                clip = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error exporting clip {clip['file']}: {str(e)}")
+                    clip['error'] = str(e)
+                done += 1
+                if progress_callback:
+                    progress_callback(done / len(clips))
+
+        return clips
+
+    def split_into_segments(self, video_path: str, segment_seconds: float, format: Optional[str] = None) -> List[dict]:
+        """
+        Split the whole video into clips of roughly segment_seconds with the segment muxer.
+
+        This is a single stream copy pass, each clip ends on the first keyframe after
+        its nominal end.
+        """
+        format = format or Path(video_path).suffix.lstrip('.') or 'mp4'
+        stem = Path(video_path).stem
+        pattern = os.path.join(self.output_dir, f"{stem}_segment%04d.{format}")
+        list_path = os.path.join(self.output_dir, f"{stem}_segments.csv")
+        cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+               '-i', video_path, '-map', '0', '-c', 'copy',
+               '-f', 'segment', '-segment_time', str(segment_seconds),
+               '-reset_timestamps', '1', '-segment_list', list_path, pattern]
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg segmenting failed with return code {result.returncode}: {result.stderr.strip()}")
+
+        # The segment list holds the real, keyframe aligned boundaries: file,start,end
+        clips = []
+        with open(list_path, 'r') as f:
+            for index, line in enumerate(f, start=1):
+                file_name, start, end = line.strip().rsplit(',', 2)
+                clips.append({'index': index, 'file': file_name, 'start': float(start), 'end': float(end)})
+        os.remove(list_path)
+        return clips
+
+    def write_clip_index(self, video_path: str, clips: List[dict], settings: dict = None) -> str:
+        """Write a sidecar JSON file mapping every clip back to source time"""
+        index_path = os.path.join(self.output_dir, f"{Path(video_path).stem}_clips.json")
+        with open(index_path, 'w') as f:
+            json.dump({'source': video_path, 'settings': settings or {}, 'clips': clips}, f, indent=2)
+        return index_path
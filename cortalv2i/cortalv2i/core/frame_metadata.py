@@ -0,0 +1,107 @@
+import os
+import glob
+import logging
+import threading
+from typing import List, Optional
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, CSV is written instead
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    'frame_index': 'int64',
+    'timestamp': 'float64',
+    'level': 'string',
+    'output_path': 'string',
+    'bytes': 'int64',
+    'width': 'int64',
+    'height': 'int64',
+    'sharpness': 'float64',
+    'brightness': 'float64',
+    'contrast': 'float64',
+    'clipped': 'float64',
+}
+
+class FrameMetadataWriter:
+    """
+    Columnar sidecar with one row per written frame.
+
+    Rows are buffered and flushed in batches, to Parquet when pyarrow is installed
+    and to CSV otherwise. Each chunk writes its own part file, so chunks processed
+    in parallel or on other machines never share a file; load_frame_metadata
+    reads all parts of a source back as one DataFrame.
+    """
+    def __init__(self, path_base: str, format: str = 'auto', batch_size: int = 500,
+                 extra_columns: Optional[dict] = None):
+        if format == 'auto':
+            format = 'parquet' if pq else 'csv'
+        if format == 'parquet' and not pq:
+            raise ImportError("Writing Parquet metadata requires pyarrow, install it or use format 'csv'")
+        self.format = format
+        self.path = f"{path_base}.{format}"
+        self.batch_size = batch_size
+        self.columns = dict(COLUMNS, **(extra_columns or {}))
+        self._rows: List[dict] = []
+        self._lock = threading.Lock()
+        self._parquet_writer = None
+        self._header_written = False
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def add(self, record: dict) -> None:
+        with self._lock:
+            self._rows.append(record)
+            if len(self._rows) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._rows:
+            return
+        frame = pd.DataFrame(self._rows, columns=list(self.columns)).astype(self.columns)
+        self._rows = []
+
+        if self.format == 'parquet':
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a', header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+                self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def load_frame_metadata(metadata_dir: str) -> pd.DataFrame:
+    """Read every metadata part of a source into one DataFrame ordered by frame"""
+    parts = []
+    for path in sorted(glob.glob(os.path.join(metadata_dir, 'frames-part-*'))):
+        if path.endswith('.parquet'):
+            parts.append(pd.read_parquet(path))
+        elif path.endswith('.csv'):
+            parts.append(pd.read_csv(path))
+    if not parts:
+        return pd.DataFrame(columns=list(COLUMNS))
+    return pd.concat(parts, ignore_index=True).sort_values(['frame_index', 'level'], ignore_index=True)
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+from typing import Dict, Optional
+
+class FrameQualityGate:
+    """
+    Cheap blur and exposure checks run on a small grayscale copy of each frame.
+
+    Selection modes within each sampling window:
+        first: score only the sampled frame and drop it if it fails
+        first_acceptable: defer to the next frame in the window that passes
+        sharpest: score every frame in the window and keep the sharpest that passes
+    """
+    SELECTION_MODES = ('first', 'first_acceptable', 'sharpest')
+
+    def __init__(self, min_sharpness: Optional[float] = None,
+                 min_brightness: Optional[float] = None,
+                 max_brightness: Optional[float] = None,
+                 max_clipped: Optional[float] = None,
+                 selection: str = 'first',
+                 analysis_width: int = 160):
+        if selection not in self.SELECTION_MODES:
+            raise ValueError(f"Unknown quality selection mode: {selection}")
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.selection = selection
+        self.analysis_width = analysis_width
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> Optional['FrameQualityGate']:
+        """Build a gate from the optional frames.quality config section"""
+        if not config:
+            return None
+        return cls(**config)
+
+    def score(self, frame: np.ndarray) -> Dict[str, float]:
+        """
+        Compute quality scores for a BGR frame.
+
+        Returns:
+            sharpness: variance of the Laplacian, low values mean blur
+            brightness: mean gray level (0-255)
+            contrast: standard deviation of the gray level
+            clipped: fraction of pixels that are crushed black or blown out
+        """
+        height, width = frame.shape[:2]
+        if width > self.analysis_width:
+            size = (self.analysis_width, max(1, round(height * self.analysis_width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+        mean, stddev = cv2.meanStdDev(gray)
+        clipped = np.count_nonzero((gray <= 5) | (gray >= 250)) / gray.size
+        return {
+            'sharpness': float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+            'brightness': float(mean[0][0]),
+            'contrast': float(stddev[0][0]),
+            'clipped': float(clipped)
+        }
+
+    def accept(self, scores: Dict[str, float]) -> bool:
+        """Check scores against the configured thresholds"""
+        if self.min_sharpness is not None and scores['sharpness'] < self.min_sharpness:
+            return False
+        if self.min_brightness is not None and scores['brightness'] < self.min_brightness:
+            return False
+        if self.max_brightness is not None and scores['brightness'] > self.max_brightness:
+            return False
+        if self.max_clipped is not None and scores['clipped'] > self.max_clipped:
+            return False
+        return True
@@ -0,0 +1,253 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import psutil
+except ImportError:  # /proc and os.getloadavg are used instead, which Windows does not have
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+def get_rss_bytes() -> Optional[int]:
+    """Resident set size of the current process, None if unknown"""
+    if psutil:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return None
+
+def get_total_memory_bytes() -> int:
+    """Physical memory of the machine, 0 if unknown"""
+    if psutil:
+        return psutil.virtual_memory().total
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def get_cpu_utilisation() -> Optional[float]:
+    """Machine wide CPU utilisation in [0, 1] (approximated by load average without psutil), None if unknown"""
+    if psutil:
+        return psutil.cpu_percent(interval=None) / 100.0
+    try:
+        return min(os.getloadavg()[0] / (os.cpu_count() or 1), 1.0)
+    except (OSError, AttributeError):
+        return None
+
+class AdjustableLimiter:
+    """Semaphore whose limit can be changed while it is in use"""
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._active = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def has_capacity(self) -> bool:
+        return self._active < self._limit
+
+    def set_limit(self, limit: int) -> None:
+        with self._condition:
+            self._limit = limit
+            self._condition.notify_all()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._active >= self._limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+class ConcurrencyGovernor:
+    """
+    Run-wide controller for the number of active chunk workers and encoder threads.
+
+    A monitor thread samples RSS, in-flight frame bytes, CPU utilisation and write
+    throughput and moves both limits within [min, max]. Decoders call
+    wait_for_memory() before buffering a frame so decoding pauses while the
+    process is above the hard memory ceiling and encoders can drain the backlog.
+
+    When CPU or memory usage cannot be measured both limits stay at their minimum,
+    since the governor could otherwise only ever scale up.
+    """
+    def __init__(self, min_workers: int = 1, max_workers: Optional[int] = None,
+                 min_encoders: int = 1, max_encoders: Optional[int] = None,
+                 memory_limit_mb: Optional[float] = None, memory_soft_ratio: float = 0.8,
+                 cpu_target: float = 0.85, interval: float = 1.0):
+        cpu_count = os.cpu_count() or 1
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers or cpu_count)
+        self.min_encoders = max(1, min_encoders)
+        self.max_encoders = max(self.min_encoders, max_encoders or cpu_count)
+
+        # Default hard ceiling leaves a fifth of physical memory to the rest of the system
+        if memory_limit_mb:
+            self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        else:
+            self.memory_limit = int(get_total_memory_bytes() * 0.8)
+        self.memory_soft_ratio = memory_soft_ratio
+        self.cpu_target = cpu_target
+        self.interval = interval
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.metrics_available = bool(self.memory_limit) and get_rss_bytes() is not None \
+            and get_cpu_utilisation() is not None
+        if self.metrics_available:
+            self.workers = AdjustableLimiter(min(4, self.max_workers))
+            self.encoders = AdjustableLimiter(min(4, self.max_encoders))
+        else:
+            self.logger.warning(
+                f"CPU and memory usage cannot be measured on this system (install psutil), "
+                f"keeping {self.min_workers} workers and {self.min_encoders} encoders"
+            )
+            self.workers = AdjustableLimiter(self.min_workers)
+            self.encoders = AdjustableLimiter(self.min_encoders)
+
+        self._lock = threading.Lock()
+        self._memory_condition = threading.Condition(self._lock)
+        self._in_flight_bytes = 0
+        self._bytes_written = 0
+        self._last_throughput = 0.0
+        self._last_action = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> 'ConcurrencyGovernor':
+        """Build a governor from the optional 'concurrency' config section"""
+        return cls(**(config or {}))
+
+    @property
+    def in_flight_bytes(self) -> int:
+        return self._in_flight_bytes
+
+    def start(self) -> 'ConcurrencyGovernor':
+        if self._thread is None and self.metrics_available:
+            self._thread = threading.Thread(target=self._monitor, name='concurrency-governor', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @contextmanager
+    def worker_slot(self):
+        """Hold one of the active chunk worker slots"""
+        self.workers.acquire()
+        try:
+            yield
+        finally:
+            self.workers.release()
+
+    @contextmanager
+    def encoder_slot(self):
+        """Hold one of the active encoder thread slots"""
+        self.encoders.acquire()
+        try:
+            yield
+        finally:
+            self.encoders.release()
+
+    def _over_memory_limit(self) -> bool:
+        rss = get_rss_bytes()
+        return bool(self.memory_limit) and rss is not None and rss >= self.memory_limit
+
+    def wait_for_memory(self) -> None:
+        """Block a decoder while above the memory ceiling and there are frames left to drain"""
+        with self._memory_condition:
+            while self._in_flight_bytes > 0 and self._over_memory_limit():
+                self._memory_condition.wait(timeout=self.interval)
+
+    def frame_buffered(self, nbytes: int) -> None:
+        """Account for a decoded frame waiting to be encoded"""
+        with self._lock:
+            self._in_flight_bytes += nbytes
+
+    def frame_released(self, nbytes: int, bytes_written: int = 0) -> None:
+        """Account for a frame that has been encoded (or dropped)"""
+        with self._memory_condition:
+            self._in_flight_bytes -= nbytes
+            self._bytes_written += bytes_written
+            self._memory_condition.notify_all()
+
+    def _monitor(self) -> None:
+        if psutil:
+            psutil.cpu_percent(interval=None)  # first call only primes the counter
+
+        while not self._stop.wait(self.interval):
+            try:
+                self._adjust()
+            except Exception as e:
+                self.logger.debug(f"Error adjusting concurrency: {str(e)}")
+
+    def _adjust(self) -> None:
+        with self._lock:
+            bytes_written, self._bytes_written = self._bytes_written, 0
+            in_flight = self._in_flight_bytes
+        throughput = bytes_written / self.interval
+        cpu = get_cpu_utilisation()
+        rss = get_rss_bytes()
+        memory_ratio = rss / self.memory_limit if self.memory_limit else 0.0
+
+        workers, encoders = self.workers.limit, self.encoders.limit
+        action = None
+
+        if memory_ratio >= self.memory_soft_ratio:
+            # Shed decoders first, they are what produces the buffered frames
+            if workers > self.min_workers:
+                workers -= 1
+                action = 'workers-'
+            elif encoders > self.min_encoders:
+                encoders -= 1
+                action = 'encoders-'
+        elif self._last_action == 'encoders+' and throughput <= self._last_throughput * 1.05:
+            # More encoders did not write any faster, the disk is the bottleneck
+            encoders = max(self.min_encoders, encoders - 1)
+            action = 'encoders-'
+        elif cpu < self.cpu_target:
+            if in_flight > 0 and encoders < self.max_encoders:
+                encoders += 1
+                action = 'encoders+'
+            elif workers < self.max_workers:
+                workers += 1
+                action = 'workers+'
+        elif cpu > min(self.cpu_target + 0.1, 1.0) and workers > self.min_workers:
+            workers -= 1
+            action = 'workers-'
+
+        if action:
+            self.logger.debug(
+                f"{action}: workers={workers} encoders={encoders} cpu={cpu:.0%} "
+                f"rss={rss / 2**20:.0f}MB in_flight={in_flight / 2**20:.0f}MB "
+                f"write={throughput / 2**20:.1f}MB/s"
+            )
+            self.workers.set_limit(workers)
+            self.encoders.set_limit(encoders)
+
+        self._last_action = action
+        self._last_throughput = throughput
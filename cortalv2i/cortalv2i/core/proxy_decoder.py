@@ -0,0 +1,107 @@
+import cv2
+import subprocess
+import threading
+from collections import deque
+from typing import Iterable, Iterator, Optional, Tuple
+import numpy as np
+
+class ProxyReader:
+    """
+    Low resolution copy of a frame range, decoded and scaled by ffmpeg.
+
+    Scaling happens inside the decoder pipeline and only small BGR frames cross
+    the pipe, so analysing every frame of a 4K source costs a fraction of a full
+    resolution decode. The reader has the cv2.VideoCapture read()/release()
+    interface, so VideoProcessor._select_frames can consume it directly.
+
+    A decode that fails is not mistaken for the end of the range: read() and
+    release() raise RuntimeError with the end of ffmpeg's error output when it
+    exits with an error, or ends without producing a single frame.
+    """
+    def __init__(self, video_path: str, start_frame: int, end_frame: int, fps: float,
+                 source_size: Tuple[int, int], width: int = 320):
+        source_width, source_height = source_size
+        self.width = min(width, source_width)
+        # Even height keeps every pixel format happy
+        self.height = max(2, round(source_height * self.width / source_width / 2) * 2)
+        self._frame_bytes = self.width * self.height * 3
+
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin']
+        if start_frame > 0:
+            # Input seeking starts at the keyframe before the range and drops everything
+            # earlier than this point; half a frame of margin absorbs timestamp rounding
+            cmd.extend(['-ss', f"{(start_frame - 0.5) / fps:.6f}"])
+        cmd.extend([
+            '-i', video_path,
+            '-an', '-sn',
+            '-frames:v', str(end_frame - start_frame),
+            '-vf', f"scale={self.width}:{self.height}:flags=fast_bilinear",
+            '-vsync', 'passthrough',
+            '-pix_fmt', 'bgr24', '-f', 'rawvideo', 'pipe:'
+        ])
+        self._frames_read = 0
+        self._checked = False
+        self._stderr_tail = deque(maxlen=20)
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                         bufsize=self._frame_bytes * 4)
+        # Drained in the background so a chatty decoder can never block on a full stderr pipe
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, name='proxy-stderr', daemon=True)
+        self._stderr_thread.start()
+
+    def _drain_stderr(self) -> None:
+        for line in self._process.stderr:
+            self._stderr_tail.append(line.decode('utf-8', errors='replace').rstrip())
+
+    def _check_exit(self) -> None:
+        """Raise if ffmpeg stopped on its own because of an error"""
+        if self._checked:
+            return
+        self._checked = True
+        returncode = self._process.wait()
+        self._stderr_thread.join()
+        if returncode != 0 or self._frames_read == 0:
+            details = '\n'.join(self._stderr_tail) or 'no error output'
+            raise RuntimeError(f"Proxy decode failed after {self._frames_read} frames "
+                               f"(ffmpeg exit code {returncode}): {details}")
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        data = self._process.stdout.read(self._frame_bytes)
+        if len(data) < self._frame_bytes:
+            self._check_exit()
+            return False, None
+        self._frames_read += 1
+        return True, np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def release(self) -> None:
+        if self._process.poll() is None:
+            # Stopped early by the caller, the exit code of a killed decoder means nothing
+            self._checked = True
+            self._process.kill()
+        self._process.stdout.close()
+        self._process.wait()
+        self._stderr_thread.join()
+        self._check_exit()
+
+def fetch_frames(cap, frame_indices: Iterable[int], max_gap: int = 30) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Read specific frames from a capture at full resolution.
+
+    Short gaps are skipped with grab(), which decodes without converting the
+    frame. Longer gaps seek, which jumps to the keyframe before the target and
+    decodes forward from there.
+    """
+    position = None
+    for index in frame_indices:
+        if position is None or index < position or index - position > max_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            position = index
+        while position < index:
+            if not cap.grab():
+                return
+            position += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield index, frame
@@ -1,103 +1,334 @@
 import cv2
 import concurrent.futures
+import logging
 import os
-from typing import Callable, Optional
+import queue
+import threading
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import numpy as np
 
+from .frame_metadata import FrameMetadataWriter
+from .frame_quality import FrameQualityGate
+from .governor import ConcurrencyGovernor
+from .proxy_decoder import ProxyReader, fetch_frames
+from .video_chunker import VideoChunker
+
+logger = logging.getLogger(__name__)
+
+# Sentinel placed on a chunk queue once its producer has finished
+_END_OF_CHUNK = object()
+
 class VideoProcessor:
     def __init__(self, frames_dir: Optional[str] = None,
                  audio_dir: Optional[str] = None,
-                 max_workers: int = 4):
+                 max_workers: int = 4,
+                 governor: Optional[ConcurrencyGovernor] = None,
+                 metadata_writer: Optional[FrameMetadataWriter] = None):
         self.frames_dir = frames_dir
         self.audio_dir = audio_dir
         self.max_workers = max_workers
+        self.governor = governor
+        self.metadata_writer = metadata_writer
 
-    def extract_frames(self, video_path: str, start_frame: int, end_frame: int, config: dict, progress_callback: Callable = None):
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Could not open video file: {video_path}")
-
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-        total_frames = end_frame - start_frame
-        fps = cap.get(cv2.CAP_PROP_FPS)
-
-        frame_count = 0
+    @staticmethod
+    def _get_frame_interval(fps: float, config: dict) -> int:
+        """Number of source frames between two sampled frames"""
         method = config.get('method', 'fps')
+        params = config.get('params', {})
 
         # Calculate frame interval based on method
         if method == 'fps':
-            target_fps = config['params'].get('fps', 1.0)
+            target_fps = params.get('fps', 1.0)
             frame_interval = int(fps / target_fps)
         elif method == 'interval':
-            interval = config['params'].get('interval', 1.0)
+            interval = params.get('interval', 1.0)
             frame_interval = int(interval * fps)
         elif method == 'scene':  # treat scene method as interval with 1 second
             frame_interval = int(fps)
         else:
             frame_interval = int(fps)  # default to 1 second interval
 
-        # Get resolution if specified
-        if 'resolution' in config:
-            try:
-                width, height = map(int, config['resolution'].split('*'))
-            except:
-                width, height = None, None
-        else:
-            width, height = None, None
+        # Sources with a low or unknown frame rate still keep every frame
+        return max(frame_interval, 1)
 
-        current_frame = start_frame
-        frames_to_process = []
+    @staticmethod
+    def _resolve_size(resolution, width: int, height: int) -> Optional[Tuple[int, int]]:
+        """
+        Turn a resolution setting into a (width, height) target for a given source size.
+
+        'width*height' is an exact size, a single number is the maximum edge length
+        (aspect ratio kept, never upscaled) and 'original' keeps the source size.
+        """
+        if resolution is None or str(resolution).strip().lower() == 'original':
+            return None
+        try:
+            if '*' in str(resolution):
+                target_width, target_height = map(int, str(resolution).split('*'))
+                return target_width, target_height
+            scale = int(resolution) / max(width, height)
+        except:
+            return None
+        if scale >= 1:
+            return None
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    @staticmethod
+    def get_level_name(resolution) -> str:
+        """Name of the output subdirectory for one level of a resolution pyramid"""
+        if resolution is None or str(resolution).strip().lower() == 'original':
+            return 'original'
+        return str(resolution).strip().replace('*', 'x')
+
+    def _plan_resolutions(self, resolutions: list, frame_shape: tuple) -> List[Tuple[str, Optional[Tuple[int, int]]]]:
+        """Resolve every level against the source size, largest level first"""
+        height, width = frame_shape[:2]
+        plan = []
+        for resolution in resolutions:
+            size = self._resolve_size(resolution, width, height)
+            plan.append((self.get_level_name(resolution), size))
+
+        def area(level):
+            level_width, level_height = level[1] or (width, height)
+            return level_width * level_height
+
+        return sorted(plan, key=area, reverse=True)
+
+    @staticmethod
+    def _resize_cascade(frame: np.ndarray, plan: list) -> Dict[str, np.ndarray]:
+        """
+        Resize a frame to every planned level.
+
+        A level is resized from the previous one when it is strictly smaller in both
+        dimensions with the same aspect ratio, otherwise from the source frame, so no
+        level is built from an upscaled or distorted copy. 'original' is the source.
+        """
+        levels = {}
+        source_size = (frame.shape[1], frame.shape[0])
+        previous = frame
+        for name, size in plan:
+            if size is None or size == source_size:
+                level = frame
+            else:
+                previous_width, previous_height = previous.shape[1], previous.shape[0]
+                same_aspect = abs(size[0] * previous_height / previous_width - size[1]) <= 1 and \
+                    abs(size[1] * previous_width / previous_height - size[0]) <= 1
+                cascade = size[0] < previous_width and size[1] < previous_height and same_aspect
+                base = previous if cascade else frame
+                shrinking = size[0] * size[1] < base.shape[0] * base.shape[1]
+                level = cv2.resize(base, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+            levels[name] = level
+            previous = level
+        return levels
+
+    def iter_sampled_frames(self, video_path: str, start_frame: int, end_frame: int, config: dict,
+                            progress_callback: Callable = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        Decode frames in [start_frame, end_frame) and yield the sampled ones.
+
+        Yields:
+            (frame_index, timestamp, frame) tuples, where timestamp is in seconds and
+            frame is a BGR ndarray already resized to the configured resolution.
+            When 'resolution' is a list, frame is a dict of level name to ndarray
+            built from a single decode.
+        """
+        for current_frame, timestamp, frame, _ in self._iter_sampled(
+                video_path, start_frame, end_frame, config, progress_callback):
+            yield current_frame, timestamp, frame
+
+    def _iter_sampled(self, video_path: str, start_frame: int, end_frame: int, config: dict,
+                      progress_callback: Callable = None) -> Iterator[Tuple[int, float, object, Optional[dict]]]:
+        """Same as iter_sampled_frames, with the quality scores of every frame appended"""
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
+
+        try:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+
+            frame_interval = self._get_frame_interval(fps, config)
+            quality_gate = FrameQualityGate.from_config(config.get('quality'))
+            resolution = config.get('resolution')
+            pyramid = isinstance(resolution, (list, tuple))
+            plan = None
+
+            proxy = config.get('proxy')
+            if proxy and quality_gate is None:
+                # Without scoring there is nothing to decode the proxy for
+                logger.warning("frames.proxy has no effect without frames.quality, reading frames sequentially")
+                proxy = None
+            if proxy:
+                selected = self._select_with_proxy(
+                    cap, video_path, start_frame, end_frame, fps, frame_interval, quality_gate,
+                    proxy if isinstance(proxy, dict) else {}, progress_callback)
+            else:
+                selected = self._select_frames(
+                    cap, start_frame, end_frame, frame_interval, quality_gate, progress_callback)
+
+            for current_frame, frame, scores in selected:
+                # Resize if resolution is specified
+                if plan is None:
+                    plan = self._plan_resolutions(list(resolution) if pyramid else [resolution], frame.shape)
+                levels = self._resize_cascade(frame, plan)
+
+                timestamp = current_frame / fps if fps else 0.0
+                yield current_frame, timestamp, levels if pyramid else levels[plan[0][0]], scores
+        finally:
+            cap.release()
 
+    @staticmethod
+    def _select_frames(cap, start_frame: int, end_frame: int, frame_interval: int,
+                       quality_gate: Optional[FrameQualityGate] = None,
+                       progress_callback: Callable = None) -> Iterator[Tuple[int, np.ndarray, Optional[dict]]]:
+        """
+        Read frames sequentially and pick at most one frame per sampling window.
+
+        Without a quality gate this is the first frame of every window. With one,
+        frames are scored and picked according to the gate's selection mode.
+
+        Yields:
+            (frame_index, frame, scores) with scores None when no gate is configured
+        """
+        selection = quality_gate.selection if quality_gate else 'first'
+        total_frames = end_frame - start_frame
+        best = None
+        window_open = False
+
+        current_frame = start_frame
         while current_frame < end_frame:
             ret, frame = cap.read()
             if not ret:
                 break
 
-            if (current_frame - start_frame) % frame_interval == 0:
-                # Resize if resolution is specified
-                if width and height:
-                    frame = cv2.resize(frame, (width, height))
+            position = (current_frame - start_frame) % frame_interval
+            if position == 0:
+                window_open = True
 
-                output_path = os.path.join(
-                    self.frames_dir,
-                    f"frame_{current_frame:06d}.{config.get('output_format', 'jpg')}"
-                )
+            if window_open and (position == 0 or selection != 'first'):
+                if quality_gate is None:
+                    best = (current_frame, frame, None)
+                    window_open = False
+                else:
+                    scores = quality_gate.score(frame)
+                    if quality_gate.accept(scores):
+                        if selection != 'sharpest':
+                            best = (current_frame, frame, scores)
+                            window_open = False
+                        elif best is None or scores['sharpness'] > best[2]['sharpness']:
+                            best = (current_frame, frame, scores)
+                    elif selection == 'first':
+                        window_open = False
 
-                frames_to_process.append((frame.copy(), output_path))
-                frame_count += 1
+            # The sharpest candidate is only known once the whole window has been read
+            last_in_window = position == frame_interval - 1 or current_frame + 1 >= end_frame
+            if best is not None and (not window_open or last_in_window):
+                yield best
+                best = None
+                window_open = False
 
             current_frame += 1
             if progress_callback:
                 progress = (current_frame - start_frame) / total_frames
                 progress_callback(progress)
 
+        if best is not None:
+            yield best
+
+    def _select_with_proxy(self, cap, video_path: str, start_frame: int, end_frame: int, fps: float,
+                           frame_interval: int, quality_gate: FrameQualityGate, proxy_config: dict,
+                           progress_callback: Callable = None) -> Iterator[Tuple[int, np.ndarray, Optional[dict]]]:
+        """
+        Two-pass selection: pick frames on a low resolution proxy, then read only
+        those frames from the original at full resolution.
+        """
+        def report(offset):
+            return (lambda progress: progress_callback(offset + progress / 2)) if progress_callback else None
+
+        # Scores are taken on the gate's analysis size, so the proxy must not be smaller
+        width = max(proxy_config.get('width', 320), quality_gate.analysis_width)
+        source_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        reader = ProxyReader(video_path, start_frame, end_frame, fps, source_size, width)
+        try:
+            picks = [(index, scores) for index, _, scores in self._select_frames(
+                reader, start_frame, end_frame, frame_interval, quality_gate, report(0.0))]
+        finally:
+            reader.release()
+
+        scores_by_index = dict(picks)
+        fetch_progress = report(0.5)
+        for count, (index, frame) in enumerate(
+                fetch_frames(cap, scores_by_index, max_gap=proxy_config.get('max_gap', 30)), start=1):
+            if fetch_progress:
+                fetch_progress(count / len(picks))
+            yield index, frame, scores_by_index[index]
+
+    def extract_frames(self, video_path: str, start_frame: int, end_frame: int, config: dict, progress_callback: Callable = None):
+        output_format = config.get('output_format', 'jpg')
+        # With a governor the pool is sized for its upper bound and encoder slots limit activity
+        max_workers = self.governor.max_encoders if self.governor else self.max_workers
+
+        # A list of resolutions writes one subdirectory per pyramid level
+        resolution = config.get('resolution')
+        if isinstance(resolution, (list, tuple)):
+            for level in resolution:
+                os.makedirs(os.path.join(self.frames_dir, self.get_level_name(level)), exist_ok=True)
+
         # Process frames using thread pool
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = []
-            for frame, output_path in frames_to_process:
-                futures.append(
-                    executor.submit(
-                        self._save_frame,
-                        frame,
-                        output_path,
-                        config.get('output_format', 'jpg')
+            for current_frame, timestamp, frame, scores in self._iter_sampled(
+                    video_path, start_frame, end_frame, config, progress_callback):
+                if isinstance(frame, dict):
+                    outputs = [(level_frame, level, os.path.join(self.frames_dir, level))
+                               for level, level_frame in frame.items()]
+                else:
+                    outputs = [(frame, self.get_level_name(resolution), self.frames_dir)]
+
+                for level_frame, level, level_dir in outputs:
+                    if self.governor:
+                        # Pauses decoding while above the memory ceiling
+                        self.governor.wait_for_memory()
+                        self.governor.frame_buffered(level_frame.nbytes)
+
+                    output_path = os.path.join(
+                        level_dir,
+                        f"frame_{current_frame:06d}.{output_format}"
+                    )
+                    futures.append(
+                        executor.submit(
+                            self._save_frame,
+                            level_frame,
+                            output_path,
+                            output_format,
+                            dict(scores or {}, frame_index=current_frame, timestamp=timestamp, level=level)
+                        )
                     )
-                )
 
             # Wait for all frames to be saved
             concurrent.futures.wait(futures)
 
-        cap.release()
-
-    def _save_frame(self, frame, output_path: str, format: str):
-        """Save a single frame to disk"""
+    def _save_frame(self, frame, output_path: str, format: str, record: Optional[dict] = None):
+        """Save a single frame to disk, and add its row to the metadata sidecar"""
+        slot = self.governor.encoder_slot() if self.governor else nullcontext()
+        bytes_written = 0
         try:
-            if format.lower() == 'png':
-                cv2.imwrite(output_path, frame, [cv2.IMWRITE_PNG_COMPRESSION, 9])
-            else:
-                cv2.imwrite(output_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            with slot:
+                if format.lower() == 'png':
+                    written = cv2.imwrite(output_path, frame, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+                else:
+                    written = cv2.imwrite(output_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            if written:
+                bytes_written = os.path.getsize(output_path)
+                if self.metadata_writer and record is not None:
+                    record.update(output_path=output_path, bytes=bytes_written,
+                                  width=frame.shape[1], height=frame.shape[0])
+                    self.metadata_writer.add(record)
         except Exception as e:
             print(f"Error saving frame to {output_path}: {str(e)}")
+        finally:
+            if self.governor:
+                self.governor.frame_released(frame.nbytes, bytes_written)
 
     def extract_audio(self, video_path: str, config: dict, progress_callback: Callable = None):
         """Extract audio from video"""
@@ -124,12 +355,91 @@ class VideoProcessor:
             print(f"Error extracting audio: {str(e)}")
             return False
 
-    def process_input(self, input_source: str, start_frame: int, end_frame: int, 
-                      extraction_config: dict = None, audio_config: dict = None, 
+    def process_input(self, input_source: str, start_frame: int, end_frame: int,
+                      extraction_config: dict = None, audio_config: dict = None,
                       progress_callback: Callable = None):
         """Process input source with given configurations"""
         if extraction_config and self.frames_dir:
             self.extract_frames(input_source, start_frame, end_frame, extraction_config, progress_callback)
-        
+
         if audio_config and self.audio_dir:
-            self.extract_audio(input_source, audio_config, progress_callback)
\ No newline at end of file
+            self.extract_audio(input_source, audio_config, progress_callback)
+
+
+def iter_frames(source: str, config: dict, start_frame: int = 0, end_frame: Optional[int] = None,
+                max_workers: int = 4, prefetch: int = 8,
+                chunk_minutes: int = 15) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Stream sampled frames from a video without writing them to disk.
+
+    The video is split into chunks exactly like the CLI does, chunks are decoded
+    in parallel and frames are yielded in source order.
+
+    Args:
+        source: Path to input video file
+        config: Frame extraction config (same shape as processing_options['frames'])
+        start_frame: First frame to consider
+        end_frame: Frame to stop at (exclusive), defaults to the end of the video
+        max_workers: Number of chunks decoded concurrently
+        prefetch: Maximum number of decoded frames buffered per chunk
+        chunk_minutes: Length of each decoding chunk in minutes
+
+    Yields:
+        (frame_index, timestamp, frame) tuples with frame as a BGR ndarray, or a dict
+        of level name to ndarray when config['resolution'] is a list
+    """
+    if prefetch < 1:
+        raise ValueError("prefetch must be at least 1")
+
+    chunker = VideoChunker(chunk_minutes=chunk_minutes)
+    chunk_ranges = []
+    for chunk_start, chunk_end in chunker.split_video(source):
+        chunk_start = max(chunk_start, start_frame)
+        if end_frame is not None:
+            chunk_end = min(chunk_end, end_frame)
+        if chunk_start < chunk_end:
+            chunk_ranges.append((chunk_start, chunk_end))
+
+    if not chunk_ranges:
+        return
+
+    processor = VideoProcessor(max_workers=max_workers)
+    stop = threading.Event()
+    chunk_queues = [queue.Queue(maxsize=prefetch) for _ in chunk_ranges]
+
+    def put(chunk_queue: queue.Queue, item) -> bool:
+        # Block while the consumer is behind, but give up once it went away
+        while not stop.is_set():
+            try:
+                chunk_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(chunk_queue: queue.Queue, chunk_start: int, chunk_end: int):
+        if stop.is_set():
+            return
+        try:
+            for item in processor.iter_sampled_frames(source, chunk_start, chunk_end, config):
+                if not put(chunk_queue, item):
+                    return
+            put(chunk_queue, _END_OF_CHUNK)
+        except Exception as e:
+            put(chunk_queue, e)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(chunk_ranges))) as executor:
+        for chunk_queue, (chunk_start, chunk_end) in zip(chunk_queues, chunk_ranges):
+            executor.submit(produce, chunk_queue, chunk_start, chunk_end)
+
+        try:
+            for chunk_queue in chunk_queues:
+                while True:
+                    item = chunk_queue.get()
+                    if item is _END_OF_CHUNK:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+        finally:
+            stop.set()
@@ -2,8 +2,12 @@ import argparse
 import subprocess
 import logging
 import os
+import re
 import sys
-from typing import List, Dict, Tuple
+import time
+import threading
+from contextlib import nullcontext
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 import cv2
 from tqdm import tqdm
@@ -11,10 +15,17 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import yaml
 
 from core.video_processor import VideoProcessor
+from core.frame_metadata import FrameMetadataWriter
 from core.audio_extractor import AudioExtractor
 from utils.dir_manager import DirectoryManager
 from core.video_chunker import VideoChunker
+from core.governor import ConcurrencyGovernor
+from core.clip_exporter import ClipExporter
 from utils.config_loader import load_config
+from utils.discovery import iter_input_sources
+from utils.watcher import FolderWatcher, write_completion_marker, is_completion_marker_current
+from utils.lease_queue import LeaseQueue, default_worker_id
+from utils.fingerprint import FingerprintStore, content_fingerprint
 
 def setup_logging(log_file: str) -> None:
     logging.basicConfig(
@@ -26,22 +37,6 @@ def setup_logging(log_file: str) -> None:
         ]
     )
 
-def process_input_source(source: str) -> List[str]:
-    """
-    Process the input source and return a list of files/URLs to process.
-    """
-    if os.path.isfile(source):
-        if source.endswith(('.txt', '.csv')):
-            with open(source, 'r') as f:
-                return [line.strip() for line in f if line.strip()]
-        elif source.lower().endswith(('.mp4', '.avi', '.mkv', '.mov')):
-            return [source]
-    elif os.path.isdir(source):
-        return [str(p) for p in Path(source).glob('**/*') if p.suffix.lower() in ('.mp4', '.avi', '.mkv', '.mov')]
-    elif source.startswith(('http://', 'https://', 'www.')):
-        return [source]
-    return []
-
 def process_chunk(chunk_info: dict) -> bool:
     """
     Process a video chunk for frame extraction.
@@ -51,15 +46,27 @@ def process_chunk(chunk_info: dict) -> bool:
         start_frame, end_frame = chunk_info['chunk_path']
         output_dir = chunk_info['output_dir']
         config = chunk_info['config']
-        
+        governor = chunk_info['governor']
+
+        # Every chunk writes its own metadata part so parallel or remote chunks never share a file
+        metadata_writer = None
+        if config['frames'].get('metadata', True):
+            metadata_writer = FrameMetadataWriter(
+                os.path.join(output_dir['metadata'], f"frames-part-{chunk_info['index']:04d}"),
+                format=config['frames'].get('metadata_format', 'auto')
+            )
+
+        # Audio is extracted separately by process_audio_chunk
         processor = VideoProcessor(
             frames_dir=output_dir['frames'],
-            audio_dir=output_dir['audio'] if 'audio' in config else None
+            governor=governor,
+            metadata_writer=metadata_writer
         )
 
-        with tqdm(total=end_frame - start_frame,
-                  desc=f"Chunk {chunk_info['index']}/{chunk_info['total']}",
-                  position=chunk_info['index']) as pbar:
+        with governor.worker_slot(), metadata_writer or nullcontext(), \
+                tqdm(total=end_frame - start_frame,
+                     desc=f"Chunk {chunk_info['index']}/{chunk_info['total']}",
+                     position=chunk_info['index']) as pbar:
 
             def update_progress(progress):
                 pbar.n = int(progress * (end_frame - start_frame))
@@ -70,7 +77,6 @@ def process_chunk(chunk_info: dict) -> bool:
                 start_frame=start_frame,
                 end_frame=end_frame,
                 extraction_config=config['frames'],
-                audio_config=config.get('audio'),
                 progress_callback=update_progress
             )
         
@@ -92,9 +98,10 @@ def process_audio_chunk(chunk_info: dict) -> bool:
         
         audio_processor = AudioExtractor(output_dir['audio'])
 
-        with tqdm(total=100,
-                  desc=f"Audio Chunk {chunk_info['index']}/{chunk_info['total']}",
-                  position=chunk_info['index']) as pbar:
+        with chunk_info['governor'].worker_slot(), \
+                tqdm(total=100,
+                     desc=f"Audio Chunk {chunk_info['index']}/{chunk_info['total']}",
+                     position=chunk_info['index']) as pbar:
 
             def update_progress(progress):
                 pbar.n = int(progress * 100)
@@ -107,7 +114,8 @@ def process_audio_chunk(chunk_info: dict) -> bool:
                 progress_callback=update_progress,
                 start_time=start_time,
                 end_time=end_time,
-                chunk_index=chunk_info['index'] if chunk_info['total'] > 1 else None
+                chunk_index=chunk_info['index'] if chunk_info['total'] > 1 else None,
+                output_filename=chunk_info.get('output_filename')
             )
         
         return True
@@ -116,6 +124,441 @@ def process_audio_chunk(chunk_info: dict) -> bool:
         print(f"\nError processing audio chunk {chunk_info['index']}: {str(e)}")
         return False
 
+def process_source(source: str, base_output_path: str, processing_options: Dict,
+                   dir_manager: DirectoryManager, governor: ConcurrencyGovernor,
+                   executor: ThreadPoolExecutor, logger: logging.Logger) -> bool:
+    """
+    Extract frames and audio for a single source.
+
+    Chunks are submitted to the shared executor so its threads stay warm across sources.
+    Returns True when every chunk completed successfully.
+    """
+    success = True
+    try:
+        logger.info(f"\nProcessing: {source}")
+        print(f"\nProcessing: {source}")
+
+        paths = dir_manager.get_output_paths(source, base_output_path)
+        os.makedirs(paths['frames'], exist_ok=True)
+
+        chunker = VideoChunker(chunk_minutes=15)  # 15 minutes chunks
+        chunk_ranges = chunker.split_video(source)
+
+        print(f"\nProcessing {len(chunk_ranges)} chunks of 15 minutes each...")
+
+        futures = []
+        for idx, chunk_range in enumerate(chunk_ranges):
+            futures.append(
+                executor.submit(
+                    process_chunk,
+                    {
+                        'source': source,
+                        'chunk_path': chunk_range,
+                        'output_dir': paths,
+                        'config': processing_options,
+                        'governor': governor,
+                        'index': idx + 1,
+                        'total': len(chunk_ranges)
+                    }
+                )
+            )
+
+        for future in as_completed(futures):
+            try:
+                success = future.result() and success
+            except Exception as e:
+                logger.error(f"Chunk processing error: {str(e)}")
+                success = False
+
+        print(f"\nCompleted processing: {source}")
+
+        if 'audio' in processing_options:
+            success = process_source_audio(source, paths, processing_options,
+                                           governor, executor, logger) and success
+
+        if 'clips' in processing_options:
+            success = process_source_clips(source, paths, processing_options, logger) and success
+
+    except Exception as e:
+        logger.exception(f"Error processing {source}: {str(e)}")
+        print(f"\nError processing {source}: {str(e)}")
+        success = False
+
+    return success
+
+def process_source_audio(source: str, paths: Dict[str, str], processing_options: Dict,
+                         governor: ConcurrencyGovernor, executor: ThreadPoolExecutor,
+                         logger: logging.Logger) -> bool:
+    """
+    Extract audio for a single source, in fixed windows or non-silent segments.
+
+    Returns True when every audio chunk completed successfully.
+    """
+    import ffmpeg
+
+    success = True
+    os.makedirs(paths['audio'], exist_ok=True)
+
+    # Get video duration
+    probe = ffmpeg.probe(source)
+    duration = float(probe['format']['duration'])
+
+    audio_config = processing_options['audio']
+    audio_extractor = AudioExtractor(paths['audio'])
+    silence_mode = audio_config.get('mode') == 'silence'
+
+    if silence_mode:
+        # Cut at silence boundaries and only encode the spans that contain sound
+        audio_chunks = audio_extractor.find_speech_segments(
+            source,
+            noise_db=audio_config.get('silence_threshold_db', -40.0),
+            min_silence=audio_config.get('min_silence_duration', 0.5),
+            padding=audio_config.get('padding', 0.25),
+            duration=duration
+        )
+    else:
+        # Create audio chunks
+        chunk_duration = 15 * 60  # 15 minutes in seconds
+        audio_chunks = [(i * chunk_duration, min((i + 1) * chunk_duration, duration)) 
+                        for i in range(int(duration / chunk_duration) + 1)]
+
+    print(f"\nProcessing {len(audio_chunks)} audio chunks...")
+
+    futures = []
+    for idx, chunk_range in enumerate(audio_chunks):
+        chunk_info = {
+            'source': source,
+            'chunk_path': chunk_range,
+            'output_dir': paths,
+            'config': processing_options,
+            'governor': governor,
+            'index': idx + 1,
+            'total': len(audio_chunks)
+        }
+        if silence_mode:
+            chunk_info['output_filename'] = AudioExtractor.get_segment_filename(
+                source, idx + 1, audio_config['format'])
+        futures.append(executor.submit(process_audio_chunk, chunk_info))
+
+    for future in as_completed(futures):
+        try:
+            success = future.result() and success
+        except Exception as e:
+            logger.error(f"Audio chunk processing error: {str(e)}")
+            success = False
+
+    if silence_mode:
+        index_path = audio_extractor.write_segment_index(
+            source, audio_chunks, audio_config['format'], duration,
+            settings={key: audio_config[key] for key in
+                      ('silence_threshold_db', 'min_silence_duration', 'padding')
+                      if key in audio_config}
+        )
+        logger.info(f"Wrote audio segment index: {index_path}")
+
+    return success
+
+def link_if_duplicate(source: str, base_output_path: str, dir_manager: DirectoryManager,
+                      fingerprints: Optional[FingerprintStore], logger: logging.Logger) -> Tuple[bool, Optional[str]]:
+    """
+    Check a source against already processed content before decoding it.
+
+    Returns (is_duplicate, fingerprint). Duplicates get their outputs linked to the
+    original and a completion marker, so they need no further processing.
+    """
+    if not fingerprints or not os.path.isfile(source):
+        return False, None
+
+    fingerprint = content_fingerprint(source)
+    original = fingerprints.find_duplicate(source, fingerprint)
+    if not original:
+        return False, fingerprint
+
+    link_duplicate(source, original, base_output_path, dir_manager, logger)
+    return True, fingerprint
+
+def link_duplicate(source: str, original: Dict, base_output_path: str, dir_manager: DirectoryManager,
+                   logger: logging.Logger) -> None:
+    """Link the outputs of a duplicate to those of the original and mark it done"""
+    logger.info(f"{source} is a duplicate of {original['source']}, linking outputs")
+    print(f"\nSkipping duplicate: {source} (same content as {original['source']})")
+    dir_manager.link_duplicate_outputs(source, base_output_path, original)
+    write_completion_marker(dir_manager.get_completion_marker_path(source, base_output_path), source, 'duplicate')
+
+def get_sampled_timestamps(frames_dir: str, source: str) -> List[float]:
+    """Timestamps of the frames already extracted for a source, read from their file names"""
+    _, fps, _, _ = VideoChunker().get_video_info(source)
+    frame_indices = set()
+    for _, _, files in os.walk(frames_dir):
+        for file_name in files:
+            match = re.match(r'frame_(\d+)\.', file_name)
+            if match:
+                frame_indices.add(int(match.group(1)))
+    return [index / fps for index in sorted(frame_indices)] if fps else []
+
+def process_source_clips(source: str, paths: Dict[str, str], processing_options: Dict,
+                         logger: logging.Logger) -> bool:
+    """
+    Export video clips for a single source.
+
+    Modes: 'ranges' (explicit start/end pairs), 'around' (fixed timestamps),
+    'scene' (around scene changes), 'sampled' (around extracted frames) and
+    'segments' (the whole video in fixed-length pieces).
+    Returns True when every clip was exported.
+    """
+    clip_config = processing_options['clips']
+    mode = clip_config.get('mode', 'ranges')
+    os.makedirs(paths['clips'], exist_ok=True)
+    exporter = ClipExporter(paths['clips'], max_workers=clip_config.get('workers', 4))
+
+    try:
+        if mode == 'segments':
+            print(f"\nSplitting into {clip_config.get('segment_seconds', 10)}s clips...")
+            clips = exporter.split_into_segments(source, clip_config.get('segment_seconds', 10),
+                                                 format=clip_config.get('format'))
+        else:
+            import ffmpeg
+            duration = float(ffmpeg.probe(source)['format']['duration'])
+
+            if mode == 'ranges':
+                ranges = exporter.merge_ranges(clip_config.get('ranges', []), duration)
+            else:
+                if mode == 'scene':
+                    timestamps = exporter.detect_scene_changes(source, clip_config.get('scene_threshold', 0.3))
+                elif mode == 'sampled':
+                    timestamps = get_sampled_timestamps(paths['frames'], source)
+                else:
+                    timestamps = clip_config.get('timestamps', [])
+                ranges = exporter.ranges_around(timestamps, clip_config.get('before', 2.0),
+                                                clip_config.get('after', 2.0), duration)
+
+            print(f"\nExporting {len(ranges)} clips...")
+            with tqdm(total=100, desc="Clips") as pbar:
+
+                def update_progress(progress):
+                    pbar.n = int(progress * 100)
+                    pbar.refresh()
+
+                clips = exporter.export_clips(source, ranges, accurate=clip_config.get('accurate', False),
+                                              format=clip_config.get('format'), progress_callback=update_progress)
+
+        index_path = exporter.write_clip_index(source, clips, settings=clip_config)
+        logger.info(f"Wrote clip index: {index_path}")
+        return not any('error' in clip for clip in clips)
+
+    except Exception as e:
+        logger.error(f"Error exporting clips for {source}: {str(e)}")
+        print(f"\nError exporting clips for {source}: {str(e)}")
+        return False
+
+def process_and_mark(source: str, base_output_path: str, processing_options: Dict,
+                     dir_manager: DirectoryManager, governor: ConcurrencyGovernor,
+                     executor: ThreadPoolExecutor, logger: logging.Logger,
+                     fingerprints: Optional[FingerprintStore] = None) -> bool:
+    """Process a source unless it is a duplicate and write its completion marker"""
+    try:
+        duplicate, fingerprint = link_if_duplicate(source, base_output_path, dir_manager, fingerprints, logger)
+        if duplicate:
+            return True
+    except Exception as e:
+        logger.error(f"Error checking {source} for duplicates: {str(e)}")
+        fingerprint = None
+
+    success = process_source(source, base_output_path, processing_options,
+                             dir_manager, governor, executor, logger)
+    try:
+        if success and fingerprint:
+            fingerprints.record(source, fingerprint, dir_manager.get_output_dir(source, base_output_path))
+        marker_path = dir_manager.get_completion_marker_path(source, base_output_path)
+        write_completion_marker(marker_path, source, 'completed' if success else 'failed')
+    except Exception as e:
+        logger.error(f"Error writing completion marker for {source}: {str(e)}")
+    return success
+
+def run_watch_mode(directories: List[str], base_output_path: str, processing_options: Dict,
+                   watch_options: Dict, dir_manager: DirectoryManager,
+                   governor: ConcurrencyGovernor, logger: logging.Logger,
+                   fingerprints: Optional[FingerprintStore] = None) -> None:
+    """
+    Watch input directories and process new videos with a persistent worker pool.
+
+    Runs until interrupted. Sources with a current completion marker are skipped,
+    so restarting the daemon does not reprocess finished files.
+    """
+    def is_done(source: str) -> bool:
+        marker_path = dir_manager.get_completion_marker_path(source, base_output_path)
+        return is_completion_marker_current(marker_path, source)
+
+    watcher = FolderWatcher(
+        directories,
+        settle_seconds=watch_options.get('settle_seconds', 10.0),
+        poll_interval=watch_options.get('poll_interval', 2.0),
+        is_done=is_done
+    )
+
+    print(f"\nWatching for new videos in: {', '.join(directories)} (Ctrl+C to stop)")
+    with ThreadPoolExecutor(max_workers=governor.max_workers) as chunk_executor, \
+            ThreadPoolExecutor(max_workers=watch_options.get('max_concurrent_sources', 2)) as source_executor:
+        try:
+            for source in watcher.watch():
+                source_executor.submit(process_and_mark, source, base_output_path, processing_options,
+                                       dir_manager, governor, chunk_executor, logger, fingerprints)
+        except KeyboardInterrupt:
+            print("\nStopping watch mode, waiting for running sources to finish...")
+
+def process_unit(unit: Dict, base_output_path: str, processing_options: Dict,
+                 dir_manager: DirectoryManager, governor: ConcurrencyGovernor,
+                 audio_executor: ThreadPoolExecutor, logger: logging.Logger) -> bool:
+    """Process one leased work unit: a frame chunk, or the whole audio track or clip export of a source"""
+    source = unit['source']
+    paths = dir_manager.get_output_paths(source, base_output_path)
+
+    if unit['kind'] == 'audio':
+        return process_source_audio(source, paths, processing_options, governor, audio_executor, logger)
+
+    if unit['kind'] == 'clips':
+        return process_source_clips(source, paths, processing_options, logger)
+
+    return process_chunk({
+        'source': source,
+        'chunk_path': (unit['start_frame'], unit['end_frame']),
+        'output_dir': paths,
+        'config': processing_options,
+        'governor': governor,
+        'index': unit['chunk_index'] + 1,
+        'total': unit['chunk_index'] + 1
+    })
+
+def run_coordinated(input_sources, queue_path: str, worker_id: str, base_output_path: str,
+                    processing_options: Dict, queue_options: Dict, dir_manager: DirectoryManager,
+                    governor: ConcurrencyGovernor, logger: logging.Logger,
+                    fingerprints: Optional[FingerprintStore] = None) -> None:
+    """
+    Share the work of one input folder between several processes or machines.
+
+    Every participant enqueues the (source, chunk) units it discovers into a lease
+    table on shared storage and then claims units until the table is drained.
+    Units of a crashed participant are reclaimed once their lease expires.
+    """
+    lease_queue = LeaseQueue(queue_path,
+                             lease_seconds=queue_options.get('lease_seconds', 300),
+                             max_attempts=queue_options.get('max_attempts', 3))
+    enqueue_done = threading.Event()
+    # Fingerprints of the sources enqueued here, recorded once all units of the source are done.
+    # Copies found in the meantime wait on their original instead of linking to unfinished outputs.
+    pending = {}
+    pending_lock = threading.Lock()
+
+    def enqueue_source(source: str):
+        chunk_ranges = VideoChunker(chunk_minutes=15).split_video(source)
+        lease_queue.enqueue(source, 'frames', chunk_ranges)
+        if 'audio' in processing_options:
+            lease_queue.enqueue(source, 'audio', [(0, 0)])
+        if 'clips' in processing_options:
+            # Sampled clip ranges are read from the extracted frames
+            lease_queue.enqueue(source, 'clips', [(0, 0)], after='frames')
+
+    def enqueue_sources():
+        try:
+            for source in input_sources:
+                if lease_queue.has_source(source):
+                    continue
+                duplicate, fingerprint = link_if_duplicate(source, base_output_path, dir_manager,
+                                                           fingerprints, logger)
+                if duplicate:
+                    continue
+                if fingerprint:
+                    with pending_lock:
+                        if fingerprint in pending:
+                            pending[fingerprint]['duplicates'].append(source)
+                            continue
+                        # The original may have been recorded since the check above
+                        original = fingerprints.find_duplicate(source, fingerprint)
+                        if original:
+                            link_duplicate(source, original, base_output_path, dir_manager, logger)
+                            continue
+                        # Units go in under the lock, a source without units would count as finished
+                        pending[fingerprint] = {'source': source, 'duplicates': []}
+                        enqueue_source(source)
+                        continue
+                enqueue_source(source)
+        except Exception as e:
+            logger.exception(f"Error enqueueing sources: {str(e)}")
+        finally:
+            enqueue_done.set()
+
+    def resolve_pending():
+        """Record the fingerprints of finished sources and settle the copies waiting on them"""
+        with pending_lock:
+            for fingerprint, entry in list(pending.items()):
+                source = entry['source']
+                if not lease_queue.source_finished(source):
+                    continue
+                del pending[fingerprint]
+                try:
+                    if lease_queue.source_failed(source):
+                        # Failed outputs cannot be shared, the next copy is processed in its place
+                        if entry['duplicates']:
+                            pending[fingerprint] = {'source': entry['duplicates'][0],
+                                                    'duplicates': entry['duplicates'][1:]}
+                            enqueue_source(entry['duplicates'][0])
+                        continue
+                    output_dir = dir_manager.get_output_dir(source, base_output_path)
+                    fingerprints.record(source, fingerprint, output_dir)
+                    original = {'source': source, 'output_dir': output_dir, 'fingerprint': fingerprint}
+                    for duplicate in entry['duplicates']:
+                        link_duplicate(duplicate, original, base_output_path, dir_manager, logger)
+                except Exception as e:
+                    logger.exception(f"Error settling duplicates of {source}: {str(e)}")
+
+    def work(slot_id: str):
+        while True:
+            # Only take a lease when the governor would let the unit start right away
+            if not governor.workers.has_capacity():
+                time.sleep(0.5)
+                continue
+
+            unit = lease_queue.claim(slot_id)
+            if unit is None:
+                # Sources may also have been finished by other participants
+                resolve_pending()
+                if enqueue_done.is_set() and lease_queue.is_drained() and not pending:
+                    return
+                time.sleep(queue_options.get('poll_interval', 2.0))
+                continue
+
+            started = time.time()
+            try:
+                with lease_queue.keep_alive(unit, slot_id):
+                    success = process_unit(unit, base_output_path, processing_options,
+                                           dir_manager, governor, audio_executor, logger)
+            except Exception as e:
+                logger.exception(f"Error processing unit: {str(e)}")
+                success = False
+
+            if success:
+                lease_queue.complete(unit, slot_id, {'worker': slot_id, 'seconds': round(time.time() - started, 3)})
+            else:
+                lease_queue.fail(unit, slot_id, 'processing failed')
+
+            source = unit['source']
+            if lease_queue.source_finished(source):
+                status = 'failed' if lease_queue.source_failed(source) else 'completed'
+                write_completion_marker(dir_manager.get_completion_marker_path(source, base_output_path),
+                                        source, status)
+                resolve_pending()
+
+    print(f"\nCoordinating through {queue_path} as worker {worker_id}")
+    threading.Thread(target=enqueue_sources, name='enqueue-sources', daemon=True).start()
+
+    with ThreadPoolExecutor(max_workers=governor.max_workers) as audio_executor, \
+            ThreadPoolExecutor(max_workers=governor.max_workers) as unit_executor:
+        slots = [unit_executor.submit(work, f"{worker_id}-{index}") for index in range(governor.max_workers)]
+        for slot in as_completed(slots):
+            slot.result()
+
+    print(f"\nQueue drained: {lease_queue.counts()}")
+
 def get_paths() -> Tuple[str, str]:
     print("\nPath Configuration:")
     while True:
@@ -146,6 +589,8 @@ def get_processing_options() -> Dict:
     options['frames'] = get_frame_config()
     if input("Extract audio? (y/n): ").strip().lower() == 'y':
         options['audio'] = get_audio_config()
+    if input("Export video clips? (y/n) [n]: ").strip().lower() == 'y':
+        options['clips'] = get_clip_config()
     return options
 
 
@@ -191,6 +636,25 @@ def get_audio_config() -> Dict:
         print(f"Invalid bitrate! Please select from {', '.join(supported_bitrates)}")
     config['bitrate'] = bitrate_choice if bitrate_choice else '192k'
 
+    if input("Skip silent parts of the audio? (y/n) [n]: ").strip().lower() == 'y':
+        config['mode'] = 'silence'
+
+    return config
+
+def get_clip_config() -> Dict:
+    """
+    Get clip export configuration from the user.
+    """
+    config = {'mode': 'segments'}
+    while True:
+        try:
+            segment_seconds = float(input("Enter clip length in seconds (e.g., 10): ").strip() or 10)
+            if segment_seconds > 0:
+                break
+            print("Clip length must be greater than 0")
+        except ValueError:
+            print("Please enter a valid number")
+    config['segment_seconds'] = segment_seconds
     return config
 
 def get_frame_config() -> Dict:
@@ -238,8 +702,10 @@ def get_frame_config() -> Dict:
         print("Invalid format! Please select jpg or png")
     config['output_format'] = format_choice if format_choice else 'jpg'
 
-    resolution = input("Enter output resolution (e.g., 1920*1080) [original]: ").strip()
-    if resolution:
+    resolution = input("Enter output resolution (e.g., 1920*1080, or a list like original,640,128) [original]: ").strip()
+    if ',' in resolution:
+        config['resolution'] = [level.strip() for level in resolution.split(',') if level.strip()]
+    elif resolution:
         config['resolution'] = resolution
 
     return config
@@ -249,6 +715,11 @@ def main():
     parser.add_argument("--config", help="Path to config.yaml file")
     parser.add_argument("--input", help="Input path (video file/folder/URL)")
     parser.add_argument("--output", help="Output directory path")
+    parser.add_argument("--discovery-cache", help="JSON file used to cache directory listings between runs")
+    parser.add_argument("--watch", nargs='+', metavar="DIR", help="Keep running and process new videos dropped into these directories")
+    parser.add_argument("--queue", help="Shared SQLite lease table for splitting work between machines")
+    parser.add_argument("--worker-id", help="Name of this worker in the lease table [hostname-pid]")
+    parser.add_argument("--fingerprint-db", help="SQLite file of processed content, used to skip duplicate videos across runs")
     args = parser.parse_args()
 
     try:
@@ -259,105 +730,83 @@ def main():
 
         if args.config:
             config = load_config(args.config)
-            input_path = config['input_path']
+            input_path = config.get('input_path')
             base_output_path = config['output_path']
             processing_options = config['processing_options']
-        elif args.input and args.output:
+            discovery_options = config.get('discovery', {})
+            concurrency_options = config.get('concurrency', {})
+            watch_options = config.get('watch', {})
+            queue_options = config.get('queue', {})
+            dedup_options = config.get('dedup', {})
+        elif (args.input or args.watch) and args.output:
             input_path = args.input
             base_output_path = args.output
             processing_options = get_processing_options()
+            discovery_options = {}
+            concurrency_options = {}
+            watch_options = {}
+            queue_options = {}
+            dedup_options = {}
         else:
             input_path, base_output_path = get_paths()
             processing_options = get_processing_options()
+            discovery_options = {}
+            concurrency_options = {}
+            watch_options = {}
+            queue_options = {}
+            dedup_options = {}
+
+        if args.discovery_cache:
+            discovery_options['cache_path'] = args.discovery_cache
+        if args.watch:
+            watch_options['directories'] = args.watch
+        if args.queue:
+            queue_options['path'] = args.queue
+        if args.fingerprint_db:
+            dedup_options.update(enabled=True, db_path=args.fingerprint_db)
 
         dir_manager = DirectoryManager()
+
+        # Shared by every source so limits adapt over the whole run
+        governor = ConcurrencyGovernor.from_config(concurrency_options).start()
+
+        fingerprints = None
+        if dedup_options.get('enabled'):
+            fingerprints = FingerprintStore(dedup_options.get('db_path'),
+                                            verify_metadata=dedup_options.get('verify_metadata', True))
+
+        if watch_options.get('directories'):
+            run_watch_mode(watch_options['directories'], base_output_path, processing_options,
+                           watch_options, dir_manager, governor, logger, fingerprints)
+            governor.stop()
+            return
         
-        input_sources = process_input_source(input_path)
-        
-        if not input_sources:
-            print("No valid input sources found. Exiting...")
-            sys.exit(1)
+        # Sources are streamed while the input tree is still being walked
+        input_sources = iter_input_sources(
+            input_path,
+            max_workers=discovery_options.get('workers', 8),
+            cache_path=discovery_options.get('cache_path')
+        )
+        sources_found = 0
 
-        for source in input_sources:
-            try:
-                logger.info(f"\nProcessing: {source}")
-                print(f"\nProcessing: {source}")
-
-                paths = dir_manager.get_output_paths(source, base_output_path)
-                os.makedirs(paths['frames'], exist_ok=True)
-
-                chunker = VideoChunker(chunk_minutes=15)  # 15 minutes chunks
-                chunk_ranges = chunker.split_video(source)
-
-                print(f"\nProcessing {len(chunk_ranges)} chunks of 15 minutes each...")
-
-                with ThreadPoolExecutor(max_workers=min(4, len(chunk_ranges))) as executor:
-                    futures = []
-                    for idx, chunk_range in enumerate(chunk_ranges):
-                        futures.append(
-                            executor.submit(
-                                process_chunk,
-                                {
-                                    'source': source,
-                                    'chunk_path': chunk_range,
-                                    'output_dir': paths,
-                                    'config': processing_options,
-                                    'index': idx + 1,
-                                    'total': len(chunk_ranges)
-                                }
-                            )
-                        )
-
-                    for future in as_completed(futures):
-                        try:
-                            future.result()
-                        except Exception as e:
-                            logger.error(f"Chunk processing error: {str(e)}")
-
-                print(f"\nCompleted processing: {source}")
-
-                if 'audio' in processing_options:
-                    
-                    import ffmpeg
-                    os.makedirs(paths['audio'], exist_ok=True)
-                    
-                    # Get video duration
-                    probe = ffmpeg.probe(source)
-                    duration = float(probe['format']['duration'])
-                    
-                    # Create audio chunks
-                    chunk_duration = 15 * 60  # 15 minutes in seconds
-                    audio_chunks = [(i * chunk_duration, min((i + 1) * chunk_duration, duration)) 
-                                    for i in range(int(duration / chunk_duration) + 1)]
-
-                    print(f"\nProcessing {len(audio_chunks)} audio chunks...")
-
-                    with ThreadPoolExecutor(max_workers=min(4, len(audio_chunks))) as executor:
-                        futures = []
-                        for idx, chunk_range in enumerate(audio_chunks):
-                            futures.append(
-                                executor.submit(
-                                    process_audio_chunk,
-                                    {
-                                        'source': source,
-                                        'chunk_path': chunk_range,
-                                        'output_dir': paths,
-                                        'config': processing_options,
-                                        'index': idx + 1,
-                                        'total': len(audio_chunks)
-                                    }
-                                )
-                            )
-
-                        for future in as_completed(futures):
-                            try:
-                                future.result()
-                            except Exception as e:
-                                logger.error(f"Audio chunk processing error: {str(e)}")
+        if queue_options.get('path'):
+            run_coordinated(input_sources, queue_options['path'], args.worker_id or default_worker_id(),
+                            base_output_path, processing_options, queue_options, dir_manager, governor, logger,
+                            fingerprints)
+            governor.stop()
+            return
 
-            except Exception as e:
-                logger.exception(f"Error processing {source}: {str(e)}")
-                print(f"\nError processing {source}: {str(e)}")
+        with ThreadPoolExecutor(max_workers=governor.max_workers) as executor:
+            for source in input_sources:
+                sources_found += 1
+                process_and_mark(source, base_output_path, processing_options,
+                                 dir_manager, governor, executor, logger, fingerprints)
+
+        governor.stop()
+
+        if not sources_found:
+            print("No valid input sources found. Exiting...")
+            sys.exit(1)
 
         print(f"\nProcessing completed! Output files can be found in: {base_output_path}")
 
@@ -1,4 +1,5 @@
 import os
+import json
 import pathlib
 from typing import Dict, Tuple
 import logging
@@ -10,22 +11,16 @@ class DirectoryManager:
     def create_directory_structure(self, input_path: str, base_output_path: str) -> Dict[str, str]:
         """Creates appropriate directory structure based on input type"""
         try:
-            base_output_path = os.path.abspath(base_output_path)
-            
-            # Get the directory name from input path
-            if os.path.isfile(input_path):
-                dir_name = os.path.splitext(os.path.basename(input_path))[0]
-            else:
-                dir_name = os.path.basename(input_path)
-            
             # Create main output directory
-            main_dir = os.path.join(base_output_path, dir_name)
+            main_dir = self.get_output_dir(input_path, base_output_path)
             os.makedirs(main_dir, exist_ok=True)
             
             # Create and return paths for subdirectories
             subdirs = {
                 'frames': os.path.join(main_dir, 'frames'),
                 'audio': os.path.join(main_dir, 'audio'),
+                'clips': os.path.join(main_dir, 'clips'),
+                'metadata': os.path.join(main_dir, 'metadata'),
                 'logs': os.path.join(main_dir, 'logs')
             }
             
@@ -40,6 +35,43 @@ class DirectoryManager:
             self.logger.error(f"Error creating directory structure: {str(e)}")
             raise
 
+    def get_output_dir(self, input_path: str, base_output_path: str) -> str:
+        """Returns the main output directory of an input without creating it"""
+        # Get the directory name from input path
+        if os.path.isfile(input_path):
+            dir_name = os.path.splitext(os.path.basename(input_path))[0]
+        else:
+            dir_name = os.path.basename(input_path)
+        return os.path.join(os.path.abspath(base_output_path), dir_name)
+
+    def get_completion_marker_path(self, input_path: str, base_output_path: str) -> str:
+        """Returns the path of the marker written once an input has been processed"""
+        return os.path.join(self.get_output_dir(input_path, base_output_path), '.completed.json')
+
+    def link_duplicate_outputs(self, input_path: str, base_output_path: str, original: Dict[str, str]) -> str:
+        """
+        Point the outputs of a duplicate input at the outputs of the original.
+
+        Subdirectories are symlinked where the file system allows it, and a
+        duplicate_of.json reference is always written.
+        """
+        main_dir = self.get_output_dir(input_path, base_output_path)
+        os.makedirs(main_dir, exist_ok=True)
+
+        for subdir in ('frames', 'audio', 'clips', 'metadata'):
+            target = os.path.join(original['output_dir'], subdir)
+            link_path = os.path.join(main_dir, subdir)
+            if os.path.isdir(target) and not os.path.lexists(link_path):
+                try:
+                    os.symlink(target, link_path, target_is_directory=True)
+                except OSError as e:
+                    self.logger.warning(f"Could not link {link_path} to {target}: {str(e)}")
+
+        with open(os.path.join(main_dir, 'duplicate_of.json'), 'w') as f:
+            json.dump({'source': input_path, 'duplicate_of': original['source'],
+                       'output_dir': original['output_dir'], 'fingerprint': original['fingerprint']}, f, indent=2)
+        return main_dir
+
     def get_output_paths(self, input_path: str, output_base_path: str) -> Dict[str, str]:
-        """Returns paths for frames, audio, and logs directories"""
+        """Returns paths for frames, audio, clips, metadata and logs directories"""
         return self.create_directory_structure(input_path, output_base_path)
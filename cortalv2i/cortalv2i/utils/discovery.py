@@ -0,0 +1,173 @@
+import os
+import json
+import queue
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv')
+LIST_EXTENSIONS = ('.txt', '.csv')
+URL_PREFIXES = ('http://', 'https://', 'www.')
+
+# Sentinel placed on the result queue once the walk has finished
+_WALK_DONE = object()
+
+class DirectoryListingCache:
+    """
+    On-disk cache of filtered directory listings.
+
+    A listing is reused while the directory mtime is unchanged, which is the case
+    until an entry is added, removed or renamed directly inside that directory.
+    """
+    def __init__(self, cache_path: str, extensions: Sequence[str] = VIDEO_EXTENSIONS):
+        self.cache_path = cache_path
+        self.extensions = sorted(ext.lower() for ext in extensions)
+        self.entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable discovery cache {self.cache_path}: {str(e)}")
+            return
+
+        # Listings are filtered, so they are only valid for the same extension set
+        if data.get('extensions') == self.extensions:
+            self.entries = data.get('directories', {})
+
+    def get(self, path: str, mtime_ns: int) -> Optional[Tuple[List[str], List[str]]]:
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry and entry['mtime_ns'] == mtime_ns:
+            return entry['files'], entry['dirs']
+        return None
+
+    def put(self, path: str, mtime_ns: int, files: List[str], dirs: List[str]) -> None:
+        with self._lock:
+            self.entries[path] = {'mtime_ns': mtime_ns, 'files': files, 'dirs': dirs}
+
+    def save(self) -> None:
+        with self._lock:
+            data = {'extensions': self.extensions, 'directories': self.entries}
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+
+def _list_directory(path: str, extensions: Tuple[str, ...],
+                    cache: Optional[DirectoryListingCache]) -> Tuple[List[str], List[str]]:
+    """Return (matching files, subdirectories) directly inside path"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        if cache:
+            cached = cache.get(path, mtime_ns)
+            if cached:
+                return cached
+
+        files, dirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif entry.name.lower().endswith(extensions) and entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    continue
+
+        files.sort()
+        if cache:
+            cache.put(path, mtime_ns, files, dirs)
+        return files, dirs
+
+    except OSError as e:
+        logger.warning(f"Skipping unreadable directory {path}: {str(e)}")
+        return [], []
+
+def scan_directory(root: str, extensions: Sequence[str] = VIDEO_EXTENSIONS, max_workers: int = 8,
+                   cache_path: Optional[str] = None) -> Iterator[str]:
+    """
+    Recursively find files under root, listing directories in parallel.
+
+    The walk runs in the background and files are yielded as soon as their
+    directory has been listed, so callers can start processing before the walk
+    is complete. Order is not guaranteed across directories.
+
+    Args:
+        root: Directory to walk
+        extensions: File extensions to keep (case insensitive)
+        max_workers: Number of directories listed concurrently
+        cache_path: Optional JSON file used to cache listings between runs
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    cache = DirectoryListingCache(cache_path, extensions) if cache_path else None
+    found = queue.Queue()
+    stop = threading.Event()
+
+    def walk():
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pending = {executor.submit(_list_directory, root, extensions, cache)}
+                while pending and not stop.is_set():
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        files, dirs = future.result()
+                        for dir_path in dirs:
+                            pending.add(executor.submit(_list_directory, dir_path, extensions, cache))
+                        for file_path in files:
+                            found.put(file_path)
+
+                for future in pending:
+                    future.cancel()
+
+            if cache:
+                cache.save()
+        except Exception as e:
+            found.put(e)
+        finally:
+            found.put(_WALK_DONE)
+
+    threading.Thread(target=walk, name='source-discovery', daemon=True).start()
+
+    try:
+        while True:
+            item = found.get()
+            if item is _WALK_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+def iter_input_sources(source: str, extensions: Sequence[str] = VIDEO_EXTENSIONS, max_workers: int = 8,
+                       cache_path: Optional[str] = None) -> Iterator[str]:
+    """
+    Resolve an input source into the files/URLs to process.
+
+    Accepts a single video file, a .txt/.csv list with one entry per line,
+    a directory (walked recursively) or a URL.
+    """
+    if not source:
+        return
+
+    if os.path.isfile(source):
+        if source.lower().endswith(LIST_EXTENSIONS):
+            with open(source, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        yield line.strip()
+        elif source.lower().endswith(tuple(ext.lower() for ext in extensions)):
+            yield source
+    elif os.path.isdir(source):
+        yield from scan_directory(source, extensions, max_workers=max_workers, cache_path=cache_path)
+    elif source.startswith(URL_PREFIXES):
+        yield source
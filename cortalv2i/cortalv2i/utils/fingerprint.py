@@ -0,0 +1,103 @@
+import os
+import cv2
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def content_fingerprint(path: str, samples: int = 16, sample_size: int = 64 * 1024) -> str:
+    """
+    Cheap content hash of a file: its size plus evenly spaced byte ranges.
+
+    Reads at most samples * sample_size bytes, so it costs the same for a 100 MB
+    clip and a 50 GB recording. Small files are hashed in full.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= samples * sample_size:
+            digest.update(f.read())
+        else:
+            for i in range(samples):
+                f.seek((size - sample_size) * i // (samples - 1))
+                digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+def probe_signature(path: str) -> str:
+    """Stream metadata used to confirm a fingerprint match without decoding frames"""
+    cap = cv2.VideoCapture(path)
+    try:
+        return "{}x{}@{:.3f}:{}".format(
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            cap.get(cv2.CAP_PROP_FPS),
+            int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        )
+    finally:
+        cap.release()
+
+class FingerprintStore:
+    """
+    Fingerprints of processed sources and where their outputs live.
+
+    With a db_path the store is a SQLite file so duplicates are also found across
+    runs, otherwise it only lives for the current run.
+    """
+    def __init__(self, db_path: Optional[str] = None, verify_metadata: bool = True):
+        self.db_path = db_path
+        self.verify_metadata = verify_metadata
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if db_path:
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS fingerprints ('
+                    'fingerprint TEXT PRIMARY KEY, source TEXT, output_dir TEXT, probe TEXT, created_at REAL)'
+                )
+
+    def _lookup(self, fingerprint: str) -> Optional[dict]:
+        with self._lock:
+            if fingerprint in self._entries:
+                return self._entries[fingerprint]
+        if self.db_path:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute('SELECT * FROM fingerprints WHERE fingerprint = ?', (fingerprint,)).fetchone()
+            if row:
+                return dict(row)
+        return None
+
+    def find_duplicate(self, source: str, fingerprint: str) -> Optional[dict]:
+        """Return the record of an earlier source with the same content, if any"""
+        record = self._lookup(fingerprint)
+        if not record or os.path.abspath(record['source']) == os.path.abspath(source):
+            return None
+        if not os.path.isdir(record['output_dir']):
+            # The earlier outputs were removed, process this copy again
+            return None
+        if self.verify_metadata and record.get('probe') and record['probe'] != probe_signature(source):
+            logger.warning(f"Fingerprint match for {source} but stream metadata differs, processing it anyway")
+            return None
+        return record
+
+    def record(self, source: str, fingerprint: str, output_dir: str) -> None:
+        """Remember a successfully processed source"""
+        record = {
+            'fingerprint': fingerprint,
+            'source': source,
+            'output_dir': output_dir,
+            'probe': probe_signature(source) if self.verify_metadata else None,
+            'created_at': time.time()
+        }
+        with self._lock:
+            self._entries[fingerprint] = record
+        if self.db_path:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO fingerprints VALUES '
+                    '(:fingerprint, :source, :output_dir, :probe, :created_at)', record
+                )
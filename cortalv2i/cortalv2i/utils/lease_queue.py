@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    start_frame INTEGER,
+    end_frame INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    updated_at REAL,
+    after_kind TEXT,
+    PRIMARY KEY (source, kind, chunk_index)
+);
+CREATE INDEX IF NOT EXISTS units_state ON units (state, lease_expires);
+"""
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class LeaseQueue:
+    """
+    Work queue shared by several processes or machines through one SQLite file.
+
+    Work units are (source, kind, chunk) rows. A worker claims a unit by taking a
+    lease that expires after lease_seconds; leases of crashed workers expire and the
+    unit is handed to the next claimant, up to max_attempts times. Claims run in an
+    IMMEDIATE transaction, so two workers can never hold the same live lease.
+
+    A unit enqueued with after=<kind> is only handed out once every unit of that
+    kind of the same source is done, and fails when one of them failed.
+
+    The database relies on the file locking of the shared storage. Rollback journal
+    mode is used because WAL does not work on network file systems.
+    """
+    def __init__(self, db_path: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def has_source(self, source: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM units WHERE source = ? LIMIT 1', (source,)).fetchone() is not None
+
+    def enqueue(self, source: str, kind: str, chunk_ranges: List[Tuple[int, int]],
+                after: Optional[str] = None) -> int:
+        """
+        Add units for a source, units that already exist are left untouched.
+
+        With after set, the units wait until all units of that kind of the source are done.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.executemany(
+                'INSERT OR IGNORE INTO units (source, kind, chunk_index, start_frame, end_frame, updated_at, '
+                'after_kind) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(source, kind, index, start, end, now, after) for index, (start, end) in enumerate(chunk_ranges)]
+            )
+            return cursor.rowcount
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """Lease the next pending unit, or a unit whose lease has expired"""
+        now = time.time()
+        with self._transaction() as conn:
+            # Units whose last allowed attempt timed out are given up on
+            conn.execute(
+                "UPDATE units SET state = 'failed', updated_at = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            # Units that wait for a failed unit can never run
+            conn.execute(
+                "UPDATE units SET state = 'failed', result = ?, updated_at = ? "
+                "WHERE state = 'pending' AND after_kind IS NOT NULL AND EXISTS ("
+                "SELECT 1 FROM units AS dependency WHERE dependency.source = units.source "
+                "AND dependency.kind = units.after_kind AND dependency.state = 'failed')",
+                (json.dumps({'error': 'dependency failed'}), now)
+            )
+            row = conn.execute(
+                "SELECT * FROM units WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                "AND (after_kind IS NULL OR NOT EXISTS ("
+                "SELECT 1 FROM units AS dependency WHERE dependency.source = units.source "
+                "AND dependency.kind = units.after_kind AND dependency.state != 'done')) "
+                "ORDER BY source, kind, chunk_index LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row['state'] == 'leased':
+                logger.warning(f"Reclaiming expired lease of {row['owner']} on {row['source']} "
+                               f"{row['kind']} chunk {row['chunk_index']}")
+            conn.execute(
+                "UPDATE units SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE source = ? AND kind = ? AND chunk_index = ?",
+                (worker_id, now + self.lease_seconds, now, row['source'], row['kind'], row['chunk_index'])
+            )
+            unit = dict(row)
+            unit.update(state='leased', owner=worker_id, attempts=row['attempts'] + 1)
+            return unit
+
+    def _update_own_lease(self, unit: Dict, worker_id: str, assignments: str, values: tuple) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE units SET {assignments}, updated_at = ? "
+                "WHERE source = ? AND kind = ? AND chunk_index = ? AND owner = ? AND state = 'leased'",
+                values + (time.time(), unit['source'], unit['kind'], unit['chunk_index'], worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def renew(self, unit: Dict, worker_id: str) -> bool:
+        """Extend a lease, False if it was lost to another worker"""
+        return self._update_own_lease(unit, worker_id, 'lease_expires = ?', (time.time() + self.lease_seconds,))
+
+    def complete(self, unit: Dict, worker_id: str, result: Optional[Dict] = None) -> bool:
+        """Mark a unit done, False if the lease was lost in the meantime"""
+        return self._update_own_lease(unit, worker_id, "state = 'done', result = ?", (json.dumps(result or {}),))
+
+    def fail(self, unit: Dict, worker_id: str, error: str) -> bool:
+        """Give a unit back for another attempt, or fail it after max_attempts"""
+        state = 'failed' if unit['attempts'] >= self.max_attempts else 'pending'
+        return self._update_own_lease(unit, worker_id, 'state = ?, result = ?',
+                                      (state, json.dumps({'error': error, 'worker': worker_id})))
+
+    def source_finished(self, source: str) -> bool:
+        """True when no unit of the source is pending or leased"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM units WHERE source = ? AND state IN ('pending', 'leased') LIMIT 1", (source,)
+            ).fetchone() is None
+
+    def source_failed(self, source: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM units WHERE source = ? AND state = 'failed' LIMIT 1", (source,)
+            ).fetchone() is not None
+
+    def is_drained(self) -> bool:
+        """True when no unit is pending or leased anywhere"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM units WHERE state IN ('pending', 'leased') LIMIT 1"
+            ).fetchone() is None
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            return {row['state']: row['count'] for row in
+                    conn.execute('SELECT state, COUNT(*) AS count FROM units GROUP BY state')}
+
+    @contextmanager
+    def keep_alive(self, unit: Dict, worker_id: str):
+        """Renew the lease in the background while the unit is being processed"""
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(unit, worker_id):
+                        logger.warning(f"Lost lease on {unit['source']} {unit['kind']} chunk {unit['chunk_index']}")
+                        return
+                except sqlite3.Error as e:
+                    logger.warning(f"Error renewing lease: {str(e)}")
+
+        thread = threading.Thread(target=heartbeat, name='lease-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
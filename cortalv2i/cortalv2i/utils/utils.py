@@ -4,6 +4,8 @@ import logging
 from typing import List, Union
 from pathlib import Path
 
+from .discovery import VIDEO_EXTENSIONS, iter_input_sources
+
 def setup_logging(filename: str) -> None:
     """Setup logging configuration"""
     logging.basicConfig(
@@ -55,41 +57,13 @@ def process_input_source(input_path: str) -> List[str]:
     """
     Process input source and return list of video files to process
     """
-    sources = []
-    
-    if not input_path:
-        return sources
-
-    # Handle direct video file
-    if os.path.isfile(input_path):
-        if is_video_file(input_path):
-            sources.append(input_path)
-        elif input_path.endswith('.txt'):
-            # Read video paths from text file
-            try:
-                with open(input_path, 'r') as f:
-                    for line in f:
-                        path = line.strip()
-                        if path and is_video_file(path):
-                            sources.append(path)
-            except Exception as e:
-                logging.error(f"Error reading text file: {str(e)}")
-    
-    # Handle directory
-    elif os.path.isdir(input_path):
-        for root, _, files in os.walk(input_path):
-            for file in files:
-                if is_video_file(file):
-                    sources.append(os.path.join(root, file))
-    
-    return sources
+    return list(iter_input_sources(input_path))
 
 def is_video_file(filepath: str) -> bool:
     """
     Check if file is a video based on extension
     """
-    video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv'}
-    return Path(filepath).suffix.lower() in video_extensions
+    return Path(filepath).suffix.lower() in VIDEO_EXTENSIONS
 
 def validate_path(path: str) -> bool:
     """
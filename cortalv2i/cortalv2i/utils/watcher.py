@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .discovery import VIDEO_EXTENSIONS, scan_directory
+
+logger = logging.getLogger(__name__)
+
+def get_file_signature(path: str) -> Tuple[int, int]:
+    """(size, mtime_ns) of a file, used to notice growing or replaced files"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def write_completion_marker(marker_path: str, source: str, status: str) -> None:
+    """Record that a source has been processed, tied to the file version that was processed"""
+    marker = {'source': source, 'status': status,
+              'completed_at': datetime.now(timezone.utc).isoformat()}
+    if os.path.isfile(source):
+        marker['size'], marker['mtime_ns'] = get_file_signature(source)
+
+    os.makedirs(os.path.dirname(marker_path), exist_ok=True)
+    tmp_path = f"{marker_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(marker, f, indent=2)
+    os.replace(tmp_path, marker_path)
+
+def is_completion_marker_current(marker_path: str, source: str) -> bool:
+    """True when the marker exists and was written for the current version of source"""
+    try:
+        with open(marker_path, 'r') as f:
+            marker = json.load(f)
+        return (marker.get('size'), marker.get('mtime_ns')) == get_file_signature(source)
+    except (OSError, ValueError):
+        return False
+
+class FolderWatcher:
+    """
+    Poll directories for new videos and hand them out once they stopped growing.
+
+    A file is ready when its size and mtime have not changed for settle_seconds,
+    measured with the local clock so clock skew on network shares does not matter.
+    """
+    def __init__(self, directories: Sequence[str], settle_seconds: float = 10.0, poll_interval: float = 2.0,
+                 extensions: Sequence[str] = VIDEO_EXTENSIONS, max_workers: int = 8,
+                 is_done: Optional[Callable[[str], bool]] = None):
+        self.directories = list(directories)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.extensions = extensions
+        self.max_workers = max_workers
+        self.is_done = is_done
+        # path -> (size, mtime_ns, monotonic time the signature was first seen)
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+        # path -> (size, mtime_ns) already handed out
+        self._dispatched: Dict[str, Tuple[int, int]] = {}
+
+    def poll(self) -> List[str]:
+        """Scan once and return the files that became ready since the last poll"""
+        now = time.monotonic()
+        ready = []
+        seen = set()
+
+        for directory in self.directories:
+            for path in scan_directory(directory, self.extensions, max_workers=self.max_workers):
+                seen.add(path)
+                try:
+                    signature = get_file_signature(path)
+                except OSError:
+                    continue
+
+                if self._dispatched.get(path) == signature:
+                    continue
+
+                previous = self._pending.get(path)
+                if previous is None or previous[:2] != signature:
+                    self._pending[path] = (*signature, now)
+                    continue
+
+                if now - previous[2] >= self.settle_seconds:
+                    del self._pending[path]
+                    self._dispatched[path] = signature
+                    if self.is_done and self.is_done(path):
+                        continue
+                    ready.append(path)
+
+        # Forget files that were removed so a new file with the same name is picked up again
+        for tracked in (self._pending, self._dispatched):
+            for path in [path for path in tracked if path not in seen]:
+                del tracked[path]
+
+        return ready
+
+    def watch(self, stop_event: Optional[threading.Event] = None) -> Iterator[str]:
+        """Yield ready files until stop_event is set"""
+        stop_event = stop_event or threading.Event()
+        logger.info(f"Watching {', '.join(self.directories)} for new videos")
+        while not stop_event.is_set():
+            for path in self.poll():
+                yield path
+            stop_event.wait(self.poll_interval)
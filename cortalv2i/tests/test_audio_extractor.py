@@ -0,0 +1,17 @@
+from cortalv2i.core.audio_extractor import AudioExtractor
+
+
+def test_get_speech_segments_pads_and_merges_non_silent_spans():
+    silences = [(0.0, 2.0), (5.0, 5.3), (10.0, None)]
+
+    segments = AudioExtractor.get_speech_segments(silences, duration=12.0, padding=0.25)
+
+    assert segments == [(1.75, 10.25)]
+
+
+def test_get_speech_segments_splits_long_segments_and_drops_short_ones():
+    silences = [(0.2, 100.0)]
+
+    segments = AudioExtractor.get_speech_segments(silences, duration=160.0, padding=0.0, max_segment=40.0)
+
+    assert segments == [(100.0, 130.0), (130.0, 160.0)]
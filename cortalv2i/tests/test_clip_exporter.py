@@ -0,0 +1,11 @@
+from cortalv2i.core.clip_exporter import ClipExporter
+
+
+def test_ranges_around_merges_overlapping_clips_and_clamps_to_duration():
+    ranges = ClipExporter.ranges_around([2.0, 2.5, 9.0, 0.5], before=1.0, after=1.5, duration=10.0)
+
+    assert ranges == [(0.0, 4.0), (8.0, 10.0)]
+
+
+def test_merge_ranges_drops_empty_ranges():
+    assert ClipExporter.merge_ranges([(5, 5), (12, 20), (1, 3)], duration=10.0) == [(1.0, 3.0)]
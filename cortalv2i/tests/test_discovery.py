@@ -0,0 +1,41 @@
+import os
+
+from cortalv2i.utils.discovery import iter_input_sources, scan_directory
+
+
+def make_tree(root):
+    for rel_path in ['a.mp4', 'notes.txt', 'sub/b.MOV', 'sub/deeper/c.mkv', 'other/d.wmv', 'other/e.jpg']:
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+
+
+def test_scan_directory_finds_videos_recursively(tmp_path):
+    make_tree(tmp_path)
+
+    found = sorted(os.path.relpath(p, tmp_path) for p in scan_directory(str(tmp_path), max_workers=3))
+
+    assert found == ['a.mp4', os.path.join('other', 'd.wmv'), os.path.join('sub', 'b.MOV'),
+                     os.path.join('sub', 'deeper', 'c.mkv')]
+
+
+def test_scan_directory_cache_tracks_directory_changes(tmp_path):
+    tree = tmp_path / 'tree'
+    make_tree(tree)
+    cache_path = str(tmp_path / 'cache.json')
+
+    assert len(list(scan_directory(str(tree), cache_path=cache_path))) == 4
+    assert os.path.exists(cache_path)
+    assert len(list(scan_directory(str(tree), cache_path=cache_path))) == 4
+
+    (tree / 'sub' / 'new.avi').write_bytes(b'')
+    assert len(list(scan_directory(str(tree), cache_path=cache_path))) == 5
+
+
+def test_iter_input_sources_reads_list_files_and_urls(tmp_path):
+    listing = tmp_path / 'sources.txt'
+    listing.write_text('first.mp4\n\nhttps://example.com/video\n')
+
+    assert list(iter_input_sources(str(listing))) == ['first.mp4', 'https://example.com/video']
+    assert list(iter_input_sources('https://example.com/video')) == ['https://example.com/video']
+    assert list(iter_input_sources(str(tmp_path / 'missing.mp4'))) == []
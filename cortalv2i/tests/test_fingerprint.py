@@ -0,0 +1,35 @@
+import os
+import shutil
+
+from cortalv2i.utils.fingerprint import FingerprintStore, content_fingerprint
+
+
+def test_content_fingerprint_matches_copies_only(tmp_path):
+    original = tmp_path / 'original.mp4'
+    original.write_bytes(os.urandom(3 * 1024 * 1024))
+    copy = tmp_path / 'renamed copy.mp4'
+    shutil.copy(original, copy)
+    changed = tmp_path / 'changed.mp4'
+    data = bytearray(original.read_bytes())
+    data[-1] ^= 0xFF
+    changed.write_bytes(bytes(data))
+
+    assert content_fingerprint(str(original)) == content_fingerprint(str(copy))
+    assert content_fingerprint(str(original)) != content_fingerprint(str(changed))
+
+
+def test_fingerprint_store_finds_duplicates_across_runs(tmp_path):
+    original = tmp_path / 'a.mp4'
+    original.write_bytes(b'same footage')
+    copy = tmp_path / 'b.mp4'
+    copy.write_bytes(b'same footage')
+    output_dir = tmp_path / 'out' / 'a'
+    output_dir.mkdir(parents=True)
+    db_path = str(tmp_path / 'fingerprints.db')
+    fingerprint = content_fingerprint(str(original))
+
+    FingerprintStore(db_path, verify_metadata=False).record(str(original), fingerprint, str(output_dir))
+    next_run = FingerprintStore(db_path, verify_metadata=False)
+
+    assert next_run.find_duplicate(str(copy), fingerprint)['source'] == str(original)
+    assert next_run.find_duplicate(str(original), fingerprint) is None
@@ -0,0 +1,57 @@
+import threading
+
+from cortalv2i.core import governor as governor_module
+from cortalv2i.core.governor import AdjustableLimiter, ConcurrencyGovernor
+
+
+def test_adjustable_limiter_admits_waiters_when_raised():
+    limiter = AdjustableLimiter(1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def waiter():
+        limiter.acquire()
+        acquired.set()
+
+    threading.Thread(target=waiter, daemon=True).start()
+    assert not acquired.wait(0.1)
+
+    limiter.set_limit(2)
+    assert acquired.wait(1)
+    assert limiter.active == 2
+
+
+def test_governor_sheds_workers_above_memory_soft_limit():
+    governor = ConcurrencyGovernor(max_workers=4, memory_limit_mb=1, memory_soft_ratio=0.5)
+
+    governor._adjust()
+
+    assert governor.workers.limit == 3
+
+
+def test_governor_pauses_decoding_only_while_frames_are_in_flight():
+    governor = ConcurrencyGovernor(memory_limit_mb=1, interval=0.05)
+    governor.wait_for_memory()  # nothing buffered, must not block
+
+    governor.frame_buffered(100)
+    released = threading.Timer(0.1, governor.frame_released, args=(100,))
+    released.start()
+    governor.wait_for_memory()
+    assert governor.in_flight_bytes == 0
+
+
+def test_governor_keeps_minimum_limits_without_usage_metrics(monkeypatch, caplog):
+    monkeypatch.setattr(governor_module, 'get_cpu_utilisation', lambda: None)
+    monkeypatch.setattr(governor_module, 'get_rss_bytes', lambda: None)
+
+    with caplog.at_level('WARNING'):
+        governor = ConcurrencyGovernor(min_workers=2, max_workers=8, max_encoders=8, memory_limit_mb=1)
+
+    assert 'cannot be measured' in caplog.text
+    assert (governor.workers.limit, governor.encoders.limit) == (2, 1)
+    assert not governor.metrics_available
+    governor.start()
+    assert governor._thread is None
+
+    governor.frame_buffered(100)
+    governor.wait_for_memory()  # must not block on an unknown RSS
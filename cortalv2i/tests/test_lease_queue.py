@@ -0,0 +1,98 @@
+import json
+import multiprocessing
+import sqlite3
+import time
+
+from cortalv2i.utils.lease_queue import LeaseQueue
+
+
+def drain_queue(db_path, worker_id):
+    lease_queue = LeaseQueue(db_path)
+    while True:
+        unit = lease_queue.claim(worker_id)
+        if unit is None:
+            return
+        time.sleep(0.01)
+        lease_queue.complete(unit, worker_id, {'worker': worker_id})
+
+
+def test_processes_share_units_without_duplicates(tmp_path):
+    db_path = str(tmp_path / 'queue.db')
+    lease_queue = LeaseQueue(db_path)
+    for source in ('a.mp4', 'b.mp4', 'c.mp4'):
+        lease_queue.enqueue(source, 'frames', [(i * 10, (i + 1) * 10) for i in range(10)])
+    # Enqueueing again from another node is a no-op
+    assert lease_queue.enqueue('a.mp4', 'frames', [(0, 10)]) == 0
+
+    workers = [multiprocessing.Process(target=drain_queue, args=(db_path, f'worker-{i}')) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    assert lease_queue.counts() == {'done': 30}
+    assert lease_queue.is_drained()
+    with sqlite3.connect(db_path) as conn:
+        attempts = [row[0] for row in conn.execute('SELECT attempts FROM units')]
+        owners = {json.loads(row[0])['worker'] for row in conn.execute('SELECT result FROM units')}
+    assert set(attempts) == {1}
+    assert len(owners) > 1
+
+
+def test_expired_leases_are_reclaimed(tmp_path):
+    lease_queue = LeaseQueue(str(tmp_path / 'queue.db'), lease_seconds=0.1, max_attempts=2)
+    lease_queue.enqueue('a.mp4', 'frames', [(0, 10)])
+
+    crashed = lease_queue.claim('crashed-worker')
+    assert lease_queue.claim('other-worker') is None
+    time.sleep(0.15)
+
+    reclaimed = lease_queue.claim('other-worker')
+    assert reclaimed['chunk_index'] == crashed['chunk_index']
+    assert reclaimed['attempts'] == 2
+    # The original owner lost its lease and cannot overwrite the result
+    assert not lease_queue.complete(crashed, 'crashed-worker')
+    assert lease_queue.complete(reclaimed, 'other-worker')
+    assert lease_queue.source_finished('a.mp4')
+
+
+def test_units_fail_after_max_attempts(tmp_path):
+    lease_queue = LeaseQueue(str(tmp_path / 'queue.db'), max_attempts=1)
+    lease_queue.enqueue('a.mp4', 'audio', [(0, 0)])
+
+    unit = lease_queue.claim('worker')
+    lease_queue.fail(unit, 'worker', 'boom')
+
+    assert lease_queue.claim('worker') is None
+    assert lease_queue.source_failed('a.mp4')
+
+
+def test_dependent_units_wait_for_their_dependencies(tmp_path):
+    lease_queue = LeaseQueue(str(tmp_path / 'queue.db'))
+    lease_queue.enqueue('a.mp4', 'frames', [(0, 10), (10, 20)])
+    # 'clips' sorts before 'frames', it must still come last
+    lease_queue.enqueue('a.mp4', 'clips', [(0, 0)], after='frames')
+
+    first = lease_queue.claim('worker-1')
+    second = lease_queue.claim('worker-2')
+    assert {first['kind'], second['kind']} == {'frames'}
+    assert lease_queue.claim('worker-3') is None
+
+    lease_queue.complete(first, 'worker-1')
+    assert lease_queue.claim('worker-3') is None
+    lease_queue.complete(second, 'worker-2')
+    assert lease_queue.claim('worker-3')['kind'] == 'clips'
+
+
+def test_dependent_units_fail_with_their_dependencies(tmp_path):
+    lease_queue = LeaseQueue(str(tmp_path / 'queue.db'), max_attempts=1)
+    lease_queue.enqueue('a.mp4', 'frames', [(0, 10)])
+    lease_queue.enqueue('a.mp4', 'clips', [(0, 0)], after='frames')
+
+    unit = lease_queue.claim('worker')
+    lease_queue.fail(unit, 'worker', 'boom')
+
+    assert lease_queue.claim('worker') is None
+    assert lease_queue.counts() == {'failed': 2}
+    assert lease_queue.source_finished('a.mp4')
@@ -1,7 +1,93 @@
-import pytest
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
 
-def test_main_functionality():
-    # Test main function interactions and defaults.
-    pass
+import cv2
+import numpy as np
+import cortalv2i
 
-# Additional tests for main functionalities.
\ No newline at end of file
+# main.py is a script that imports its siblings as top level modules
+sys.path.insert(0, os.path.dirname(cortalv2i.__file__))
+import main  # noqa: E402
+from core.governor import ConcurrencyGovernor  # noqa: E402
+from utils.dir_manager import DirectoryManager  # noqa: E402
+from utils.fingerprint import FingerprintStore, content_fingerprint  # noqa: E402
+from utils.lease_queue import LeaseQueue  # noqa: E402
+
+
+def write_test_video(path, frame_count=20, fps=10, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for i in range(frame_count):
+        writer.write(np.full((size[1], size[0], 3), i * 8 % 256, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_coordinated_mode_exports_clips_after_all_frames(tmp_path, monkeypatch):
+    sources = [write_test_video(tmp_path / f'{name}.mp4') for name in ('a', 'b')]
+    queue_path = str(tmp_path / 'queue.db')
+    lock = threading.Lock()
+    frames_done = {source: 0 for source in sources}
+    clips_saw = {}
+
+    def fake_process_unit(unit, *args, **kwargs):
+        if unit['kind'] == 'clips':
+            with lock:
+                clips_saw[unit['source']] = frames_done[unit['source']]
+            return True
+        time.sleep(0.2)
+        with lock:
+            frames_done[unit['source']] += 1
+        return True
+
+    monkeypatch.setattr(main, 'process_unit', fake_process_unit)
+    main.run_coordinated(sources, queue_path, 'worker', str(tmp_path / 'out'),
+                         {'frames': {}, 'clips': {'mode': 'sampled'}}, {'poll_interval': 0.05},
+                         DirectoryManager(), ConcurrencyGovernor(max_workers=3), logging.getLogger('test'))
+
+    assert clips_saw == frames_done
+    assert all(count > 0 for count in clips_saw.values())
+    assert LeaseQueue(queue_path).counts() == {'done': sum(frames_done.values()) + len(sources)}
+
+
+def run_with_copies(tmp_path, monkeypatch, failing_sources):
+    original = write_test_video(tmp_path / 'a.mp4')
+    copy = str(tmp_path / 'b.mp4')
+    shutil.copy(original, copy)
+    store = FingerprintStore(str(tmp_path / 'fingerprints.db'))
+    processed = []
+
+    def fake_process_unit(unit, *args, **kwargs):
+        processed.append(unit['source'])
+        # The copy must not be settled while its original is still running
+        assert not os.path.exists(os.path.join(tmp_path, 'out', 'b', 'duplicate_of.json'))
+        return unit['source'] not in failing_sources
+
+    monkeypatch.setattr(main, 'process_unit', fake_process_unit)
+    main.run_coordinated([original, copy], str(tmp_path / 'queue.db'), 'worker', str(tmp_path / 'out'),
+                         {'frames': {}}, {'poll_interval': 0.05, 'max_attempts': 1},
+                         DirectoryManager(), ConcurrencyGovernor(max_workers=2), logging.getLogger('test'), store)
+    return original, copy, store, processed
+
+
+def test_coordinated_mode_links_copies_once_the_original_is_done(tmp_path, monkeypatch):
+    original, copy, store, processed = run_with_copies(tmp_path, monkeypatch, failing_sources=())
+
+    assert set(processed) == {original}
+    assert store.find_duplicate(copy, content_fingerprint(copy))['source'] == original
+    with open(os.path.join(DirectoryManager().get_output_dir(copy, str(tmp_path / 'out')), 'duplicate_of.json')) as f:
+        assert json.load(f)['duplicate_of'] == original
+
+
+def test_coordinated_mode_does_not_record_failed_sources(tmp_path, monkeypatch):
+    original, copy, store, processed = run_with_copies(tmp_path, monkeypatch,
+                                                       failing_sources=(str(tmp_path / 'a.mp4'),))
+
+    # The copy is processed in place of the failed original, and only it is recorded
+    assert processed == [original, copy]
+    third = shutil.copy(copy, tmp_path / 'c.mp4')
+    assert store.find_duplicate(str(third), content_fingerprint(copy))['source'] == copy
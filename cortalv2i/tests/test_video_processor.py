@@ -1,5 +1,13 @@
+import shutil
+
+import cv2
+import numpy as np
 import pytest
 
+from cortalv2i.core.frame_metadata import FrameMetadataWriter, load_frame_metadata
+from cortalv2i.core.proxy_decoder import ProxyReader, fetch_frames
+from cortalv2i.core.video_processor import VideoProcessor, iter_frames
+
 def test_extract_frames_from_stream():
     # Test code that checks whether frames are extracted correctly.
     pass
@@ -8,4 +16,169 @@ def test_save_frame():
     # Test saving frames in different formats.
     pass
 
-# Additional tests for other functionalities.
\ No newline at end of file
+# Additional tests for other functionalities.
+
+
+def write_test_video(path, frame_count=60, fps=10, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for i in range(frame_count):
+        writer.write(np.full((size[1], size[0], 3), i * 4 % 256, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_iter_frames_yields_sampled_frames_in_order(tmp_path):
+    video = write_test_video(tmp_path / "clip.mp4")
+    config = {'method': 'fps', 'params': {'fps': 2}, 'resolution': '32*24'}
+
+    frames = list(iter_frames(video, config, chunk_minutes=0.05, max_workers=3, prefetch=2))
+
+    assert [index for index, _, _ in frames] == list(range(0, 60, 5))
+    assert frames[1][1] == 0.5
+    assert frames[0][2].shape == (24, 32, 3)
+
+
+def test_iter_frames_can_be_closed_early(tmp_path):
+    video = write_test_video(tmp_path / "clip.mp4")
+    stream = iter_frames(video, {'method': 'fps', 'params': {'fps': 10}},
+                         chunk_minutes=0.05, prefetch=1)
+
+    assert next(stream)[0] == 0
+    stream.close()
+
+
+def test_iter_frames_builds_resolution_pyramid(tmp_path):
+    video = write_test_video(tmp_path / "clip.mp4", size=(64, 48))
+    config = {'method': 'fps', 'params': {'fps': 2}, 'resolution': ['16', 'original', '32*24']}
+
+    _, _, levels = next(iter_frames(video, config))
+
+    assert list(levels) == ['original', '32x24', '16']
+    assert levels['original'].shape == (48, 64, 3)
+    assert levels['32x24'].shape == (24, 32, 3)
+    assert levels['16'].shape == (12, 16, 3)
+
+
+def test_pyramid_levels_are_never_built_from_an_upscaled_frame(tmp_path):
+    video = write_test_video(tmp_path / "clip.mp4", size=(64, 48))
+    config = {'method': 'fps', 'params': {'fps': 2}, 'resolution': ['original', '128*96', '32*24']}
+
+    _, _, plain = next(iter_frames(video, {'method': 'fps', 'params': {'fps': 2}}))
+    _, _, levels = next(iter_frames(video, config))
+
+    assert list(levels) == ['128x96', 'original', '32x24']
+    assert np.array_equal(levels['original'], plain)
+    assert levels['128x96'].shape == (96, 128, 3)
+    assert np.array_equal(levels['32x24'], cv2.resize(plain, (32, 24), interpolation=cv2.INTER_AREA))
+
+
+def test_levels_with_another_aspect_ratio_are_resized_from_the_source():
+    frame = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    plan = [('original', None), ('32x24', (32, 24)), ('100x10', (100, 10)), ('16x12', (16, 12))]
+
+    levels = VideoProcessor._resize_cascade(frame, plan)
+
+    assert levels['original'] is frame
+    assert np.array_equal(levels['100x10'], cv2.resize(frame, (100, 10), interpolation=cv2.INTER_AREA))
+    # 16x12 is smaller than 100x10 in both dimensions but not the same shape
+    assert np.array_equal(levels['16x12'], cv2.resize(frame, (16, 12), interpolation=cv2.INTER_AREA))
+    cascaded = cv2.resize(levels['32x24'], (16, 12), interpolation=cv2.INTER_AREA)
+    assert np.array_equal(VideoProcessor._resize_cascade(frame, plan[:2] + plan[3:])['16x12'], cascaded)
+
+
+def write_quality_test_video(path, fps=10):
+    """Every second: a black frame, a blurred frame, a sharp frame, then more blurred frames"""
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    blurred = cv2.GaussianBlur(texture, (15, 15), 5)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, (64, 48))
+    for second in range(3):
+        writer.write(np.zeros_like(texture))
+        writer.write(blurred)
+        writer.write(texture)
+        for _ in range(fps - 3):
+            writer.write(blurred)
+    writer.release()
+    return str(path)
+
+
+def test_quality_gate_defers_dark_frames_and_picks_sharpest(tmp_path):
+    video = write_quality_test_video(tmp_path / "quality.avi")
+    config = {'method': 'fps', 'params': {'fps': 1}}
+
+    deferred = dict(config, quality={'min_brightness': 20, 'selection': 'first_acceptable'})
+    sharpest = dict(config, quality={'min_brightness': 20, 'selection': 'sharpest'})
+    dropped = dict(config, quality={'min_brightness': 20})
+
+    assert [i for i, _, _ in iter_frames(video, deferred)] == [1, 11, 21]
+    assert [i for i, _, _ in iter_frames(video, sharpest)] == [2, 12, 22]
+    assert list(iter_frames(video, dropped)) == []
+
+
+def test_extract_frames_writes_metadata_sidecar(tmp_path):
+    video = write_quality_test_video(tmp_path / "quality.avi")
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    config = {'method': 'fps', 'params': {'fps': 1}, 'output_format': 'jpg',
+              'resolution': ['original', '32'], 'quality': {'selection': 'sharpest'}}
+
+    with FrameMetadataWriter(str(tmp_path / "metadata" / "frames-part-0001"), format='csv',
+                             batch_size=2) as writer:
+        VideoProcessor(frames_dir=str(frames_dir), metadata_writer=writer).extract_frames(video, 0, 30, config)
+
+    metadata = load_frame_metadata(str(tmp_path / "metadata"))
+    assert list(metadata['frame_index']) == [2, 2, 12, 12, 22, 22]
+    assert list(metadata['level'].unique()) == ['32', 'original']
+    assert metadata.loc[metadata['level'] == '32', 'width'].tolist() == [32, 32, 32]
+    assert metadata['timestamp'].tolist()[::2] == [0.2, 1.2, 2.2]
+    assert (metadata['bytes'] > 0).all() and (metadata['sharpness'] > 0).all()
+
+
+def test_fetch_frames_reads_requested_indices(tmp_path):
+    video = write_test_video(tmp_path / "clip.mp4")
+    cap = cv2.VideoCapture(video)
+    try:
+        sequential = [cap.read()[1] for _ in range(60)]
+        # 2 -> 5 is grabbed through, 5 -> 40 and 40 -> 10 seek
+        frames = list(fetch_frames(cap, [2, 5, 40, 10], max_gap=10))
+    finally:
+        cap.release()
+
+    assert [index for index, _ in frames] == [2, 5, 40, 10]
+    for index, frame in frames:
+        assert np.array_equal(frame, sequential[index])
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg is not installed")
+def test_proxy_mode_selects_the_same_frames(tmp_path):
+    video = write_quality_test_video(tmp_path / "quality.avi")
+    config = {'method': 'fps', 'params': {'fps': 1},
+              'quality': {'min_brightness': 20, 'selection': 'first_acceptable'}}
+
+    # Chunks of 15 frames, so the second proxy decode starts with a seek
+    direct = [index for index, _, _ in iter_frames(video, config, chunk_minutes=0.025)]
+    proxied = list(iter_frames(video, dict(config, proxy={'width': 32}), chunk_minutes=0.025))
+
+    assert [index for index, _, _ in proxied] == direct == [1, 11, 15, 25]
+    assert proxied[0][2].shape == (48, 64, 3)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg is not installed")
+def test_failed_proxy_decode_raises_instead_of_ending_the_chunk(tmp_path):
+    broken = tmp_path / "broken.mp4"
+    broken.write_bytes(b'not a video' * 100)
+    reader = ProxyReader(str(broken), 0, 10, 10.0, (64, 48), width=32)
+    with pytest.raises(RuntimeError, match="Proxy decode failed after 0 frames"):
+        reader.read()
+    reader.release()
+
+
+def test_proxy_without_quality_gate_is_ignored_with_a_warning(tmp_path, caplog):
+    video = write_test_video(tmp_path / "clip.mp4")
+    config = {'method': 'fps', 'params': {'fps': 2}}
+
+    with caplog.at_level('WARNING'):
+        proxied = [index for index, _, _ in iter_frames(video, dict(config, proxy={'width': 32}))]
+
+    assert proxied == [index for index, _, _ in iter_frames(video, config)]
+    assert 'no effect without frames.quality' in caplog.text
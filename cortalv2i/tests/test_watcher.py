@@ -0,0 +1,30 @@
+import time
+
+from cortalv2i.utils.watcher import FolderWatcher, is_completion_marker_current, write_completion_marker
+
+
+def test_folder_watcher_waits_for_files_to_settle(tmp_path):
+    video = tmp_path / 'incoming.mp4'
+    video.write_bytes(b'partial')
+    watcher = FolderWatcher([str(tmp_path)], settle_seconds=0.2)
+
+    assert watcher.poll() == []
+    time.sleep(0.1)
+    video.write_bytes(b'partial and growing')
+    assert watcher.poll() == []
+    time.sleep(0.25)
+
+    assert watcher.poll() == [str(video)]
+    assert watcher.poll() == []
+
+
+def test_completion_marker_is_tied_to_file_version(tmp_path):
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'v1')
+    marker = str(tmp_path / 'out' / '.completed.json')
+
+    write_completion_marker(marker, str(video), 'completed')
+    assert is_completion_marker_current(marker, str(video))
+
+    video.write_bytes(b'version two')
+    assert not is_completion_marker_current(marker, str(video))
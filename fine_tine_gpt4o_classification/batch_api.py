@@ -0,0 +1,247 @@
+import os
+import json
+import hashlib
+import time
+from typing import Iterable, List, Union
+from PIL import Image
+from batch_classification import list_images
+from test_image_classification import Config, ImageClassification
+
+# Limits of a single Batch API input file
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_FILE_BYTES = 200 * 1024 * 1024
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+MANIFEST_NAME = "manifest.json"
+
+class OfflineBatchClassifier(ImageClassification):
+    """
+    Classify large image sets through the Batch API instead of interactive calls.
+
+    The steps are driven by a manifest JSON file, so a run can be stopped after
+    submitting and resumed later to poll and collect:
+
+        build    -> batch input shards with the same request body as predict()
+        submit   -> upload every shard and create one batch per shard
+        wait     -> poll until every batch reached a final status
+        collect  -> download the outputs and join them back to the image paths
+    """
+    def __init__(self, config: Config, model: str, instruction_prompt: str,
+                 max_requests: int = MAX_BATCH_REQUESTS, max_bytes: int = MAX_BATCH_FILE_BYTES):
+        super().__init__(config)
+        self.model = model
+        self.instruction_prompt = instruction_prompt
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def load_manifest(manifest_path: str) -> dict:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def save_manifest(manifest: dict, manifest_path: str):
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    @staticmethod
+    def source_hash(image_paths: List[str]) -> str:
+        """Identifies the image set a manifest was built for"""
+        return hashlib.sha256('\n'.join(image_paths).encode('utf-8')).hexdigest()
+
+    def encode_image(self, image_path: str) -> str:
+        with Image.open(image_path) as image:
+            base64_image = self.image_to_base64(self.prepare_image(image))
+        if not base64_image:
+            raise ValueError(f"Could not encode {image_path}")
+        return base64_image
+
+    def build_request_line(self, custom_id: str, base64_image: str) -> str:
+        return json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": CHAT_COMPLETIONS_ENDPOINT,
+            "body": self.build_request(self.instruction_prompt, self.model, base64_image),
+        }) + '\n'
+
+    def build(self, source: Union[str, Iterable[str]], work_dir: str) -> str:
+        """Write batch input shards for every image, returns the manifest path"""
+        manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+        # Rebuilding would lose the ids of batches that are already running and paid for
+        if os.path.exists(manifest_path) and \
+                any(shard.get("batch_id") for shard in self.load_manifest(manifest_path)["shards"]):
+            raise FileExistsError(f"{manifest_path} has submitted batches, collect them or use another work_dir")
+        os.makedirs(work_dir, exist_ok=True)
+        image_paths = list_images(source)
+        manifest = {"model": self.model, "source_hash": self.source_hash(image_paths), "images": {}, "skipped": {},
+                    "shards": [], "cache_keys": {}, "cached": {}}
+        shard, shard_file = None, None
+
+        try:
+            for index, image_path in enumerate(image_paths):
+                custom_id = f"image-{index:07d}"
+                try:
+                    base64_image = self.encode_image(image_path)
+                except Exception as e:
+                    manifest["skipped"][image_path] = str(e)
+                    continue
+
+                if self.cache:
+                    key = self.cache_key(self.instruction_prompt, self.model, base64_image)
+                    cached = self.cache.get(key)
+                    if cached:
+                        manifest["cached"][custom_id] = {"image_path": image_path, "prediction": cached["prediction"]}
+                        continue
+                    manifest["cache_keys"][custom_id] = key
+
+                line = self.build_request_line(custom_id, base64_image)
+
+                size = len(line.encode('utf-8'))
+                if shard is None or shard["requests"] >= self.max_requests or shard["bytes"] + size > self.max_bytes:
+                    if shard_file:
+                        shard_file.close()
+                    shard = {"file": os.path.join(work_dir, f"batch_input-{len(manifest['shards']) + 1:05d}.jsonl"),
+                             "requests": 0, "bytes": 0}
+                    manifest["shards"].append(shard)
+                    shard_file = open(shard["file"], 'w')
+
+                shard_file.write(line)
+                shard["requests"] += 1
+                shard["bytes"] += size
+                manifest["images"][custom_id] = image_path
+        finally:
+            if shard_file:
+                shard_file.close()
+
+        self.save_manifest(manifest, manifest_path)
+        print(f"Built {len(manifest['shards'])} batch files for {len(manifest['images'])} images "
+              f"({len(manifest['cached'])} answered from cache, {len(manifest['skipped'])} skipped)")
+        return manifest_path
+
+    def submit(self, manifest_path: str):
+        """Upload and start every shard that has not been submitted yet"""
+        manifest = self.load_manifest(manifest_path)
+        for shard in manifest["shards"]:
+            if shard.get("batch_id"):
+                continue
+            if not shard.get("input_file_id"):
+                with open(shard["file"], 'rb') as f:
+                    shard["input_file_id"] = self.client.files.create(file=f, purpose="batch").id
+                self.save_manifest(manifest, manifest_path)
+
+            batch = self.client.batches.create(
+                input_file_id=shard["input_file_id"],
+                endpoint=CHAT_COMPLETIONS_ENDPOINT,
+                completion_window="24h",
+            )
+            shard["batch_id"] = batch.id
+            shard["status"] = batch.status
+            self.save_manifest(manifest, manifest_path)
+            print(f"Submitted {shard['file']} as batch {batch.id}")
+
+    def wait(self, manifest_path: str, poll_interval: float = 60.0):
+        """Poll the batches until all of them are finished"""
+        manifest = self.load_manifest(manifest_path)
+        while True:
+            for shard in manifest["shards"]:
+                if shard.get("status") in TERMINAL_STATUSES:
+                    continue
+                batch = self.client.batches.retrieve(shard["batch_id"])
+                shard["status"] = batch.status
+                shard["output_file_id"] = batch.output_file_id
+                shard["error_file_id"] = batch.error_file_id
+                counts = batch.request_counts
+                if counts:
+                    print(f"Batch {batch.id}: {batch.status}, {counts.completed}/{counts.total} done, "
+                          f"{counts.failed} failed")
+            self.save_manifest(manifest, manifest_path)
+
+            if all(shard.get("status") in TERMINAL_STATUSES for shard in manifest["shards"]):
+                return
+            time.sleep(poll_interval)
+
+    def read_output(self, file_id: str) -> List[dict]:
+        if not file_id:
+            return []
+        content = self.client.files.content(file_id).text
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    def collect(self, manifest_path: str, output_file: str) -> List[dict]:
+        """Join the batch outputs back to the image paths and write them as JSONL"""
+        manifest = self.load_manifest(manifest_path)
+        records = {}
+        for shard in manifest["shards"]:
+            for item in self.read_output(shard.get("output_file_id")) + self.read_output(shard.get("error_file_id")):
+                record = {"image_path": manifest["images"][item["custom_id"]], "model": manifest["model"],
+                          "prediction": None, "error": None, "prompt_tokens": 0, "completion_tokens": 0}
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    record["error"] = json.dumps(item.get("error") or response.get("body"))
+                else:
+                    body = response["body"]
+                    record["prediction"] = body["choices"][0]["message"]["content"]
+                    record["prompt_tokens"] = body["usage"]["prompt_tokens"]
+                    record["completion_tokens"] = body["usage"]["completion_tokens"]
+                    key = manifest.get("cache_keys", {}).get(item["custom_id"])
+                    if self.cache and key:
+                        self.cache.put(tuple(key), record["prediction"], record["prompt_tokens"],
+                                       record["completion_tokens"])
+                records[item["custom_id"]] = record
+
+        for custom_id, cached in manifest.get("cached", {}).items():
+            records[custom_id] = {"image_path": cached["image_path"], "model": manifest["model"],
+                                  "prediction": cached["prediction"], "error": None, "prompt_tokens": 0,
+                                  "completion_tokens": 0, "cached": True}
+
+        # Requests missing from every output belong to batches that failed, expired or were cancelled
+        for shard in manifest["shards"]:
+            if shard.get("status") != "completed":
+                print(f"Batch {shard.get('batch_id')} ended as {shard.get('status')}")
+        for custom_id, image_path in manifest["images"].items():
+            records.setdefault(custom_id, {"image_path": image_path, "model": manifest["model"], "prediction": None,
+                                           "error": "No result", "prompt_tokens": 0, "completion_tokens": 0})
+
+        ordered = [records[custom_id] for custom_id in sorted(records)]
+        with open(output_file, 'w') as f:
+            for record in ordered:
+                f.write(json.dumps(record) + '\n')
+        failed = sum(1 for record in ordered if record["error"])
+        print(f"Collected {len(ordered) - failed}/{len(ordered)} predictions into {output_file}")
+        return ordered
+
+    def run(self, source: Union[str, Iterable[str]], work_dir: str, output_file: str,
+            poll_interval: float = 60.0) -> List[dict]:
+        """All four steps, an interrupted run picks up the batches of the manifest in work_dir"""
+        manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+        image_paths = list_images(source)
+        if os.path.exists(manifest_path):
+            manifest = self.load_manifest(manifest_path)
+            if manifest.get("source_hash") != self.source_hash(image_paths) or manifest["model"] != self.model:
+                raise ValueError(f"{manifest_path} was built for other images or another model, "
+                                 f"collect it or use another work_dir")
+        else:
+            self.build(image_paths, work_dir)
+        self.submit(manifest_path)
+        self.wait(manifest_path, poll_interval)
+        return self.collect(manifest_path, output_file)
+
+if __name__ == "__main__":
+
+    api_key = '{Insert API key here}'
+    config = Config(api_key=api_key, image_dir="data/test")
+    model = 'gpt-4o'  # Insert custom fine-tuned model id
+
+    classes = ['pitted_surface', 'inclusion', 'crazing', 'unclear']
+    instruction_prompt = (
+            "You are an inspection assistant for a manufacturing plant. "
+            "Analyze the provided image of steel surfaces and classify it based on the kind of defect. "
+            f"There are four classes: {classes}. "
+            "You must always return only one option from that list."
+            "If you are not sure, choose 'unclear'."
+        )
+
+    classifier = OfflineBatchClassifier(config, model, instruction_prompt)
+    # An interrupted run picks up the submitted batches from batch_work/manifest.json
+    classifier.run(config.image_dir, "batch_work", "batch_predictions.jsonl")
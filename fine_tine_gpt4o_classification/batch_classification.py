@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import random
+import asyncio
+from typing import Iterable, List, Optional, Union
+from PIL import Image
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from image_utils import estimate_image_tokens, estimate_text_tokens
+from test_image_classification import MAX_TOKENS, Config, ImageClassification
+
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg', '.png', '.webp')
+
+def list_images(source: Union[str, Iterable[str]]) -> List[str]:
+    """Image paths of a directory (recursively), a text file with one path per line, or a list of paths"""
+    if not isinstance(source, str):
+        return list(source)
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, file)
+            for root, _, files in os.walk(source)
+            for file in files if file.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    with open(source, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at per_minute / 60 per second.
+
+    Waiters are served in arrival order. Costs are charged up front from an
+    estimate and corrected with adjust() once the real cost is known.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        # A request larger than the bucket would never fit, let it through when the bucket is full
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge (negative) tokens after the fact"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class BatchClassifier(ImageClassification):
+    """
+    Classify many images concurrently.
+
+    At most max_concurrency requests are in flight, and two token buckets keep
+    the run under the requests/min and tokens/min limits of the account. A 429
+    pauses every request for the Retry-After time, other transient errors are
+    retried with exponential backoff. Results are appended to a JSONL file as
+    they finish.
+    """
+    def __init__(self, config: Config, model: str, instruction_prompt: str, max_concurrency: int = 8,
+                 requests_per_minute: float = 500, tokens_per_minute: float = 30000, max_retries: int = 5):
+        super().__init__(config)
+        self.model = model
+        self.instruction_prompt = instruction_prompt
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.prompt_tokens = estimate_text_tokens(instruction_prompt)
+
+    def encode(self, image_path: str):
+        """base64 JPEG and estimated request tokens of one image"""
+        with Image.open(image_path) as image:
+            width, height = image.size
+            base64_image = self.image_to_base64(self.prepare_image(image))
+        if not base64_image:
+            raise ValueError(f"Could not encode {image_path}")
+        return base64_image, self.prompt_tokens + estimate_image_tokens(width, height) + MAX_TOKENS
+
+    async def wait_for_cooldown(self):
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send_request(self, client: AsyncOpenAI, request: dict, estimated_tokens: int, record: dict):
+        for attempt in range(1, self.max_retries + 2):
+            record["attempts"] = attempt
+            await self.wait_for_cooldown()
+            await self._requests.acquire(1)
+            await self._tokens.acquire(estimated_tokens)
+            # Another request may have hit a 429 while this one waited for the buckets
+            await self.wait_for_cooldown()
+            try:
+                response = await client.chat.completions.create(**request)
+                if response.usage:
+                    self._tokens.adjust(estimated_tokens - response.usage.total_tokens)
+                return response
+            except RateLimitError as e:
+                if attempt > self.max_retries:
+                    raise
+                try:
+                    delay = float(e.response.headers['retry-after'])
+                except (KeyError, ValueError):
+                    # Missing, or an HTTP date
+                    delay = 2 ** attempt
+                # Every request backs off, not just this one
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+            except (APIConnectionError, APITimeoutError, InternalServerError):
+                if attempt > self.max_retries:
+                    raise
+                await asyncio.sleep(2 ** attempt * random.uniform(0.5, 1.5))
+
+    def new_record(self, **fields) -> dict:
+        """Result record that starts with the given identifying fields"""
+        record = dict(fields)
+        record.update(model=self.model, prediction=None, error=None, latency=None, attempts=0,
+                      prompt_tokens=0, completion_tokens=0, cached=False)
+        return record
+
+    def reset_limits(self):
+        """Concurrency slots and rate limit buckets of one run, built inside the running event loop"""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._requests = TokenBucket(self.requests_per_minute)
+        self._tokens = TokenBucket(self.tokens_per_minute)
+        self._cooldown_until = 0.0
+
+    async def classify_payload(self, client: AsyncOpenAI, base64_image: str, estimated_tokens: int, record: dict):
+        """Fill record with the answer for an encoded image, from the cache when it has one"""
+        if self.cache:
+            key = self.cache_key(self.instruction_prompt, self.model, base64_image)
+            cached = self.cache.get(key)
+            if cached:
+                # Costs nothing, so no tokens are reported
+                record.update(prediction=cached["prediction"], cached=True, latency=0.0)
+                return
+
+        request = self.build_request(self.instruction_prompt, self.model, base64_image)
+        start = time.perf_counter()
+        response = await self.send_request(client, request, estimated_tokens, record)
+        record["latency"] = time.perf_counter() - start
+        record["prediction"] = response.choices[0].message.content
+        if response.usage:
+            record["prompt_tokens"] = response.usage.prompt_tokens
+            record["completion_tokens"] = response.usage.completion_tokens
+        if self.cache:
+            self.cache.put(key, record["prediction"], record["prompt_tokens"], record["completion_tokens"])
+
+    async def classify_image(self, client: AsyncOpenAI, image_path: str) -> dict:
+        record = self.new_record(image_path=image_path)
+        async with self._slots:
+            try:
+                # Decoding and encoding images would block the event loop
+                base64_image, estimated_tokens = await asyncio.to_thread(self.encode, image_path)
+                await self.classify_payload(client, base64_image, estimated_tokens, record)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    async def classify_images(self, image_paths: List[str], output_file: str) -> List[dict]:
+        self.reset_limits()
+
+        records = []
+        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        try:
+            with open(output_file, 'w') as f:
+                tasks = [asyncio.create_task(self.classify_image(client, path)) for path in image_paths]
+                for task in asyncio.as_completed(tasks):
+                    record = await task
+                    f.write(json.dumps(record) + '\n')
+                    f.flush()
+                    records.append(record)
+                    status = record["prediction"] if record["error"] is None else f"failed ({record['error']})"
+                    print(f"[{len(records)}/{len(image_paths)}] {record['image_path']}: {status}")
+        finally:
+            await client.close()
+        return records
+
+    def classify_directory(self, source: Optional[Union[str, Iterable[str]]] = None,
+                           output_file: str = "predictions.jsonl") -> List[dict]:
+        """Classify a directory, a file list or a list of paths (config.image_dir by default)"""
+        image_paths = list_images(source if source is not None else self.image_dir)
+        records = asyncio.run(self.classify_images(image_paths, output_file))
+        failed = sum(1 for record in records if record["error"])
+        print(f"\nClassified {len(records) - failed}/{len(records)} images, results in {output_file}")
+        if self.cache:
+            print(f"Prediction cache: {self.cache.hits} answered from cache, {self.cache.misses} sent")
+        return records
+
+if __name__ == "__main__":
+
+    api_key = '{Insert API key here}'
+    config = Config(api_key=api_key, image_dir="data/test")
+    model = 'gpt-4o'  # Insert custom fine-tuned model id
+
+    classes = ['pitted_surface', 'inclusion', 'crazing', 'unclear']
+    instruction_prompt = (
+            "You are an inspection assistant for a manufacturing plant. "
+            "Analyze the provided image of steel surfaces and classify it based on the kind of defect. "
+            f"There are four classes: {classes}. "
+            "You must always return only one option from that list."
+            "If you are not sure, choose 'unclear'."
+        )
+
+    # Match these to the rate limits of your account and model
+    classifier = BatchClassifier(config, model, instruction_prompt, max_concurrency=8,
+                                 requests_per_minute=500, tokens_per_minute=30000)
+    classifier.classify_directory(output_file="predictions.jsonl")
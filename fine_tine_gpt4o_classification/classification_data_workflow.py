@@ -1,8 +1,17 @@
 import os
+import glob
 import json
+import time
 import base64
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO
+from concurrent.futures import Future
 from PIL import Image
+from encoding_cache import EncodingCache, content_hash
+from image_utils import (HIGH_DETAIL_MAX_EDGE, HIGH_DETAIL_SHORT_SIDE, estimate_image_tokens, estimate_text_tokens,
+                         needs_resize, prepare_image, target_size)
 from finetune_uploader import upload_dataset, start_fine_tuning_job
 
 # Accepted image formats & constraints
@@ -11,12 +20,36 @@ MAX_IMAGES_PER_EXAMPLE = 10
 MAX_IMAGE_SIZE_MB = 10
 MAX_EXAMPLES = 50000
 MAX_IMAGE_SIZE_BYTES = MAX_IMAGE_SIZE_MB * 1024 * 1024
+# Larger images are downscaled to the resolution the model trains on, None keeps them at full size
+MAX_IMAGE_EDGE = HIGH_DETAIL_MAX_EDGE
+MAX_IMAGE_SHORT_SIDE = HIGH_DETAIL_SHORT_SIDE
+
+# Header scan: threads reading image headers, and files handed to a thread at a time
+SCAN_THREADS = 32
+SCAN_BATCH_SIZE = 256
+# Cost estimate, check the current fine-tuning price of the base model
+TRAINING_PRICE_PER_MILLION_TOKENS = 25.0
+DEFAULT_EPOCHS = 3
+# Formatting tokens the chat format adds to every message
+TOKENS_PER_MESSAGE = 4
+
+# Everything that changes the encoded payload, cached encodings are only reused for identical settings
+PREPROCESS_SETTINGS = {
+    "max_image_size_bytes": MAX_IMAGE_SIZE_BYTES,
+    "accepted_modes": ["RGB", "RGBA"],
+    "reencode_format": "JPEG",
+    "max_edge": MAX_IMAGE_EDGE,
+    "short_side": MAX_IMAGE_SHORT_SIDE,
+}
 
 class ImageProcessor:
     @staticmethod
     def image_to_base64(image: Image.Image) -> str:
         """Convert a PIL Image object to a base64 encoded string."""
         try:
+            # JPEG has no alpha channel
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
             buffered = BytesIO()
             image.save(buffered, format="JPEG")
             img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
@@ -26,36 +59,234 @@ class ImageProcessor:
             return ""
 
     @staticmethod
-    def process_image(image_path: str):
+    def file_to_base64(image_path: str) -> str:
+        """Base64 encode the file bytes as they are."""
+        with open(image_path, 'rb') as f:
+            return base64.b64encode(f.read()).decode('utf-8')
+
+    @staticmethod
+    def check_file(image_path: str, size: int):
+        """Reason a file is rejected before it is opened, None if it passes"""
+        if not image_path.lower().endswith(ACCEPTED_EXTENSIONS):
+            return "Unsupported file format"
+        if size > MAX_IMAGE_SIZE_BYTES:
+            return f"Image exceeds {MAX_IMAGE_SIZE_MB} MB"
+        return None
+
+    @staticmethod
+    def check_image(img: Image.Image):
+        """Reason an opened image is rejected, None if it passes"""
+        if img.mode not in ('RGB', 'RGBA'):
+            return "Image is not in RGB or RGBA mode"
+        return None
+
+    @staticmethod
+    def needs_reencode(img: Image.Image) -> bool:
+        """Only RGB JPEGs within the target size can be sent as they are, everything else is converted to one"""
+        return (img.format != 'JPEG' or img.mode != 'RGB'
+                or needs_resize(img.width, img.height, MAX_IMAGE_EDGE, MAX_IMAGE_SHORT_SIDE))
+
+    @staticmethod
+    def encode_image(image_path: str):
+        """
+        Validate and base64 encode an image.
+
+        Returns:
+            (img_base64, error, passthrough) where passthrough tells whether the
+            original file bytes were used
+        """
         try:
 
-            img = Image.open(image_path)
+            error = ImageProcessor.check_file(image_path, os.path.getsize(image_path))
+            if error:
+                return None, error, False
 
-            if not image_path.lower().endswith(ACCEPTED_EXTENSIONS):
-                return None, "Unsupported file format"
+            # Opening only parses the header, pixels are decoded on first use
+            with Image.open(image_path) as img:
 
-            if os.path.getsize(image_path) > MAX_IMAGE_SIZE_BYTES:
-                return None, f"Image exceeds {MAX_IMAGE_SIZE_MB} MB"
+                error = ImageProcessor.check_image(img)
+                if error:
+                    return None, error, False
 
-            if img.mode not in ('RGB', 'RGBA'):
-                return None, "Image is not in RGB or RGBA mode"
+                # Compliant JPEGs skip the decode and the lossy re-encode
+                if not ImageProcessor.needs_reencode(img):
+                    return ImageProcessor.file_to_base64(image_path), None, True
 
-            img_base64 = ImageProcessor.image_to_base64(img)
+                img_base64 = ImageProcessor.image_to_base64(prepare_image(img, MAX_IMAGE_EDGE, MAX_IMAGE_SHORT_SIDE))
 
-            return img_base64, None
+            if not img_base64:
+                return None, "Error converting image to base64", False
+            return img_base64, None, False
         except Exception as e:
-            return None, f"Error processing image: {e}"
+            return None, f"Error processing image: {e}", False
+
+    @staticmethod
+    def process_image(image_path: str):
+        img_base64, error, _ = ImageProcessor.encode_image(image_path)
+        return img_base64, error
+
+def build_line(img_base64: str, class_dir: str) -> str:
+    defect_json = DatasetPreparer.generate_defect_json(f"data:image/jpeg;base64,{img_base64}", class_dir)
+    return json.dumps(defect_json) + '\n'
+
+def encode_example(task):
+    """Encode one image into a JSONL line, runs in the worker processes"""
+    image_path, class_dir = task
+    result = {"class_dir": class_dir, "image_path": image_path, "content_hash": content_hash(image_path),
+              "line": None, "payload": None, "error": None, "passthrough": False, "cached": False}
+    img_base64, result["error"], result["passthrough"] = ImageProcessor.encode_image(image_path)
+    if img_base64:
+        result["line"] = build_line(img_base64, class_dir)
+        # Only re-encoded payloads are worth caching, passthrough ones are the file itself
+        if not result["passthrough"]:
+            result["payload"] = img_base64
+    return result
+
+def scan_image(image_path: str, size: int) -> dict:
+    """
+    Apply the encode_image() rules from the file header alone.
+
+    payload_bytes is exact for images sent as they are and an estimate, scaled by
+    the pixel count, for images that get re-encoded.
+    """
+    result = {"error": ImageProcessor.check_file(image_path, size), "bytes": size, "payload_bytes": 0,
+              "image_tokens": 0}
+    if result["error"]:
+        return result
+    try:
+        with Image.open(image_path) as img:
+            result["error"] = ImageProcessor.check_image(img)
+            if result["error"]:
+                return result
+            width, height = img.size
+            payload_bytes = size
+            if ImageProcessor.needs_reencode(img):
+                new_width, new_height = target_size(width, height, MAX_IMAGE_EDGE, MAX_IMAGE_SHORT_SIDE)
+                payload_bytes = size * new_width * new_height / (width * height)
+    except Exception as e:
+        result["error"] = f"Error processing image: {e}"
+        return result
+    # base64 grows every 3 bytes to 4
+    result["payload_bytes"] = 4 * -(-int(payload_bytes) // 3)
+    result["image_tokens"] = estimate_image_tokens(width, height)
+    return result
+
+def scan_batch(batch):
+    return [(image_path, class_dir, scan_image(image_path, size)) for image_path, class_dir, size in batch]
+
+def list_class_files(class_path: str, class_dir: str):
+    """(image_path, class, size) of the files of one class directory"""
+    with os.scandir(class_path) as entries:
+        return [(entry.path, class_dir, entry.stat().st_size) for entry in entries if entry.is_file()]
+
+def example_text_tokens(class_dir: str) -> int:
+    """Estimated tokens of one training example without the image"""
+    tokens = 0
+    for message in DatasetPreparer.generate_defect_json("", class_dir)["messages"]:
+        tokens += TOKENS_PER_MESSAGE
+        if isinstance(message["content"], str):
+            tokens += estimate_text_tokens(message["content"])
+    return tokens
+
+class ShardedJsonlWriter:
+    """
+    JSONL writer that starts a new file whenever the current one would exceed max_bytes.
+
+    Shards are named <stem>-00001.jsonl, <stem>-00002.jsonl, ... If everything fits
+    in one shard (always, without max_bytes) it is renamed to the plain output path
+    on close. Shards or a plain output left by earlier runs are removed on close.
+    """
+    def __init__(self, output_file: str, max_bytes: int = None):
+        self.output_file = output_file
+        self.max_bytes = max_bytes
+        self.paths = []
+        self.lines = 0
+        self._file = None
+        self._size = 0
+
+    def _shard_path(self, index: int) -> str:
+        stem, ext = os.path.splitext(self.output_file)
+        return f"{stem}-{index:05d}{ext or '.jsonl'}"
+
+    def write(self, line: str):
+        data = line.encode('utf-8')
+        if self._file is None or (self.max_bytes and self._size and self._size + len(data) > self.max_bytes):
+            if self._file:
+                self._file.close()
+            self.paths.append(self._shard_path(len(self.paths) + 1))
+            self._file = open(self.paths[-1], 'wb')
+            self._size = 0
+        self._file.write(data)
+        self._size += len(data)
+        self.lines += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        if len(self.paths) == 1:
+            os.replace(self.paths[0], self.output_file)
+            self.paths = [self.output_file]
+
+        stem, ext = os.path.splitext(self.output_file)
+        stale = glob.glob(f"{glob.escape(stem)}-[0-9][0-9][0-9][0-9][0-9]{ext or '.jsonl'}")
+        if os.path.exists(self.output_file):
+            stale.append(self.output_file)
+        for path in stale:
+            if path not in self.paths:
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def split_key(image_path: str, class_dir: str) -> str:
+    return hashlib.sha256(f"{class_dir}/{os.path.basename(image_path)}".encode('utf-8')).hexdigest()
+
+def select_validation(tasks, validation_fraction: float) -> set:
+    """
+    Deterministic, stratified train/validation split from the file listing.
+
+    Every class contributes round(n * validation_fraction) images, taken in the
+    order of a hash of the file name, so the split needs no pass over the image
+    data and most images stay on the same side when images are added.
+    """
+    if validation_fraction <= 0:
+        return set()
+    by_class = {}
+    for image_path, class_dir in tasks:
+        by_class.setdefault(class_dir, []).append(image_path)
+
+    selected = set()
+    for class_dir, paths in by_class.items():
+        count = round(len(paths) * validation_fraction)
+        selected.update(sorted(paths, key=lambda path: split_key(path, class_dir))[:count])
+    return selected
 
 class DatasetPreparer:
 
-    def __init__(self, main_directory: str, output_file: str):
+    def __init__(self, main_directory: str, output_file: str, max_workers: int = None, cache_path: str = None,
+                 validation_fraction: float = 0.0, max_shard_bytes: int = None):
         self.main_directory = main_directory
         self.output_file = output_file
+        stem, ext = os.path.splitext(output_file)
+        self.validation_file = f"{stem}_validation{ext or '.jsonl'}"
+        self.validation_fraction = validation_fraction
+        self.max_shard_bytes = max_shard_bytes
+        self.train_files = []
+        self.validation_files = []
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_path = cache_path
+        self.cache = None
         self.class_stats = {}
         self.total_examples = 0
+        self.seen_hashes = {}
+        self.duplicates = []
 
-
-    def generate_defect_json(self, image_url: str, defect_class: str):
+    @staticmethod
+    def generate_defect_json(image_url: str, defect_class: str):
         return {
             "messages": [
                 { 
@@ -88,7 +319,11 @@ class DatasetPreparer:
     def print_stats(self):
         """ Print stats """
 
-        print(f"\nDataset preparation complete. {self.total_examples} examples written to {self.output_file}.\n")
+        print(f"\nDataset preparation complete. {self.total_examples} examples written.")
+        print(f"Training files: {self.train_files}")
+        if self.validation_files:
+            print(f"Validation files: {self.validation_files}")
+        print()
         print('Total number of classes: ', len(self.class_stats.keys()))
         print('Classes: ', self.class_stats.keys())
 
@@ -97,57 +332,237 @@ class DatasetPreparer:
         for class_name, stats in self.class_stats.items():
             print(f"\nClass '{class_name}':")
             print(f"  Processed: {stats['processed']} images")
+            if self.validation_fraction > 0:
+                print(f"    Validation: {stats['validation']} images")
             print(f"  Skipped: {stats['skipped']} images")
             for reason, count in stats["skipped_reasons"].items():
                 print(f"    Skipped due to {reason}: {count} images")
 
+        if self.duplicates:
+            print(f"\nDuplicate images (written once): {len(self.duplicates)}")
+            for image_path, original_path, conflicting in self.duplicates:
+                note = "  <-- different class" if conflicting else ""
+                print(f"  {image_path} == {original_path}{note}")
+
+        if self.cache:
+            print(f"\nEncoding cache: {self.cache.hits} reused, {self.cache.misses} encoded")
+
+    def scan_dataset(self, epochs: int = DEFAULT_EPOCHS, max_threads: int = SCAN_THREADS) -> dict:
+        """
+        Estimate the dataset from the image headers only, without encoding anything.
+
+        Class directories are listed and headers read in a thread pool, and the same
+        rules as prepare_dataset() decide what gets skipped. Duplicates are only
+        found while encoding, so they are not counted here.
+        """
+        start = time.perf_counter()
+        class_dirs = sorted(entry.name for entry in os.scandir(self.main_directory) if entry.is_dir())
+        stats = {class_dir: {"images": 0, "accepted": 0, "validation": 0, "skipped": 0, "skipped_reasons": {},
+                             "bytes": 0, "payload_bytes": 0, "image_tokens": 0, "training_tokens": 0}
+                 for class_dir in class_dirs}
+
+        with ThreadPoolExecutor(max_workers=max_threads) as executor:
+            files = [file for listing in executor.map(
+                list_class_files, [os.path.join(self.main_directory, class_dir) for class_dir in class_dirs],
+                class_dirs) for file in listing]
+            batches = [files[i:i + SCAN_BATCH_SIZE] for i in range(0, len(files), SCAN_BATCH_SIZE)]
+            results = [result for batch in executor.map(scan_batch, batches) for result in batch]
+
+        validation_paths = select_validation([(image_path, class_dir) for image_path, class_dir, _ in files],
+                                             self.validation_fraction)
+        text_tokens = {class_dir: example_text_tokens(class_dir) for class_dir in class_dirs}
+        for image_path, class_dir, result in results:
+            class_stats = stats[class_dir]
+            class_stats["images"] += 1
+            class_stats["bytes"] += result["bytes"]
+            if result["error"]:
+                class_stats["skipped"] += 1
+                reasons = class_stats["skipped_reasons"]
+                reasons[result["error"]] = reasons.get(result["error"], 0) + 1
+                continue
+            class_stats["accepted"] += 1
+            class_stats["payload_bytes"] += result["payload_bytes"]
+            class_stats["image_tokens"] += result["image_tokens"]
+            if image_path in validation_paths:
+                class_stats["validation"] += 1
+            else:
+                # Validation examples are evaluated, not trained on
+                class_stats["training_tokens"] += result["image_tokens"] + text_tokens[class_dir]
+
+        totals = {key: sum(class_stats[key] for class_stats in stats.values())
+                  for key in ("images", "accepted", "validation", "skipped", "bytes", "payload_bytes",
+                              "image_tokens", "training_tokens")}
+        totals["epochs"] = epochs
+        totals["estimated_cost"] = totals["training_tokens"] * epochs * TRAINING_PRICE_PER_MILLION_TOKENS / 1e6
+        totals["seconds"] = time.perf_counter() - start
+        self.print_scan(stats, totals)
+        return {"classes": stats, "totals": totals}
+
+    @staticmethod
+    def print_scan(stats: dict, totals: dict):
+        megabytes = 1024 * 1024
+        print(f"\nScanned {totals['images']} files in {totals['seconds']:.1f}s")
+        print(f"Classes: {len(stats)}")
+        for class_dir, class_stats in stats.items():
+            print(f"\nClass '{class_dir}':")
+            print(f"  Accepted: {class_stats['accepted']} images"
+                  + (f" ({class_stats['validation']} for validation)" if class_stats['validation'] else ""))
+            print(f"  Skipped: {class_stats['skipped']} images")
+            for reason, count in class_stats["skipped_reasons"].items():
+                print(f"    Skipped due to {reason}: {count} images")
+            print(f"  Payload: {class_stats['payload_bytes'] / megabytes:.1f} MB, "
+                  f"image tokens: {class_stats['image_tokens']}")
+
+        print(f"\nExamples: {totals['accepted']} of {totals['images']} files "
+              f"({totals['skipped']} skipped, {totals['validation']} for validation)")
+        if totals["accepted"] > MAX_EXAMPLES:
+            print(f"  Only the first {MAX_EXAMPLES} examples will be written")
+        print(f"Source size: {totals['bytes'] / megabytes:.1f} MB, estimated JSONL payload: "
+              f"{totals['payload_bytes'] / megabytes:.1f} MB")
+        print(f"Estimated image tokens: {totals['image_tokens']}, training tokens per epoch: "
+              f"{totals['training_tokens']}")
+        print(f"Estimated training cost for {totals['epochs']} epochs: ${totals['estimated_cost']:.2f} "
+              f"(at ${TRAINING_PRICE_PER_MILLION_TOKENS:.2f} per 1M tokens)")
+
+    def list_images(self):
+        """(image_path, class) for every file, sorted so the output order is deterministic"""
+        tasks = []
+        for class_dir in sorted(os.listdir(self.main_directory)):
+            class_path = os.path.join(self.main_directory, class_dir)
+
+            if not os.path.isdir(class_path):
+                continue
+
+            self.class_stats[class_dir] = {
+                "processed": 0,
+                "validation": 0,
+                "skipped": 0,
+                "skipped_reasons": {}
+            }
+
+            for image_file in sorted(os.listdir(class_path)):
+                tasks.append((os.path.join(class_path, image_file), class_dir))
+        return tasks
+
+    def cached_result(self, task):
+        """Result of an unchanged file from the encoding cache, None if it has to be encoded"""
+        image_path, class_dir = task
+        stat = os.stat(image_path)
+        hit = self.cache.lookup(image_path, stat.st_size, stat.st_mtime_ns)
+        if hit is None:
+            return None
+
+        file_hash, payload, error, passthrough = hit
+        if passthrough:
+            payload = ImageProcessor.file_to_base64(image_path)
+        return {"class_dir": class_dir, "image_path": image_path, "content_hash": file_hash,
+                "line": build_line(payload, class_dir) if payload else None, "payload": payload,
+                "error": error, "passthrough": passthrough, "cached": True}
+
+    def store_result(self, result):
+        stat = os.stat(result["image_path"])
+        self.cache.store(result["image_path"], stat.st_size, stat.st_mtime_ns, result["content_hash"],
+                         result["payload"], result["error"], result["passthrough"])
+
+    def check_duplicate(self, result) -> bool:
+        """Remember written images by content, True if this one was already written"""
+        original = self.seen_hashes.get(result["content_hash"])
+        if original is None:
+            self.seen_hashes[result["content_hash"]] = (result["image_path"], result["class_dir"])
+            return False
+        original_path, original_class = original
+        self.duplicates.append((result["image_path"], original_path, original_class != result["class_dir"]))
+        return True
+
+    def record_result(self, class_dir: str, error: str):
+        if error is None:
+            self.class_stats[class_dir]["processed"] += 1
+            self.total_examples += 1
+            return
+
+        self.class_stats[class_dir]["skipped"] += 1
+        if error not in self.class_stats[class_dir]["skipped_reasons"]:
+            self.class_stats[class_dir]["skipped_reasons"][error] = 0
+        self.class_stats[class_dir]["skipped_reasons"][error] += 1
+
+    def iter_encoded(self, tasks):
+        """
+        Encode images in a process pool and yield the results in task order.
+
+        Only a window of tasks is in flight at a time, so memory stays bounded
+        no matter how large the dataset is.
+        """
+        if self.max_workers <= 1:
+            for task in tasks:
+                yield (self.cache and self.cached_result(task)) or encode_example(task)
+            return
+
+        window = self.max_workers * 4
+        pending = deque()
+        tasks = iter(tasks)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                for task in tasks:
+                    cached = self.cache and self.cached_result(task)
+                    if cached:
+                        # Keeps its place in the output order without going through a worker
+                        future = Future()
+                        future.set_result(cached)
+                    else:
+                        future = executor.submit(encode_example, task)
+                    pending.append(future)
+                    if len(pending) >= window:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Stopping early (example limit) drops the rest of the window
+                for future in pending:
+                    future.cancel()
+
     def prepare_dataset(self):
         """Process all images and prepare dataset"""
 
         try:
-            with open(self.output_file, 'w') as f:
-
-                for class_dir in os.listdir(self.main_directory):
-                    class_path = os.path.join(self.main_directory, class_dir)
-
-                    if not os.path.isdir(class_path):
-                        continue
-
-                    class_stats[class_dir] = {
-                        "processed": 0,
-                        "skipped": 0,
-                        "skipped_reasons": {}
-                    }
-
-                    for image_file in os.listdir(class_path):
-                        image_path = os.path.join(class_path, image_file)
-                        img_base64, error = ImageProcessor.process_image(image_path)
-
-                        if img_base64:
-                            
-                            defect_json = self.generate_defect_json(f"data:image/jpeg;base64,{img_base64}", class_dir)
-                            f.write(json.dumps(defect_json) + '\n')
-                            class_stats[class_dir]["processed"] += 1
-                            total_examples += 1
-
-                            if self.total_examples >= MAX_EXAMPLES:
-                                print(f"Reached maximum example limit of {MAX_EXAMPLES}. Stopping.")
-                                break
+            if self.cache_path:
+                self.cache = EncodingCache(self.cache_path, PREPROCESS_SETTINGS)
+
+            tasks = self.list_images()
+            validation_paths = select_validation(tasks, self.validation_fraction)
+            train = ShardedJsonlWriter(self.output_file, self.max_shard_bytes)
+            validation = ShardedJsonlWriter(self.validation_file, self.max_shard_bytes)
+            with train, validation:
+                results = self.iter_encoded(tasks)
+                for result in results:
+                    if self.cache and not result["cached"]:
+                        self.store_result(result)
+
+                    error = result["error"]
+                    if result["line"]:
+                        if self.check_duplicate(result):
+                            error = "Duplicate image"
+                        elif result["image_path"] in validation_paths:
+                            validation.write(result["line"])
+                            self.class_stats[result["class_dir"]]["validation"] += 1
                         else:
-                            self.class_stats[class_dir]["skipped"] += 1
-
-                            if error not in self.class_stats[class_dir]["skipped_reasons"]:
-                                self.class_stats[class_dir]["skipped_reasons"][error] = 0
-                            self.class_stats[class_dir]["skipped_reasons"][error] += 1
+                            train.write(result["line"])
+                    self.record_result(result["class_dir"], error)
 
                     if self.total_examples >= MAX_EXAMPLES:
                         print(f"Reached maximum example limit of {MAX_EXAMPLES}. Stopping.")
+                        results.close()
                         break
 
+            self.train_files = train.paths
+            self.validation_files = validation.paths
             self.print_stats()
 
         except Exception as e:
             print(f'Something went wrong: {e}')
+        finally:
+            if self.cache:
+                self.cache.close()
+                self.cache = None
 
 class ModelTrainer:
 
@@ -164,9 +579,9 @@ class ModelTrainer:
             return None
 
     @staticmethod
-    def submit_finetuning_job(api_key, uploaded_file_id, model="gpt-4o-2024-08-06"):
+    def submit_finetuning_job(api_key, uploaded_file_id, model="gpt-4o-2024-08-06", validation_file_id=None):
         if uploaded_file_id:
-            start_fine_tuning_job(api_key, uploaded_file_id, model)
+            start_fine_tuning_job(api_key, uploaded_file_id, model, validation_file_id=validation_file_id)
         else:
             print("No uploaded file to fine-tune.") 
 
@@ -176,17 +591,41 @@ if __name__ == "__main__":
     output_file = "prepared_dataset_classification.jsonl"  # Output as JSONL format
     api_key = '{Insert API key here}'
 
-    dataset_preparer = DatasetPreparer(main_directory, output_file)
+    max_workers = os.cpu_count()  # Number of processes encoding images, 1 encodes serially
+
+    cache_path = "encoding_cache.sqlite"  # Reuses encodings of unchanged images between runs, None disables it
+
+    validation_fraction = 0.1  # Share of every class held out for validation, 0 disables the split
+
+    dataset_preparer = DatasetPreparer(main_directory, output_file, max_workers=max_workers, cache_path=cache_path,
+                                       validation_fraction=validation_fraction)
+    # Class balance, skipped images and estimated cost from the image headers, before encoding anything
+    print('\n0) Scanning the dataset...')
+    dataset_preparer.scan_dataset(epochs=DEFAULT_EPOCHS)
+
     print('\n1) Preparing the dataset...')
     dataset_preparer.prepare_dataset()
 
+    if not dataset_preparer.train_files:
+        print("No training examples were written, nothing to upload.")
+        raise SystemExit(1)
+
+    # A fine-tuning job trains on a single file, files over 512 MB are uploaded in parts
+    if len(dataset_preparer.train_files) != 1 or len(dataset_preparer.validation_files) > 1:
+        print("The dataset was split into several shards, but a fine-tuning job takes one training file. "
+              "Run again without max_shard_bytes to write a single file.")
+        raise SystemExit(1)
+
     # Upload dataset
     print('\n2) Uploading dataset...')
-    uploaded_file_id = ModelTrainer.upload_dataset_node(api_key, output_file)
+    uploaded_file_id = ModelTrainer.upload_dataset_node(api_key, dataset_preparer.train_files[0])
+    validation_file_id = None
+    if dataset_preparer.validation_files:
+        validation_file_id = ModelTrainer.upload_dataset_node(api_key, dataset_preparer.validation_files[0])
 
     # Submit fine-tuning job
     print('\n3) Submit fine-tuning job.')
     if uploaded_file_id:
-        ModelTrainer.submit_finetuning_job(api_key, uploaded_file_id)
+        ModelTrainer.submit_finetuning_job(api_key, uploaded_file_id, validation_file_id=validation_file_id)
 
     
@@ -0,0 +1,91 @@
+import json
+import hashlib
+import sqlite3
+
+def content_hash(file_path: str) -> str:
+    """SHA-256 of the file content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class EncodingCache:
+    """
+    Persistent cache of image encodings for incremental dataset rebuilds.
+
+    Results are keyed by the content hash of the image plus a hash of the
+    preprocessing settings, so a settings change invalidates every entry. A
+    second table maps (path, size, mtime) to the content hash, so unchanged files
+    are not even read again. Renamed, moved or copied files miss that table, are
+    hashed and still find their encoding by content.
+
+    Payloads are only stored for re-encoded images. Images sent as their original
+    bytes are read from disk again on a hit, which keeps the cache small.
+    """
+    def __init__(self, db_path: str, settings: dict, commit_every: int = 500):
+        self.db_path = db_path
+        self.settings_key = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS encodings (
+                content_hash TEXT, settings TEXT, payload TEXT, error TEXT, passthrough INTEGER,
+                PRIMARY KEY (content_hash, settings)
+            );
+        """)
+
+    def lookup(self, file_path: str, size: int, mtime_ns: int):
+        """
+        Cached result of a file, by path when it is unchanged, otherwise by content.
+
+        Returns:
+            (content_hash, payload, error, passthrough) or None on a miss
+        """
+        row = self.conn.execute(
+            'SELECT e.content_hash, e.payload, e.error, e.passthrough FROM files f '
+            'JOIN encodings e ON e.content_hash = f.content_hash AND e.settings = ? '
+            'WHERE f.path = ? AND f.size = ? AND f.mtime_ns = ?',
+            (self.settings_key, file_path, size, mtime_ns)
+        ).fetchone()
+        if row is None:
+            file_hash = content_hash(file_path)
+            row = self.conn.execute(
+                'SELECT content_hash, payload, error, passthrough FROM encodings '
+                'WHERE content_hash = ? AND settings = ?',
+                (file_hash, self.settings_key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            # The next run finds the file by path again
+            self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                              (file_path, size, mtime_ns, file_hash))
+            self._count_write()
+        self.hits += 1
+        return row[0], row[1], row[2], bool(row[3])
+
+    def store(self, file_path: str, size: int, mtime_ns: int, file_hash: str,
+              payload: str, error: str, passthrough: bool):
+        self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                          (file_path, size, mtime_ns, file_hash))
+        self.conn.execute('INSERT OR REPLACE INTO encodings VALUES (?, ?, ?, ?, ?)',
+                          (file_hash, self.settings_key, None if passthrough else payload, error, int(passthrough)))
+        self._count_write()
+
+    def _count_write(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
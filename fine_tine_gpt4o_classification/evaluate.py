@@ -0,0 +1,234 @@
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+from batch_classification import BatchClassifier, list_images
+from mock_openai_server import MockOpenAIServer
+from test_image_classification import Config
+
+CLASSES = ['pitted_surface', 'inclusion', 'crazing', 'unclear']
+# Column of the confusion matrix for answers that are not one of the classes
+INVALID_LABEL = 'invalid'
+
+def build_instruction_prompt(classes: List[str]) -> str:
+    return (
+        "You are an inspection assistant for a manufacturing plant. "
+        "Analyze the provided image of steel surfaces and classify it based on the kind of defect. "
+        f"There are {len(classes)} classes: {classes}. "
+        "You must always return only one option from that list."
+        "If you are not sure, choose 'unclear'."
+    )
+
+def label_from_path(image_path: str, classes: List[str]) -> Optional[str]:
+    """True class of a test image, from its directory (crazing/1.jpg) or file name (crazing_19.jpg)"""
+    directory = os.path.basename(os.path.dirname(image_path))
+    if directory in classes:
+        return directory
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    stem = re.sub(r'[_\-\s]*\d+$', '', stem)
+    if stem in classes:
+        return stem
+    # Longest match first, so 'pitted_surface_x' is not taken for a shorter class name
+    for label in sorted(classes, key=len, reverse=True):
+        if stem.startswith(label):
+            return label
+    return None
+
+def normalize_prediction(prediction: Optional[str], classes: List[str]) -> str:
+    """Map a free text answer onto one of the classes"""
+    if not prediction:
+        return INVALID_LABEL
+    text = prediction.strip().strip('\'"`.').lower()
+    for label in classes:
+        if text == label.lower():
+            return label
+    for label in sorted(classes, key=len, reverse=True):
+        if re.search(rf"\b{re.escape(label.lower())}\b", text):
+            return label
+    return INVALID_LABEL
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile, q in [0, 100]"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def summarize(records: List[dict], classes: List[str], model: str, wall_time: float) -> Dict:
+    columns = classes + [INVALID_LABEL]
+    confusion = {label: {column: 0 for column in columns} for label in classes}
+    correct = scored = errors = 0
+    for record in records:
+        if record["error"]:
+            errors += 1
+            continue
+        if record["label"] is None:
+            continue
+        scored += 1
+        confusion[record["label"]][record["predicted_label"]] += 1
+        correct += record["label"] == record["predicted_label"]
+
+    per_class = {}
+    for label in classes:
+        support = sum(confusion[label].values())
+        predicted = sum(confusion[row][label] for row in classes)
+        hits = confusion[label][label]
+        per_class[label] = {
+            "support": support,
+            "precision": hits / predicted if predicted else None,
+            "recall": hits / support if support else None,
+        }
+
+    # Cached answers did not go over the network, so they would only flatter the latency
+    latencies = [record["latency"] for record in records if record["latency"] is not None and not record["cached"]]
+    prompt_tokens = sum(record["prompt_tokens"] for record in records)
+    completion_tokens = sum(record["completion_tokens"] for record in records)
+    return {
+        "model": model,
+        "images": len(records),
+        "scored": scored,
+        "unlabeled": sum(1 for record in records if record["label"] is None),
+        "errors": errors,
+        "cached": sum(1 for record in records if record["cached"]),
+        "accuracy": correct / scored if scored else None,
+        "invalid_answers": sum(confusion[label][INVALID_LABEL] for label in classes),
+        "confusion_matrix": confusion,
+        "per_class": per_class,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+        },
+        "wall_time_seconds": wall_time,
+        "throughput_images_per_second": len(records) / wall_time if wall_time else None,
+        "tokens": {
+            "prompt": prompt_tokens,
+            "completion": completion_tokens,
+            "total": prompt_tokens + completion_tokens,
+            "per_image": (prompt_tokens + completion_tokens) / len(records) if records else None,
+        },
+    }
+
+def format_value(value, digits: int = 3) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return str(value)
+
+def print_report(summary: Dict):
+    print(f"\nModel: {summary['model']}")
+    print(f"Images: {summary['images']} ({summary['scored']} scored, {summary['errors']} failed, "
+          f"{summary['unlabeled']} without label, {summary['cached']} from cache)")
+    print(f"Accuracy: {format_value(summary['accuracy'])} ({summary['invalid_answers']} answers outside the classes)")
+
+    confusion = summary["confusion_matrix"]
+    columns = list(next(iter(confusion.values())).keys())
+    width = max(len(label) for label in columns) + 2
+    print("\nConfusion matrix (rows: true class, columns: prediction)")
+    print(' ' * width + ''.join(column.rjust(width) for column in columns))
+    for label, row in confusion.items():
+        print(label.ljust(width) + ''.join(str(row[column]).rjust(width) for column in columns))
+
+    print("\nPer class")
+    for label, metrics in summary["per_class"].items():
+        print(f"  {label.ljust(width)} precision {format_value(metrics['precision'])}  "
+              f"recall {format_value(metrics['recall'])}  support {metrics['support']}")
+
+    latency = summary["latency_seconds"]
+    tokens = summary["tokens"]
+    print(f"\nLatency p50 {format_value(latency['p50'])}s  p95 {format_value(latency['p95'])}s  "
+          f"p99 {format_value(latency['p99'])}s")
+    print(f"Throughput {format_value(summary['throughput_images_per_second'], 2)} images/s over "
+          f"{format_value(summary['wall_time_seconds'], 1)}s")
+    print(f"Tokens {tokens['prompt']} prompt + {tokens['completion']} completion "
+          f"({format_value(tokens['per_image'], 1)} per image)")
+
+def compare(summaries: List[Dict]):
+    """Side by side table of the headline numbers of several runs"""
+    rows = [
+        ("accuracy", lambda s: s["accuracy"]),
+        ("invalid answers", lambda s: s["invalid_answers"]),
+        ("errors", lambda s: s["errors"]),
+        ("latency p50 (s)", lambda s: s["latency_seconds"]["p50"]),
+        ("latency p95 (s)", lambda s: s["latency_seconds"]["p95"]),
+        ("latency p99 (s)", lambda s: s["latency_seconds"]["p99"]),
+        ("images/s", lambda s: s["throughput_images_per_second"]),
+        ("tokens per image", lambda s: s["tokens"]["per_image"]),
+    ]
+    width = max(20, *(len(summary["model"]) + 2 for summary in summaries))
+    print('\n' + ' ' * 20 + ''.join(summary["model"].rjust(width) for summary in summaries))
+    for name, value in rows:
+        print(name.ljust(20) + ''.join(format_value(value(summary)).rjust(width) for summary in summaries))
+
+def evaluate(config: Config, model: str, classes: List[str], source: str, output_dir: str,
+             max_concurrency: int = 8, requests_per_minute: float = 500, tokens_per_minute: float = 30000) -> Dict:
+    """Classify every image of source with model, write predictions and summary JSON, returns the summary"""
+    os.makedirs(output_dir, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model)
+    classifier = BatchClassifier(config, model, build_instruction_prompt(classes), max_concurrency=max_concurrency,
+                                 requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+
+    image_paths = list_images(source)
+    start = time.perf_counter()
+    records = asyncio.run(classifier.classify_images(image_paths, os.path.join(output_dir, f"{name}.predictions.jsonl")))
+    wall_time = time.perf_counter() - start
+
+    for record in records:
+        record["label"] = label_from_path(record["image_path"], classes)
+        record["predicted_label"] = normalize_prediction(record["prediction"], classes)
+    records.sort(key=lambda record: record["image_path"])
+
+    summary = summarize(records, classes, model, wall_time)
+    summary["source"] = source
+    summary["classes"] = classes
+    summary["records"] = records
+    with open(os.path.join(output_dir, f"{name}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure accuracy, latency and token usage of models on a test set")
+    parser.add_argument("--model", action="append", help="Model id, repeat to compare several models")
+    parser.add_argument("--data", default="data/test", help="Test images, labels come from file or directory names")
+    parser.add_argument("--classes", nargs="+", default=CLASSES)
+    parser.add_argument("--output-dir", default="eval_results")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=float, default=500)
+    parser.add_argument("--tokens-per-minute", type=float, default=30000)
+    parser.add_argument("--cache", help="Prediction cache file, see prediction_cache.py")
+    parser.add_argument("--mock", action="store_true", help="Run against a local mock server instead of the API")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT_JSON", help="Only compare earlier result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        summaries = []
+        for path in args.compare:
+            with open(path, 'r') as f:
+                summaries.append(json.load(f))
+        compare(summaries)
+        raise SystemExit
+
+    server = MockOpenAIServer().start() if args.mock else None
+    try:
+        config = Config(api_key='mock-key' if server else os.environ.get('OPENAI_API_KEY', '{Insert API key here}'),
+                        image_dir=args.data, base_url=server.base_url if server else None, cache_path=args.cache)
+        summaries = []
+        for model in args.model or ['gpt-4o']:
+            summary = evaluate(config, model, args.classes, args.data, args.output_dir, args.concurrency,
+                               args.requests_per_minute, args.tokens_per_minute)
+            print_report(summary)
+            summaries.append(summary)
+        if len(summaries) > 1:
+            compare(summaries)
+        print(f"\nResults written to {args.output_dir}/")
+    finally:
+        if server:
+            server.stop()
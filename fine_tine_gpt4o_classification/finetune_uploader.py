@@ -1,8 +1,54 @@
 import os
+import json
 import math
+import time
+import random
+import hashlib
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from openai import OpenAI
 
+# Point this at a local stand-in (see mock_openai_server.py) to run without the real API
+API_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+PART_SIZE = 50 * 1024 * 1024  # 50 MB part size
+MAX_UPLOAD_WORKERS = 4
+MAX_RETRIES = 5
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+def create_session(pool_size=MAX_UPLOAD_WORKERS):
+    """requests.Session that keeps up to pool_size connections alive"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def retry_after_seconds(response, default):
+    """Delay asked for in a Retry-After header, default when it is missing or an HTTP date"""
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return default
+
+def post_with_retry(session, url, max_retries=MAX_RETRIES, backoff=1.0, **kwargs):
+    """POST with exponential backoff on connection errors, rate limits and server errors"""
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.post(url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                return response
+            # Honour Retry-After when the server sends it
+            delay = retry_after_seconds(response, backoff * 2 ** attempt)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"\tRequest to {url} failed ({e}), retrying")
+        time.sleep(delay * random.uniform(0.5, 1.5))
+
 # Upload using Files API (for files ≤ 512 MB)
 def upload_file(client, file_path):
     """Upload the prepared JSONL file using  Files API."""
@@ -19,9 +65,9 @@ def upload_file(client, file_path):
         return None
 
 # Create session using the Uploads API (for files > 512 MB)
-def create_upload(api_key, file_name, file_size):
+def create_upload(api_key, file_name, file_size, session=None, base_url=API_BASE_URL):
 
-    url = "https://api.openai.com/v1/uploads"
+    url = f"{base_url}/uploads"
     headers = {
         'Authorization': f'Bearer {api_key}',
         'Content-Type': 'application/json'
@@ -33,30 +79,33 @@ def create_upload(api_key, file_name, file_size):
         "bytes": file_size 
     }
 
-    response = requests.post(url, headers=headers, json=data)
+    response = post_with_retry(session or requests, url, headers=headers, json=data)
+    if response.status_code != 200:
+        # Error bodies from proxies and gateways are not always JSON
+        return {'error': response.text}
     return response.json()
 
 # Upload part 
-def upload_part(api_key, upload_id, file_part, part_number, total_parts):
+def upload_part(api_key, upload_id, file_part, part_number, total_parts, session=None, base_url=API_BASE_URL):
 
-    url = f"https://api.openai.com/v1/uploads/{upload_id}/parts"
+    url = f"{base_url}/uploads/{upload_id}/parts"
 
     files = {
         'data': ('part', file_part)
     }
 
-    response = requests.post(url, headers={'Authorization': f'Bearer {api_key}'}, files=files)
+    response = post_with_retry(session or requests, url, headers={'Authorization': f'Bearer {api_key}'}, files=files)
     if response.status_code != 200:
-        raise Exception(f"Failed to upload part: {response.json()}")
+        raise Exception(f"Failed to upload part: {response.text}")
     
     part_id = response.json()["id"]
 
     return part_id
 
 # Complete the upload 
-def complete_upload(api_key, upload_id, part_ids):
+def complete_upload(api_key, upload_id, part_ids, session=None, base_url=API_BASE_URL):
 
-    url = f"https://api.openai.com/v1/uploads/{upload_id}/complete"
+    url = f"{base_url}/uploads/{upload_id}/complete"
     headers = {
         'Authorization': f'Bearer {api_key}',
         'Content-Type': 'application/json'
@@ -64,52 +113,164 @@ def complete_upload(api_key, upload_id, part_ids):
     data = {
         "part_ids": part_ids  # Ordered list of part IDs
     }
-    response = requests.post(url, headers=headers, json=data)
+    response = post_with_retry(session or requests, url, headers=headers, json=data)
 
     if response.status_code != 200:
-        raise Exception(f"Failed to complete upload: {response.json()}")
+        raise Exception(f"Failed to complete upload: {response.text}")
     
     file_id = response.json()["file"]["id"]
 
     return file_id
 
+def read_part(file_path, part_number, part_size):
+    """Read one part from disk, parts are numbered from 1"""
+    with open(file_path, 'rb') as f:
+        f.seek((part_number - 1) * part_size)
+        return f.read(part_size)
+
+def file_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+class UploadJournal:
+    """
+    Progress of a multipart upload, kept in <file>.upload.json next to the file.
+
+    The journal records the upload id, the file fingerprint, the part size and the
+    id and SHA-256 of every part sent, so a later run can continue the same
+    upload session instead of starting over.
+    """
+    def __init__(self, file_path):
+        self.path = f"{file_path}.upload.json"
+        self.state = None
+        self.lock = threading.Lock()
+
+    def load(self, fingerprint, part_size):
+        """State of a resumable upload of this exact file, None if there is none"""
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if state.get('fingerprint') != fingerprint or state.get('part_size') != part_size:
+            print("Upload journal belongs to an older version of the file, starting a new upload.")
+            return None
+        # Leave a minute of margin, parts sent into an expiring session would be lost
+        if state.get('expires_at', 0) < time.time() + 60:
+            print(f"Upload session {state.get('upload_id')} has expired, starting a new upload.")
+            return None
+        self.state = state
+        return state
+
+    def start(self, upload_id, fingerprint, part_size, expires_at):
+        self.state = {'upload_id': upload_id, 'fingerprint': fingerprint, 'part_size': part_size,
+                      'expires_at': expires_at, 'parts': {}}
+        self._save()
+
+    def get_part(self, part_number):
+        return self.state['parts'].get(str(part_number))
+
+    def record_part(self, part_number, part_id, checksum):
+        with self.lock:
+            self.state['parts'][str(part_number)] = {'id': part_id, 'sha256': checksum}
+            self._save()
+
+    def _save(self):
+        # Write and rename, so a crash never leaves a half written journal
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def discard(self):
+        self.state = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def send_parts(api_key, file_path, journal, session, part_size, max_workers, base_url):
+    """Send every part the journal does not hold yet, then complete the upload"""
+    upload_id = journal.state['upload_id']
+    total_parts = math.ceil(os.path.getsize(file_path) / part_size)
+
+    def send_part(part_number):
+        file_part = read_part(file_path, part_number, part_size)
+        checksum = hashlib.sha256(file_part).hexdigest()
+        recorded = journal.get_part(part_number)
+        if recorded and recorded['sha256'] == checksum:
+            return recorded['id']
+
+        part_id = upload_part(api_key, upload_id, file_part, part_number, total_parts,
+                              session=session, base_url=base_url)
+        journal.record_part(part_number, part_id, checksum)
+        print(f"\tUploaded part {part_number}/{total_parts}: {part_id}")
+        return part_id
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map keeps the part order that complete_upload needs
+        part_ids = list(executor.map(send_part, range(1, total_parts + 1)))
+
+    return complete_upload(api_key, upload_id, part_ids, session=session, base_url=base_url)
+
 # Upload large files (> 512 MB) in parts using Uploads API
-def upload_large_file(api_key, file_path):
-    """Upload a large file in parts using Uploads API."""
+def upload_large_file(api_key, file_path, max_workers=MAX_UPLOAD_WORKERS, part_size=PART_SIZE, base_url=API_BASE_URL,
+                      resume=True):
+    """
+    Upload a large file in parts using Uploads API.
+
+    Parts are sent concurrently over one pooled session. Each part is read from
+    disk only when its upload starts, so at most max_workers parts are in memory.
+    With resume, progress is journaled and an interrupted upload of the same file
+    continues its session, sending only the missing parts.
+    """
     file_name = os.path.basename(file_path)
     file_size = os.path.getsize(file_path)
+    fingerprint = file_fingerprint(file_path)
+    journal = UploadJournal(file_path)
+    session = create_session(max_workers)
 
-    upload_session = create_upload(api_key, file_name, file_size)
+    try:
+        if resume and journal.load(fingerprint, part_size):
+            print(f"Resuming upload session {journal.state['upload_id']}: "
+                  f"{len(journal.state['parts'])} parts already sent")
+            try:
+                file_id = send_parts(api_key, file_path, journal, session, part_size, max_workers, base_url)
+                journal.discard()
+                print(f"Upload completed / File ID: {file_id}")
+                return file_id
+            except Exception as e:
+                print(f"Resumed upload session failed ({e}), starting a new upload.")
+                journal.discard()
 
-    if 'id' not in upload_session:
-        print(f"Error creating upload session: {upload_session}")
-        return None
+        upload_session = create_upload(api_key, file_name, file_size, session=session, base_url=base_url)
 
-    upload_id = upload_session['id']
-    print(f"Created upload session: {upload_id}")
+        if 'id' not in upload_session:
+            print(f"Error creating upload session: {upload_session}")
+            return None
 
-    part_size = 50 * 1024 * 1024  # 5 MB part size
-    total_parts = math.ceil(file_size / part_size)
+        print(f"Created upload session: {upload_session['id']}")
+        journal.start(upload_session['id'], fingerprint, part_size,
+                      upload_session.get('expires_at') or time.time() + 3600)
 
-    part_ids = []
-    part_number = 0
-    with open(file_path, 'rb') as f:
-        while True:
-            file_part = f.read(part_size)
-            if not file_part:
-                break
-            part_number += 1
-            part_id = upload_part(api_key, upload_id, file_part, part_number, total_parts)
-            print(f"\tUploaded part {part_number}/{total_parts}: {part_id}")
-            part_ids.append(part_id)
-            
-    upload_id = complete_upload(api_key, upload_id, part_ids)
-    print(f"Upload completed / File ID: {upload_id}")
-    return upload_id
-
-def upload_dataset(api_key, file_path):
-
-    client = OpenAI(api_key=api_key)
+        try:
+            file_id = send_parts(api_key, file_path, journal, session, part_size, max_workers, base_url)
+        except Exception as e:
+            print(f"Error during multipart upload: {e}")
+            if resume:
+                print(f"Progress is kept in {journal.path}, run the upload again to resume.")
+            else:
+                journal.discard()
+            return None
+
+        journal.discard()
+        print(f"Upload completed / File ID: {file_id}")
+        return file_id
+    finally:
+        session.close()
+
+def upload_dataset(api_key, file_path, base_url=API_BASE_URL):
+
+    client = OpenAI(api_key=api_key, base_url=base_url)
 
     file_size = os.path.getsize(file_path)
 
@@ -118,18 +279,19 @@ def upload_dataset(api_key, file_path):
         return upload_file(client, file_path)
     else:  # > 512 MB
         print(f"File size {file_size / (1024 * 1024):.2f} MB: Using Uploads API for multipart upload.")
-        return upload_large_file(api_key, file_path)
+        return upload_large_file(api_key, file_path, base_url=base_url)
 
 # Start fine-tuning job after file upload
-def start_fine_tuning_job(api_key, uploaded_file_id, model="gpt-4o-2024-08-06"):
+def start_fine_tuning_job(api_key, uploaded_file_id, model="gpt-4o-2024-08-06", validation_file_id=None,
+                          base_url=API_BASE_URL):
 
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=api_key, base_url=base_url)
     
     try:
-        fine_tuning_response = client.fine_tuning.jobs.create(
-            training_file=uploaded_file_id,
-            model=model
-        )
+        job_params = {"training_file": uploaded_file_id, "model": model}
+        if validation_file_id:
+            job_params["validation_file"] = validation_file_id
+        fine_tuning_response = client.fine_tuning.jobs.create(**job_params)
         return fine_tuning_response
         
     except Exception as e:
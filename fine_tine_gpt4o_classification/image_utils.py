@@ -0,0 +1,62 @@
+import math
+from typing import Optional, Tuple
+from PIL import Image
+
+# GPT-4o high detail images are fit into 2048 x 2048, then scaled so the shortest
+# side is 768 and billed per 512 px tile
+HIGH_DETAIL_MAX_EDGE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+TILE_SIZE = 512
+BASE_IMAGE_TOKENS = 85
+TOKENS_PER_TILE = 170
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Input tokens of one high detail image of the given size"""
+    scale = min(1.0, HIGH_DETAIL_MAX_EDGE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return BASE_IMAGE_TOKENS + TOKENS_PER_TILE * tiles
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token count of English text, about four characters per token"""
+    return max(1, len(text) // 4)
+
+def target_size(width: int, height: int, max_edge: Optional[int] = HIGH_DETAIL_MAX_EDGE,
+                short_side: Optional[int] = HIGH_DETAIL_SHORT_SIDE) -> Tuple[int, int]:
+    """
+    Size an image is scaled to before the model reads it, never larger than the original.
+
+    With the defaults this is the high detail resolution, anything above it is
+    only upload bandwidth. None disables a limit.
+    """
+    scale = 1.0
+    if max_edge:
+        scale = min(scale, max_edge / max(width, height))
+    if short_side:
+        scale = min(scale, short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def needs_resize(width: int, height: int, max_edge: Optional[int] = HIGH_DETAIL_MAX_EDGE,
+                 short_side: Optional[int] = HIGH_DETAIL_SHORT_SIDE) -> bool:
+    return target_size(width, height, max_edge, short_side) != (width, height)
+
+def prepare_image(image: Image.Image, max_edge: Optional[int] = HIGH_DETAIL_MAX_EDGE,
+                  short_side: Optional[int] = HIGH_DETAIL_SHORT_SIDE) -> Image.Image:
+    """
+    Decode an opened image as RGB at its target_size().
+
+    Call it before the pixels are loaded: JPEGs are then decoded in draft mode,
+    straight at the smallest 1/2, 1/4 or 1/8 scale that is still at least the
+    target size, and only the remaining step is done by a resize.
+    """
+    size = target_size(image.width, image.height, max_edge, short_side)
+    if size != image.size:
+        # No-op for formats without draft support
+        image.draft('RGB', size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != size:
+        image = image.resize(size, Image.BICUBIC)
+    return image
@@ -0,0 +1,322 @@
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from PIL import Image
+from image_utils import estimate_image_tokens, estimate_text_tokens
+
+class MockOpenAIServer:
+    """
+    Local stand-in for the parts of the OpenAI API used by these scripts.
+
+    Point a script at it with base_url (or OPENAI_BASE_URL) set to server.base_url.
+    fail_rate makes that share of requests answer 500, rate_limit_rate that share
+    answer 429 (rate_limit_next the next n requests) with a Retry-After of
+    retry_after, and latency delays every answer, so retry and concurrency paths
+    can be exercised offline.
+
+    Chat completions answer with responder(messages), by default a label picked
+    from the first [...] list in the prompt by a hash of the image, so the same
+    image always gets the same answer.
+
+    Usage:
+        with MockOpenAIServer(fail_rate=0.1) as server:
+            upload_dataset('test-key', 'dataset.jsonl', base_url=server.base_url)
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, fail_rate: float = 0.0, latency: float = 0.0,
+                 rate_limit_rate: float = 0.0, responder=None, rate_limit_next: int = 0, retry_after: str = '0.2'):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limit_next = rate_limit_next
+        self.retry_after = retry_after
+        self.responder = responder or self.default_responder
+        self.completion_count = 0
+        self.rate_limited_count = 0
+        self.lock = threading.Lock()
+        self.uploads = {}
+        self.files = {}
+        self.jobs = {}
+        self.batches = {}
+        self.request_count = 0
+        self.failed_count = 0
+        self.routes = [
+            ('POST', ['uploads'], self.create_upload),
+            ('POST', ['uploads', None, 'parts'], self.add_upload_part),
+            ('POST', ['uploads', None, 'complete'], self.complete_upload),
+            ('POST', ['files'], self.create_file),
+            ('GET', ['files', None, 'content'], self.get_file_content),
+            ('POST', ['fine_tuning', 'jobs'], self.create_fine_tuning_job),
+            ('POST', ['chat', 'completions'], self.create_chat_completion),
+            ('POST', ['batches'], self.create_batch),
+            ('GET', ['batches', None], self.get_batch),
+        ]
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self, 'GET')
+
+            def do_POST(self):
+                server.handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockOpenAIServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @staticmethod
+    def new_id(prefix: str) -> str:
+        return f"{prefix}-{uuid.uuid4().hex[:24]}"
+
+    def handle(self, request, method: str):
+        with self.lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        segments = [segment for segment in request.path.split('?')[0].split('/') if segment][1:]  # drop 'v1'
+        for route_method, pattern, handler in self.routes:
+            if route_method == method and len(pattern) == len(segments) and all(
+                    expected is None or expected == segment for expected, segment in zip(pattern, segments)):
+                break
+        else:
+            return self.respond(request, 404, {'error': {'message': f"No route for {method} {request.path}"}})
+
+        if self.fail_rate and random.random() < self.fail_rate:
+            with self.lock:
+                self.failed_count += 1
+            return self.respond(request, 500, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+
+        with self.lock:
+            forced = self.rate_limit_next > 0
+            self.rate_limit_next -= forced
+        if forced or (self.rate_limit_rate and random.random() < self.rate_limit_rate):
+            with self.lock:
+                self.rate_limited_count += 1
+            return self.respond(request, 429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                                headers={'Retry-After': self.retry_after})
+
+        args = [segment for expected, segment in zip(pattern, segments) if expected is None]
+        try:
+            result = handler(request, body, *args)
+        except KeyError as e:
+            return self.respond(request, 404, {'error': {'message': f"Unknown id {e}"}})
+        status, payload = result if isinstance(result, tuple) else (200, result)
+        self.respond(request, status, payload)
+
+    @staticmethod
+    def respond(request, status: int, payload, headers: dict = None):
+        if isinstance(payload, bytes):
+            data, content_type = payload, 'application/octet-stream'
+        else:
+            data, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+    @staticmethod
+    def parse_multipart(request, body: bytes) -> dict:
+        """Form fields of a multipart body, file fields as bytes"""
+        header = f"Content-Type: {request.headers['Content-Type']}\r\n\r\n".encode('utf-8')
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            fields[name] = part.get_payload(decode=True)
+        return fields
+
+    def create_upload(self, request, body):
+        data = json.loads(body)
+        upload = {'id': self.new_id('upload'), 'object': 'upload', 'status': 'pending',
+                  'filename': data['filename'], 'bytes': data['bytes'], 'purpose': data['purpose'],
+                  'created_at': int(time.time()), 'expires_at': int(time.time()) + 3600, 'parts': {}}
+        with self.lock:
+            self.uploads[upload['id']] = upload
+        return {key: value for key, value in upload.items() if key != 'parts'}
+
+    def add_upload_part(self, request, body, upload_id):
+        upload = self.uploads[upload_id]
+        if upload['status'] != 'pending' or upload['expires_at'] < time.time():
+            return 400, {'error': {'message': f"Upload {upload_id} is {upload['status']}"}}
+        part_id = self.new_id('part')
+        with self.lock:
+            upload['parts'][part_id] = self.parse_multipart(request, body)['data']
+        return {'id': part_id, 'object': 'upload.part', 'upload_id': upload_id, 'created_at': int(time.time())}
+
+    def complete_upload(self, request, body, upload_id):
+        upload = self.uploads[upload_id]
+        part_ids = json.loads(body)['part_ids']
+        if upload['status'] != 'pending' or any(part_id not in upload['parts'] for part_id in part_ids):
+            return 400, {'error': {'message': f"Upload {upload_id} cannot be completed"}}
+        content = b''.join(upload['parts'][part_id] for part_id in part_ids)
+        if len(content) != upload['bytes']:
+            return 400, {'error': {'message': f"Expected {upload['bytes']} bytes, got {len(content)}"}}
+        upload['status'] = 'completed'
+        file_object = self.store_file(upload['filename'], upload['purpose'], content)
+        return {'id': upload_id, 'object': 'upload', 'status': 'completed', 'file': file_object}
+
+    def store_file(self, filename: str, purpose: str, content: bytes) -> dict:
+        file_object = {'id': self.new_id('file'), 'object': 'file', 'bytes': len(content),
+                       'created_at': int(time.time()), 'filename': filename, 'purpose': purpose,
+                       'status': 'processed'}
+        with self.lock:
+            self.files[file_object['id']] = dict(file_object, content=content)
+        return file_object
+
+    def create_file(self, request, body):
+        fields = self.parse_multipart(request, body)
+        return self.store_file('upload.jsonl', fields['purpose'].decode('utf-8'), fields['file'])
+
+    def get_file_content(self, request, body, file_id):
+        return self.files[file_id]['content']
+
+    def create_fine_tuning_job(self, request, body):
+        data = json.loads(body)
+        job = {'id': self.new_id('ftjob'), 'object': 'fine_tuning.job', 'status': 'queued',
+               'model': data['model'], 'training_file': data['training_file'],
+               'validation_file': data.get('validation_file'), 'created_at': int(time.time()),
+               'fine_tuned_model': None, 'hyperparameters': {'n_epochs': 'auto'}, 'organization_id': 'org-mock',
+               'result_files': [], 'seed': 0, 'trained_tokens': None, 'error': None,
+               'finished_at': None, 'estimated_finish': None, 'integrations': []}
+        with self.lock:
+            self.jobs[job['id']] = job
+        return job
+
+    @staticmethod
+    def default_responder(messages: list) -> str:
+        texts, images = [], []
+        for message in messages:
+            content = message['content']
+            for item in content if isinstance(content, list) else [{'type': 'text', 'text': content}]:
+                if item['type'] == 'text':
+                    texts.append(item['text'])
+                elif item['type'] == 'image_url':
+                    images.append(item['image_url']['url'])
+        labels = re.findall(r"'([^']+)'", (re.findall(r"\[([^\]]*)\]", ' '.join(texts)) or [''])[0])
+        if not labels:
+            return 'mock answer'
+        digest = hashlib.sha256(''.join(images).encode('utf-8')).digest()
+        return labels[digest[0] % len(labels)]
+
+    @staticmethod
+    def count_prompt_tokens(messages: list) -> int:
+        """Billed like the real API: text by length, images by their high detail tiles"""
+        tokens = 0
+        for message in messages:
+            content = message['content']
+            for item in content if isinstance(content, list) else [{'type': 'text', 'text': content}]:
+                if item['type'] == 'text':
+                    tokens += estimate_text_tokens(item['text'])
+                elif item['type'] == 'image_url':
+                    try:
+                        data = base64.b64decode(item['image_url']['url'].split(',', 1)[1])
+                        with Image.open(BytesIO(data)) as image:
+                            tokens += estimate_image_tokens(*image.size)
+                    except Exception:
+                        tokens += estimate_text_tokens(item['image_url']['url'])
+        return tokens
+
+    def complete_chat(self, body: dict) -> dict:
+        """Chat completion object for a request body, also used for batch requests"""
+        with self.lock:
+            self.completion_count += 1
+        answer = self.responder(body['messages'])
+        prompt_tokens = self.count_prompt_tokens(body['messages'])
+        completion_tokens = max(1, len(answer) // 4)
+        return {
+            'id': self.new_id('chatcmpl'), 'object': 'chat.completion', 'created': int(time.time()),
+            'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'logprobs': None,
+                         'message': {'role': 'assistant', 'content': answer}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }
+
+    def create_chat_completion(self, request, body):
+        return self.complete_chat(json.loads(body))
+
+    def create_batch(self, request, body):
+        data = json.loads(body)
+        lines = self.files[data['input_file_id']]['content'].decode('utf-8').splitlines()
+        batch = {'id': self.new_id('batch'), 'object': 'batch', 'endpoint': data['endpoint'],
+                 'input_file_id': data['input_file_id'], 'completion_window': data['completion_window'],
+                 'status': 'in_progress', 'created_at': int(time.time()), 'output_file_id': None,
+                 'error_file_id': None, 'errors': None,
+                 'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0}}
+        with self.lock:
+            self.batches[batch['id']] = batch
+        threading.Thread(target=self.run_batch, args=(batch, lines), daemon=True).start()
+        return batch
+
+    def run_batch(self, batch: dict, lines: list):
+        """Answer every request of a batch in the background, like the real service"""
+        outputs = []
+        for line in lines:
+            item = json.loads(line)
+            response = {'status_code': 200, 'request_id': self.new_id('req'), 'body': self.complete_chat(item['body'])}
+            outputs.append(json.dumps({'id': self.new_id('batch_req'), 'custom_id': item['custom_id'],
+                                       'response': response, 'error': None}))
+            batch['request_counts']['completed'] += 1
+        output_file = self.store_file(f"{batch['id']}_output.jsonl", 'batch_output',
+                                      ('\n'.join(outputs) + '\n').encode('utf-8'))
+        batch['output_file_id'] = output_file['id']
+        batch['status'] = 'completed'
+
+    def get_batch(self, request, body, batch_id):
+        return self.batches[batch_id]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every answer")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(port=args.port, fail_rate=args.fail_rate, latency=args.latency,
+                              rate_limit_rate=args.rate_limit_rate)
+    print(f"Serving on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
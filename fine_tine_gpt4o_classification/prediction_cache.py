@@ -0,0 +1,89 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Optional
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class PredictionCache:
+    """
+    SQLite cache of model answers.
+
+    Entries are keyed by the hash of the image payload, the model id, the hash of
+    the prompt and the hash of the remaining generation parameters, so any change
+    to one of them is a miss. Entries older than ttl_seconds are ignored and
+    removed; with max_entries the least recently used entries are evicted.
+    """
+    def __init__(self, db_path: str, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                image_hash TEXT, model TEXT, prompt_hash TEXT, params_hash TEXT,
+                prediction TEXT, prompt_tokens INTEGER, completion_tokens INTEGER,
+                created_at REAL, last_used REAL,
+                PRIMARY KEY (image_hash, model, prompt_hash, params_hash)
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(base64_image: str, prompt: str, model: str, params: dict) -> tuple:
+        return (sha256_text(base64_image), model, sha256_text(prompt),
+                sha256_text(json.dumps(params, sort_keys=True)))
+
+    def get(self, key: tuple) -> Optional[dict]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT prediction, prompt_tokens, completion_tokens, created_at FROM predictions '
+                'WHERE image_hash = ? AND model = ? AND prompt_hash = ? AND params_hash = ?', key
+            ).fetchone()
+            if row and self.ttl_seconds is not None and row[3] < now - self.ttl_seconds:
+                self.conn.execute('DELETE FROM predictions WHERE image_hash = ? AND model = ? AND prompt_hash = ? '
+                                  'AND params_hash = ?', key)
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute('UPDATE predictions SET last_used = ? WHERE image_hash = ? AND model = ? '
+                              'AND prompt_hash = ? AND params_hash = ?', (now,) + key)
+            self.conn.commit()
+        return {"prediction": row[0], "prompt_tokens": row[1], "completion_tokens": row[2], "created_at": row[3]}
+
+    def put(self, key: tuple, prediction: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              key + (prediction, prompt_tokens, completion_tokens, now, now))
+            self.conn.commit()
+
+    def evict(self) -> int:
+        """Drop expired entries and trim to max_entries, returns the number of entries removed"""
+        removed = 0
+        with self.lock:
+            if self.ttl_seconds is not None:
+                removed += self.conn.execute('DELETE FROM predictions WHERE created_at < ?',
+                                             (time.time() - self.ttl_seconds,)).rowcount
+            if self.max_entries is not None:
+                removed += self.conn.execute(
+                    'DELETE FROM predictions WHERE rowid IN (SELECT rowid FROM predictions '
+                    'ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.max_entries,)
+                ).rowcount
+            self.conn.commit()
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -4,21 +4,46 @@ from io import BytesIO
 from typing import Optional
 from PIL import Image
 from openai import OpenAI
+from image_utils import HIGH_DETAIL_MAX_EDGE, HIGH_DETAIL_SHORT_SIDE, prepare_image
+from prediction_cache import PredictionCache
+
+MAX_TOKENS = 300
 
 class Config:
-    def __init__(self, api_key: str, image_dir: str):
+    def __init__(self, api_key: str, image_dir: str, base_url: Optional[str] = None,
+                 cache_path: Optional[str] = None, cache_ttl: Optional[float] = None,
+                 max_edge: Optional[int] = HIGH_DETAIL_MAX_EDGE, short_side: Optional[int] = HIGH_DETAIL_SHORT_SIDE):
         self.api_key = api_key
         self.image_dir = image_dir
+        # None uses OPENAI_BASE_URL or the real API, see mock_openai_server.py for a local stand-in
+        self.base_url = base_url
+        # SQLite file of earlier answers, identical requests are answered from it for cache_ttl seconds
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        # Images are downscaled to this before sending, the model would not see more detail (None keeps full size)
+        self.max_edge = max_edge
+        self.short_side = short_side
 
 class ImageClassification:
     def __init__(self, config: Config):
         self.api_key = config.api_key
-        self.client = OpenAI(api_key=self.api_key)
+        self.base_url = config.base_url
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
         self.image_dir = config.image_dir
+        self.max_edge = config.max_edge
+        self.short_side = config.short_side
+        self.cache = None
+        if config.cache_path:
+            self.cache = PredictionCache(config.cache_path, ttl_seconds=config.cache_ttl)
+            self.cache.evict()
+
+    def prepare_image(self, image: Image.Image) -> Image.Image:
+        """RGB image at the size the model reads it, see image_utils.prepare_image"""
+        return prepare_image(image, self.max_edge, self.short_side)
 
     def load_image(self, image_path: str) -> Optional[Image.Image]:
         try:
-            image = Image.open(image_path)
+            image = self.prepare_image(Image.open(image_path))
             print(f"Image {image_path} loaded successfully.")
             return image
         except FileNotFoundError as e:
@@ -37,8 +62,10 @@ class ImageClassification:
             print(f"Error converting image to base64: {e}")
             return ""
 
-    def predict(self, INSTRUCTION_PROMPT: str, model: str, base64_image: str) -> str:
-        payload = [
+    @staticmethod
+    def build_messages(INSTRUCTION_PROMPT: str, base64_image: str) -> list:
+        """Chat messages of one classification request"""
+        return [
             {
                 "role": "user",
                 "content": [
@@ -56,14 +83,38 @@ class ImageClassification:
             }
         ]
 
+    @classmethod
+    def build_request(cls, INSTRUCTION_PROMPT: str, model: str, base64_image: str) -> dict:
+        """Body of one chat completions request, shared by every way of sending it"""
+        return {
+            "model": model,
+            "messages": cls.build_messages(INSTRUCTION_PROMPT, base64_image),
+            "max_tokens": MAX_TOKENS,
+        }
+
+    @classmethod
+    def cache_key(cls, INSTRUCTION_PROMPT: str, model: str, base64_image: str) -> tuple:
+        request = cls.build_request(INSTRUCTION_PROMPT, model, base64_image)
+        params = {key: value for key, value in request.items() if key not in ("model", "messages")}
+        return PredictionCache.make_key(base64_image, INSTRUCTION_PROMPT, model, params)
+
+    def predict(self, INSTRUCTION_PROMPT: str, model: str, base64_image: str) -> str:
+        key = None
+        if self.cache:
+            key = self.cache_key(INSTRUCTION_PROMPT, model, base64_image)
+            cached = self.cache.get(key)
+            if cached:
+                return cached["prediction"]
+
         try:
             response = self.client.chat.completions.create(
-                model=model,
-                messages=payload,
-                max_tokens=300,
+                **self.build_request(INSTRUCTION_PROMPT, model, base64_image)
             )
 
             result = response.choices[0].message.content
+            if self.cache:
+                usage = response.usage
+                self.cache.put(key, result, usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
             return result
 
         except Exception as e:
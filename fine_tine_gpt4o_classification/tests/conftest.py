@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The scripts import each other as top level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai_server import MockOpenAIServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    with MockOpenAIServer() as server:
+        yield server
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from batch_api import OfflineBatchClassifier
+from test_image_classification import Config
+
+
+def make_classifier():
+    return OfflineBatchClassifier(Config(api_key='test-key', image_dir='.'), 'gpt-4o', 'Classify')
+
+
+def write_manifest(work_dir, shards, image_paths=()):
+    work_dir.mkdir(exist_ok=True)
+    manifest_path = work_dir / 'manifest.json'
+    manifest = {"model": "gpt-4o", "source_hash": OfflineBatchClassifier.source_hash(list(image_paths)),
+                "images": {}, "skipped": {}, "shards": shards, "cache_keys": {}, "cached": {}}
+    manifest_path.write_text(json.dumps(manifest))
+    return manifest_path
+
+
+def stub_steps(classifier, monkeypatch):
+    steps = []
+    monkeypatch.setattr(classifier, 'submit', lambda path: steps.append(('submit', path)))
+    monkeypatch.setattr(classifier, 'wait', lambda path, poll_interval: steps.append(('wait', path)))
+    monkeypatch.setattr(classifier, 'collect', lambda path, output_file: steps.append(('collect', path)) or [])
+    return steps
+
+
+def test_build_refuses_to_overwrite_submitted_batches(tmp_path):
+    manifest_path = write_manifest(tmp_path / 'work', [{"file": "batch_input-00001.jsonl", "batch_id": "batch_1"}])
+    before = manifest_path.read_text()
+
+    with pytest.raises(FileExistsError):
+        make_classifier().build([], str(tmp_path / 'work'))
+    assert manifest_path.read_text() == before
+
+
+def test_build_replaces_a_manifest_without_submitted_batches(tmp_path):
+    manifest_path = write_manifest(tmp_path / 'work', [{"file": "batch_input-00001.jsonl"}])
+
+    assert make_classifier().build([], str(tmp_path / 'work')) == str(manifest_path)
+    assert json.loads(manifest_path.read_text())["shards"] == []
+
+
+def test_run_resumes_from_an_existing_manifest(tmp_path, monkeypatch):
+    manifest_path = write_manifest(tmp_path / 'work', [{"file": "batch_input-00001.jsonl", "batch_id": "batch_1"}],
+                                   image_paths=['a.jpg', 'b.jpg'])
+    classifier = make_classifier()
+    steps = stub_steps(classifier, monkeypatch)
+
+    classifier.run(['a.jpg', 'b.jpg'], str(tmp_path / 'work'), str(tmp_path / 'predictions.jsonl'))
+
+    assert steps == [('submit', str(manifest_path)), ('wait', str(manifest_path)), ('collect', str(manifest_path))]
+    assert json.loads(manifest_path.read_text())["shards"][0]["batch_id"] == "batch_1"
+
+
+def test_run_rejects_a_manifest_of_another_image_set(tmp_path, monkeypatch):
+    manifest_path = write_manifest(tmp_path / 'work', [{"file": "batch_input-00001.jsonl", "batch_id": "batch_1"}],
+                                   image_paths=['a.jpg', 'b.jpg'])
+    before = manifest_path.read_text()
+    classifier = make_classifier()
+    steps = stub_steps(classifier, monkeypatch)
+
+    with pytest.raises(ValueError, match="other images"):
+        classifier.run(['a.jpg', 'c.jpg'], str(tmp_path / 'work'), str(tmp_path / 'predictions.jsonl'))
+    assert steps == []
+    assert manifest_path.read_text() == before
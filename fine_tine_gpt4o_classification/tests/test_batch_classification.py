@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import RateLimitError
+from PIL import Image
+
+from batch_classification import BatchClassifier, TokenBucket
+from test_image_classification import Config
+
+
+class FakeCompletions:
+    """Answers with a 429 carrying retry_after first, then succeeds"""
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        self.calls = []
+
+    async def create(self, **request):
+        self.calls.append(time.monotonic())
+        if len(self.calls) == 1:
+            request = httpx.Request('POST', 'http://test/chat/completions')
+            response = httpx.Response(429, headers={'retry-after': self.retry_after}, request=request)
+            raise RateLimitError('rate limited', response=response, body=None)
+        return type('Response', (), {'usage': None})()
+
+
+class FakeClient:
+    def __init__(self, completions):
+        self.chat = type('Chat', (), {'completions': completions})()
+
+
+def make_classifier(base_url=None, **kwargs):
+    kwargs = dict(dict(requests_per_minute=6000, tokens_per_minute=10 ** 6), **kwargs)
+    return BatchClassifier(Config(api_key='test-key', image_dir='.', base_url=base_url), 'gpt-4o',
+                           "Classify the image as one of ['crazing', 'inclusion']", **kwargs)
+
+
+def classify(classifier, tmp_path, count=1):
+    """Classify count small images, returns the records and the seconds it took"""
+    image_paths = []
+    for index in range(count):
+        image_paths.append(str(tmp_path / f"{index}.png"))
+        Image.new('RGB', (64, 64), (index * 40, 0, 0)).save(image_paths[-1])
+    start = time.monotonic()
+    records = asyncio.run(classifier.classify_images(image_paths, str(tmp_path / 'predictions.jsonl')))
+    return records, time.monotonic() - start
+
+
+@pytest.mark.parametrize('retry_after, rate_limits, delay', [('0.3', 2, 0.6),
+                                                            ('Wed, 21 Oct 2026 07:28:00 GMT', 1, 2)])
+def test_rate_limited_requests_wait_for_retry_after(tmp_path, mock_server, retry_after, rate_limits, delay):
+    mock_server.rate_limit_next, mock_server.retry_after = rate_limits, retry_after
+
+    records, elapsed = classify(make_classifier(mock_server.base_url), tmp_path)
+
+    assert records[0]["error"] is None and records[0]["prediction"] in ('crazing', 'inclusion')
+    assert records[0]["attempts"] == rate_limits + 1
+    assert mock_server.rate_limited_count == rate_limits
+    # Numeric values are honoured, an HTTP date falls back to 2 ** attempt seconds
+    assert delay <= elapsed < delay + 1.5
+
+
+def test_rate_limits_beyond_max_retries_fail_the_record(tmp_path, mock_server):
+    mock_server.rate_limit_next, mock_server.retry_after = 5, '0.05'
+
+    records, _ = classify(make_classifier(mock_server.base_url, max_retries=1), tmp_path)
+
+    assert records[0]["error"].startswith('RateLimitError')
+    assert records[0]["attempts"] == 2
+    assert mock_server.rate_limited_count == 2
+
+
+def test_token_bucket_charges_the_billed_tokens(tmp_path, mock_server):
+    classifier = make_classifier(mock_server.base_url, tokens_per_minute=6000)
+
+    records, elapsed = classify(classifier, tmp_path, count=3)
+
+    billed = sum(record["prompt_tokens"] + record["completion_tokens"] for record in records)
+    assert billed > 0
+    # The estimates were charged up front and corrected to the billed usage, plus what refilled since
+    assert 6000 - billed <= classifier._tokens.tokens <= 6000 - billed + 100 * elapsed + 1
+
+
+def test_token_bucket_adjust():
+    bucket = TokenBucket(60)
+
+    asyncio.run(bucket.acquire(50))
+    bucket.adjust(20)
+    assert 30 <= bucket.tokens < 31
+    bucket.adjust(-40)
+    assert -10 <= bucket.tokens < -9
+    bucket.adjust(1000)
+    assert bucket.tokens == 60
+
+
+def test_cooldown_is_checked_after_waiting_for_the_buckets():
+    classifier = make_classifier()
+    completions = FakeCompletions('0.5')
+
+    async def run():
+        classifier.reset_limits()
+        record = classifier.new_record()
+        original_acquire = classifier._tokens.acquire
+
+        async def acquire(amount):
+            await original_acquire(amount)
+            # A 429 of another request lands while this one holds its tokens
+            classifier._cooldown_until = time.monotonic() + 0.5
+
+        classifier._tokens.acquire = acquire
+        start = time.monotonic()
+        await classifier.send_request(FakeClient(completions), {}, 10, record)
+        return start
+
+    start = asyncio.run(run())
+
+    assert completions.calls[0] - start >= 0.45
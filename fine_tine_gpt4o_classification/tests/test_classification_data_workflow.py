@@ -0,0 +1,170 @@
+import base64
+import os
+import shutil
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from classification_data_workflow import (MAX_IMAGE_EDGE, TRAINING_PRICE_PER_MILLION_TOKENS, DatasetPreparer,
+                                          ImageProcessor, ShardedJsonlWriter, example_text_tokens, scan_image)
+from image_utils import estimate_image_tokens
+
+
+def write_lines(output_file, lines, max_bytes=None):
+    with ShardedJsonlWriter(str(output_file), max_bytes) as writer:
+        for line in lines:
+            writer.write(line)
+    return writer
+
+
+def test_single_shard_keeps_the_plain_name(tmp_path):
+    writer = write_lines(tmp_path / 'train.jsonl', ['{"a": 1}\n'] * 3, max_bytes=1024)
+
+    assert writer.paths == [str(tmp_path / 'train.jsonl')]
+    assert sorted(os.listdir(tmp_path)) == ['train.jsonl']
+    assert (tmp_path / 'train.jsonl').read_text() == '{"a": 1}\n' * 3
+
+
+def test_shards_are_cut_before_exceeding_max_bytes(tmp_path):
+    line = '{"a": 1}\n'  # 9 bytes
+    writer = write_lines(tmp_path / 'train.jsonl', [line] * 5, max_bytes=20)
+
+    assert [os.path.basename(path) for path in writer.paths] == \
+        ['train-00001.jsonl', 'train-00002.jsonl', 'train-00003.jsonl']
+    assert [os.path.getsize(path) for path in writer.paths] == [18, 18, 9]
+    assert not (tmp_path / 'train.jsonl').exists()
+
+
+def test_without_max_bytes_everything_goes_to_one_file(tmp_path):
+    writer = write_lines(tmp_path / 'train.jsonl', ['x' * 100 + '\n'] * 50)
+
+    assert writer.paths == [str(tmp_path / 'train.jsonl')]
+    assert os.path.getsize(writer.paths[0]) == 101 * 50
+
+
+def test_outputs_of_earlier_runs_are_removed(tmp_path):
+    write_lines(tmp_path / 'train.jsonl', ['{"a": 1}\n'] * 5, max_bytes=20)
+    write_lines(tmp_path / 'train.jsonl', ['{"a": 1}\n'] * 3, max_bytes=20)
+    assert sorted(os.listdir(tmp_path)) == ['train-00001.jsonl', 'train-00002.jsonl']
+
+    write_lines(tmp_path / 'train.jsonl', ['{"a": 1}\n'])
+    assert sorted(os.listdir(tmp_path)) == ['train.jsonl']
+
+    write_lines(tmp_path / 'train.jsonl', [])
+    assert os.listdir(tmp_path) == []
+
+
+def write_image(path, size=(64, 48), mode='RGB', seed=0):
+    """Noise image, so every seed encodes to different bytes"""
+    pixels = np.random.default_rng(seed).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).convert(mode)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    image.save(path)
+    return str(path)
+
+
+def write_dataset(root):
+    """Two classes with accepted, rejected and duplicate files"""
+    for index in range(6):
+        write_image(root / 'crazing' / f'crazing_{index}.jpg', seed=index)
+    write_image(root / 'crazing' / 'crazing_6.png', seed=6)
+    for index in range(4):
+        write_image(root / 'inclusion' / f'inclusion_{index}.jpg', seed=10 + index)
+    write_image(root / 'inclusion' / 'gray.jpg', mode='L', seed=20)
+    (root / 'inclusion' / 'notes.txt').write_text('not an image')
+    shutil.copy(root / 'crazing' / 'crazing_0.jpg', root / 'inclusion' / 'copy_of_crazing_0.jpg')
+    return str(root)
+
+
+def prepare(root, output_file, **kwargs):
+    preparer = DatasetPreparer(root, str(output_file), **kwargs)
+    preparer.prepare_dataset()
+    return preparer
+
+
+def test_parallel_prepare_matches_serial_output(tmp_path):
+    root = write_dataset(tmp_path / 'data')
+
+    serial = prepare(root, tmp_path / 'serial.jsonl', max_workers=1, validation_fraction=0.25)
+    parallel = prepare(root, tmp_path / 'parallel.jsonl', max_workers=3, validation_fraction=0.25)
+
+    for suffix in ('.jsonl', '_validation.jsonl'):
+        assert (tmp_path / f'serial{suffix}').read_bytes() == (tmp_path / f'parallel{suffix}').read_bytes()
+    assert serial.class_stats == parallel.class_stats
+    assert serial.duplicates == parallel.duplicates
+    assert serial.total_examples == parallel.total_examples == 11
+    assert serial.class_stats['inclusion']['skipped_reasons'] == {
+        'Unsupported file format': 1, 'Image is not in RGB or RGBA mode': 1, 'Duplicate image': 1}
+
+
+def decode(payload):
+    return Image.open(BytesIO(base64.b64decode(payload)))
+
+
+def test_compliant_jpegs_are_sent_as_their_original_bytes(tmp_path):
+    path = write_image(tmp_path / 'crazing.jpg')
+
+    payload, error, passthrough = ImageProcessor.encode_image(path)
+
+    assert (error, passthrough) == (None, True)
+    with open(path, 'rb') as f:
+        assert base64.b64decode(payload) == f.read()
+
+
+def test_other_images_are_reencoded_as_jpeg(tmp_path):
+    png = write_image(tmp_path / 'crazing.png')
+    rgba = write_image(tmp_path / 'crazing_rgba.png', mode='RGBA')
+    large = write_image(tmp_path / 'crazing_large.jpg', size=(MAX_IMAGE_EDGE + 400, 600))
+
+    for path in (png, rgba, large):
+        payload, error, passthrough = ImageProcessor.encode_image(path)
+        assert (error, passthrough) == (None, False)
+        with decode(payload) as image:
+            assert (image.format, image.mode) == ('JPEG', 'RGB')
+    with decode(ImageProcessor.encode_image(large)[0]) as image:
+        assert max(image.size) == MAX_IMAGE_EDGE
+
+
+def test_scan_applies_the_encoding_rules_to_the_headers(tmp_path):
+    root = write_dataset(tmp_path / 'data')
+
+    scan = DatasetPreparer(root, str(tmp_path / 'train.jsonl'), validation_fraction=0.25).scan_dataset(epochs=2)
+
+    totals = scan['totals']
+    assert (totals['images'], totals['accepted'], totals['skipped']) == (14, 12, 2)
+    assert scan['classes']['inclusion']['skipped_reasons'] == {
+        'Unsupported file format': 1, 'Image is not in RGB or RGBA mode': 1}
+    # Duplicates only show up while encoding, everything else is the same decision
+    prepared = prepare(root, tmp_path / 'train.jsonl', validation_fraction=0.25)
+    assert totals['accepted'] == prepared.total_examples + len(prepared.duplicates)
+    assert scan['classes']['crazing']['validation'] == prepared.class_stats['crazing']['validation'] == 2
+
+    assert totals['image_tokens'] == 12 * estimate_image_tokens(64, 48)
+    training_examples = totals['accepted'] - totals['validation']
+    assert totals['training_tokens'] == training_examples * estimate_image_tokens(64, 48) + sum(
+        example_text_tokens(class_dir) * (stats['accepted'] - stats['validation'])
+        for class_dir, stats in scan['classes'].items())
+    assert totals['estimated_cost'] == pytest.approx(
+        totals['training_tokens'] * 2 * TRAINING_PRICE_PER_MILLION_TOKENS / 1e6)
+
+
+def test_scan_payload_is_exact_for_images_sent_as_they_are(tmp_path):
+    path = write_image(tmp_path / 'crazing.jpg')
+
+    result = scan_image(path, os.path.getsize(path))
+
+    assert result['error'] is None
+    assert result['payload_bytes'] == len(ImageProcessor.encode_image(path)[0])
+
+
+def test_scan_scales_the_payload_of_resized_images(tmp_path):
+    path = write_image(tmp_path / 'crazing.jpg', size=(MAX_IMAGE_EDGE * 2, 600))
+    size = os.path.getsize(path)
+
+    result = scan_image(path, size)
+
+    # Half the width at the same height, so half the pixels
+    assert result['payload_bytes'] == 4 * -(-int(size / 4) // 3)
+    assert result['image_tokens'] == estimate_image_tokens(MAX_IMAGE_EDGE * 2, 600)
@@ -0,0 +1,69 @@
+import os
+import shutil
+
+import pytest
+
+import encoding_cache
+from encoding_cache import EncodingCache, content_hash
+
+SETTINGS = {'max_edge': 2048, 'quality': 90}
+
+
+def stat(path):
+    info = os.stat(path)
+    return str(path), info.st_size, info.st_mtime_ns
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / 'images' / 'crazing_1.jpg'
+    path.parent.mkdir()
+    path.write_bytes(b'image bytes')
+    return path
+
+
+def store(cache, path, payload='encoded'):
+    cache.store(*stat(path), content_hash(str(path)), payload, None, False)
+
+
+def test_unchanged_file_hits_by_path(tmp_path, image, monkeypatch):
+    cache = EncodingCache(str(tmp_path / 'cache.sqlite'), SETTINGS)
+    store(cache, image)
+    # A path hit must not read the file
+    monkeypatch.setattr(encoding_cache, 'content_hash', None)
+
+    assert cache.lookup(*stat(image)) == (content_hash(str(image)), 'encoded', None, False)
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.close()
+
+
+def test_renamed_and_copied_files_hit_by_content(tmp_path, image, monkeypatch):
+    cache = EncodingCache(str(tmp_path / 'cache.sqlite'), SETTINGS)
+    store(cache, image)
+    moved = tmp_path / 'moved.jpg'
+    shutil.copy(image, moved)
+    os.utime(moved, ns=(1, 1))
+
+    assert cache.lookup(*stat(moved)) == (content_hash(str(image)), 'encoded', None, False)
+    # The files row was updated, so the next lookup is a path hit again
+    monkeypatch.setattr(encoding_cache, 'content_hash', None)
+    assert cache.lookup(*stat(moved))[1] == 'encoded'
+    assert (cache.hits, cache.misses) == (2, 0)
+    cache.close()
+
+
+def test_changed_content_or_settings_miss(tmp_path, image):
+    db_path = str(tmp_path / 'cache.sqlite')
+    cache = EncodingCache(db_path, SETTINGS)
+    store(cache, image)
+    cache.close()
+
+    other_settings = EncodingCache(db_path, dict(SETTINGS, quality=75))
+    assert other_settings.lookup(*stat(image)) is None
+    other_settings.close()
+
+    cache = EncodingCache(db_path, SETTINGS)
+    image.write_bytes(b'edited image bytes')
+    assert cache.lookup(*stat(image)) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    cache.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from evaluate import CLASSES, INVALID_LABEL, label_from_path, normalize_prediction, percentile, summarize
+
+
+@pytest.mark.parametrize('image_path, label', [
+    ('data/test/crazing/1.jpg', 'crazing'),
+    ('data/test/crazing_19.jpg', 'crazing'),
+    ('data/test/pitted_surface-3.png', 'pitted_surface'),
+    ('data/test/pitted_surface_x.jpg', 'pitted_surface'),
+    ('data/test/rolled_scale_2.jpg', None),
+])
+def test_label_from_path(image_path, label):
+    assert label_from_path(image_path, CLASSES) == label
+
+
+@pytest.mark.parametrize('prediction, label', [
+    ('crazing', 'crazing'),
+    ("'Inclusion'.", 'inclusion'),
+    ('This looks like a pitted_surface defect', 'pitted_surface'),
+    ('scratches', INVALID_LABEL),
+    ('', INVALID_LABEL),
+    (None, INVALID_LABEL),
+])
+def test_normalize_prediction(prediction, label):
+    assert normalize_prediction(prediction, CLASSES) == label
+
+
+def test_percentile_interpolates_between_values():
+    assert percentile([], 50) is None
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 95) == pytest.approx(4.8)
+
+
+def record(label, predicted_label, error=None, latency=1.0, cached=False, tokens=(100, 5)):
+    return {"label": label, "predicted_label": predicted_label, "error": error, "latency": latency,
+            "cached": cached, "prompt_tokens": tokens[0], "completion_tokens": tokens[1]}
+
+
+def test_summarize_scores_labelled_answers():
+    classes = ['crazing', 'inclusion']
+    records = [
+        record('crazing', 'crazing', latency=1.0),
+        record('crazing', 'inclusion', latency=2.0),
+        record('inclusion', 'inclusion', latency=3.0),
+        record('inclusion', INVALID_LABEL, latency=4.0),
+        record(None, 'crazing', latency=5.0),
+        record('crazing', INVALID_LABEL, error='APIConnectionError: down', latency=None, tokens=(0, 0)),
+        record('inclusion', 'inclusion', latency=0.0, cached=True, tokens=(0, 0)),
+    ]
+
+    summary = summarize(records, classes, 'gpt-4o', wall_time=2.0)
+
+    assert (summary["images"], summary["scored"], summary["unlabeled"], summary["errors"], summary["cached"]) == \
+        (7, 5, 1, 1, 1)
+    assert summary["accuracy"] == pytest.approx(3 / 5)
+    assert summary["invalid_answers"] == 1
+    assert summary["confusion_matrix"]["crazing"] == {'crazing': 1, 'inclusion': 1, INVALID_LABEL: 0}
+    assert summary["per_class"]["inclusion"] == {"support": 3, "precision": pytest.approx(2 / 3),
+                                                 "recall": pytest.approx(2 / 3)}
+    # Cached answers and failed requests do not count towards latency
+    assert summary["latency_seconds"]["p50"] == 3.0
+    assert summary["latency_seconds"]["mean"] == 3.0
+    assert summary["throughput_images_per_second"] == 3.5
+    assert summary["tokens"] == {"prompt": 500, "completion": 25, "total": 525, "per_image": 75.0}
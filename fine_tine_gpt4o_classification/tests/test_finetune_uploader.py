@@ -0,0 +1,163 @@
+import json
+import os
+import time
+
+import finetune_uploader
+from finetune_uploader import UploadJournal, post_with_retry, upload_large_file
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, text=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def test_retry_after_http_date_falls_back_to_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(finetune_uploader.time, 'sleep', delays.append)
+    session = FakeSession([
+        FakeResponse(429, {'Retry-After': 'Wed, 21 Oct 2026 07:28:00 GMT'}),
+        FakeResponse(503, {'Retry-After': '3'}),
+        FakeResponse(200),
+    ])
+
+    response = post_with_retry(session, 'http://test/uploads', backoff=1.0)
+
+    assert response.status_code == 200
+    assert session.calls == 3
+    # Jitter scales each delay by 0.5 to 1.5
+    assert 0.5 <= delays[0] <= 1.5
+    assert 1.5 <= delays[1] <= 4.5
+
+
+def test_upload_errors_report_non_json_bodies(monkeypatch):
+    monkeypatch.setattr(finetune_uploader.time, 'sleep', lambda delay: None)
+    session = FakeSession([FakeResponse(400, text='<html>Bad Request</html>')])
+
+    upload_session = finetune_uploader.create_upload('key', 'train.jsonl', 10, session=session)
+
+    assert upload_session == {'error': '<html>Bad Request</html>'}
+
+
+def write_dataset(path, size=10000):
+    lines = []
+    while sum(map(len, lines)) < size:
+        lines.append(json.dumps({"messages": [{"role": "user", "content": f"example {len(lines)}"}]}) + '\n')
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+def test_multipart_upload_against_the_mock_server(tmp_path, mock_server):
+    dataset = write_dataset(tmp_path / 'train.jsonl')
+
+    file_id = upload_large_file('test-key', dataset, part_size=1024, base_url=mock_server.base_url)
+
+    assert_uploaded(mock_server, file_id, dataset)
+
+
+def interrupt_upload(dataset, mock_server, monkeypatch, sent):
+    """Upload that loses its connection on part 4, returns the journal it leaves behind"""
+    real_upload_part = finetune_uploader.upload_part
+    dropped = []
+
+    def flaky_upload_part(api_key, upload_id, file_part, part_number, *args, **kwargs):
+        if part_number == 4 and not dropped:
+            dropped.append(part_number)
+            raise ConnectionError("connection dropped")
+        sent.append(part_number)
+        return real_upload_part(api_key, upload_id, file_part, part_number, *args, **kwargs)
+
+    monkeypatch.setattr(finetune_uploader, 'upload_part', flaky_upload_part)
+    assert upload_large_file('test-key', dataset, part_size=1024, max_workers=1,
+                             base_url=mock_server.base_url) is None
+    with open(f"{dataset}.upload.json") as f:
+        return json.load(f)
+
+
+def assert_uploaded(mock_server, file_id, dataset):
+    with open(dataset, 'rb') as f:
+        assert mock_server.files[file_id]['content'] == f.read()
+    assert not os.path.exists(f"{dataset}.upload.json")
+
+
+def test_interrupted_upload_resumes_with_the_missing_parts(tmp_path, mock_server, monkeypatch):
+    dataset = write_dataset(tmp_path / 'train.jsonl')
+    sent = []
+    journal = interrupt_upload(dataset, mock_server, monkeypatch, sent)
+    assert '4' not in journal['parts'] and {'1', '2', '3'} <= set(journal['parts'])
+    missing = [number for number in range(1, 11) if str(number) not in journal['parts']]
+
+    # A part whose bytes no longer match its checksum is sent again
+    journal['parts']['2']['sha256'] = '0' * 64
+    with open(f"{dataset}.upload.json", 'w') as f:
+        json.dump(journal, f)
+    del sent[:]
+    file_id = upload_large_file('test-key', dataset, part_size=1024, max_workers=1, base_url=mock_server.base_url)
+
+    assert sent == sorted([2] + missing)
+    assert len(mock_server.uploads) == 1
+    assert_uploaded(mock_server, file_id, dataset)
+
+
+def test_non_json_error_body_is_reported(tmp_path, mock_server, capsys):
+    dataset = write_dataset(tmp_path / 'train.jsonl', size=3000)
+    mock_server.routes.insert(0, ('POST', ['uploads', None, 'complete'],
+                                  lambda request, body, upload_id: (400, b'<html>Bad Request</html>')))
+
+    assert upload_large_file('test-key', dataset, part_size=1024, base_url=mock_server.base_url) is None
+    assert 'Failed to complete upload: <html>Bad Request</html>' in capsys.readouterr().out
+    # The parts are kept for a later run
+    assert UploadJournal(dataset).load(finetune_uploader.file_fingerprint(dataset), 1024)
+
+
+def test_changed_file_starts_a_new_upload(tmp_path, mock_server, monkeypatch):
+    dataset = write_dataset(tmp_path / 'train.jsonl')
+    interrupt_upload(dataset, mock_server, monkeypatch, [])
+    with open(dataset, 'a') as f:
+        f.write(json.dumps({"messages": [{"role": "user", "content": "one more"}]}) + '\n')
+
+    file_id = upload_large_file('test-key', dataset, part_size=1024, base_url=mock_server.base_url)
+
+    assert len(mock_server.uploads) == 2
+    assert_uploaded(mock_server, file_id, dataset)
+
+
+def test_expired_or_rejected_sessions_start_a_new_upload(tmp_path, mock_server, monkeypatch, capsys):
+    dataset = write_dataset(tmp_path / 'train.jsonl')
+    journal = interrupt_upload(dataset, mock_server, monkeypatch, [])
+
+    # The server dropped the session before it expired
+    mock_server.uploads[journal['upload_id']]['status'] = 'cancelled'
+    file_id = upload_large_file('test-key', dataset, part_size=1024, base_url=mock_server.base_url)
+    assert 'Resumed upload session failed' in capsys.readouterr().out
+    assert_uploaded(mock_server, file_id, dataset)
+
+    # A session about to expire is not resumed at all
+    journal = interrupt_upload(dataset, mock_server, monkeypatch, [])
+    journal['expires_at'] = time.time() + 30
+    with open(f"{dataset}.upload.json", 'w') as f:
+        json.dump(journal, f)
+    file_id = upload_large_file('test-key', dataset, part_size=1024, base_url=mock_server.base_url)
+    assert 'has expired, starting a new upload' in capsys.readouterr().out
+    assert len(mock_server.uploads) == 4
+    assert_uploaded(mock_server, file_id, dataset)
+
+
+def test_without_resume_a_failed_upload_leaves_no_journal(tmp_path, mock_server):
+    dataset = write_dataset(tmp_path / 'train.jsonl', size=3000)
+    mock_server.routes.insert(0, ('POST', ['uploads', None, 'complete'],
+                                  lambda request, body, upload_id: (400, {'error': {'message': 'Bad part ids'}})))
+
+    assert upload_large_file('test-key', dataset, part_size=1024, base_url=mock_server.base_url, resume=False) is None
+    assert not os.path.exists(f"{dataset}.upload.json")
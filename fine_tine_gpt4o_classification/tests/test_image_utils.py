@@ -0,0 +1,41 @@
+import pytest
+from PIL import Image
+
+from image_utils import estimate_image_tokens, needs_resize, prepare_image, target_size
+
+
+@pytest.mark.parametrize('size, target', [
+    ((4000, 3000), (1024, 768)),   # fit into 2048, then the short side to 768
+    ((3000, 600), (2048, 410)),    # already below 768 on the short side after the first step
+    ((1024, 768), (1024, 768)),
+    ((300, 200), (300, 200)),      # never upscaled
+])
+def test_target_size(size, target):
+    assert target_size(*size) == target
+    assert needs_resize(*size) == (size != target)
+
+
+def test_limits_can_be_disabled():
+    assert target_size(4000, 3000, max_edge=None, short_side=None) == (4000, 3000)
+    assert target_size(4000, 3000, max_edge=1000, short_side=None) == (1000, 750)
+
+
+def test_prepare_image_decodes_large_jpegs_at_the_target_size(tmp_path):
+    path = str(tmp_path / 'large.jpg')
+    Image.new('RGB', (4000, 3000), (120, 60, 30)).save(path)
+
+    with Image.open(path) as image:
+        prepared = prepare_image(image)
+
+    assert (prepared.size, prepared.mode) == ((1024, 768), 'RGB')
+    assert estimate_image_tokens(*prepared.size) == estimate_image_tokens(4000, 3000) == 85 + 170 * 4
+
+
+def test_prepare_image_converts_small_images_without_resizing(tmp_path):
+    path = str(tmp_path / 'small.png')
+    Image.new('RGBA', (300, 200), (120, 60, 30, 128)).save(path)
+
+    with Image.open(path) as image:
+        prepared = prepare_image(image)
+
+    assert (prepared.size, prepared.mode) == ((300, 200), 'RGB')
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from PIL import Image
+
+from batch_classification import BatchClassifier
+from prediction_cache import PredictionCache
+from test_image_classification import Config
+
+PARAMS = {'max_tokens': 300}
+
+
+def test_hit_needs_the_same_image_model_prompt_and_params(tmp_path):
+    cache = PredictionCache(str(tmp_path / 'predictions.sqlite'))
+    cache.put(PredictionCache.make_key('image', 'prompt', 'gpt-4o', PARAMS), 'crazing', 900, 2)
+
+    hit = cache.get(PredictionCache.make_key('image', 'prompt', 'gpt-4o', PARAMS))
+    assert (hit['prediction'], hit['prompt_tokens'], hit['completion_tokens']) == ('crazing', 900, 2)
+    for key in (PredictionCache.make_key('other image', 'prompt', 'gpt-4o', PARAMS),
+                PredictionCache.make_key('image', 'other prompt', 'gpt-4o', PARAMS),
+                PredictionCache.make_key('image', 'prompt', 'ft:gpt-4o:custom', PARAMS),
+                PredictionCache.make_key('image', 'prompt', 'gpt-4o', {'max_tokens': 10})):
+        assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (1, 4)
+    cache.close()
+
+
+def test_expired_and_least_recently_used_entries_are_dropped(tmp_path):
+    cache = PredictionCache(str(tmp_path / 'predictions.sqlite'), ttl_seconds=0.2, max_entries=2)
+    keys = [PredictionCache.make_key(f'image {index}', 'prompt', 'gpt-4o', PARAMS) for index in range(3)]
+    for key in keys:
+        cache.put(key, 'crazing')
+        time.sleep(0.01)
+    cache.get(keys[0])
+
+    assert cache.evict() == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) and cache.get(keys[2])
+
+    time.sleep(0.25)
+    assert cache.get(keys[0]) is None
+    assert cache.evict() == 1
+    cache.close()
+
+
+def test_second_run_is_answered_from_the_cache(tmp_path, mock_server):
+    image_paths = []
+    for index in range(3):
+        image_paths.append(str(tmp_path / f"{index}.png"))
+        Image.new('RGB', (64, 64), (index * 40, 0, 0)).save(image_paths[-1])
+    config = Config(api_key='test-key', image_dir=str(tmp_path), base_url=mock_server.base_url,
+                    cache_path=str(tmp_path / 'predictions.sqlite'))
+
+    def run():
+        classifier = BatchClassifier(config, 'gpt-4o', "Classify the image as one of ['crazing', 'inclusion']")
+        records = asyncio.run(classifier.classify_images(image_paths, str(tmp_path / 'predictions.jsonl')))
+        return sorted(records, key=lambda record: record["image_path"])
+
+    first = run()
+    assert mock_server.completion_count == 3
+    second = run()
+
+    assert mock_server.completion_count == 3
+    assert [record["cached"] for record in second] == [True] * 3
+    assert [record["prediction"] for record in second] == [record["prediction"] for record in first]
+    assert all(record["prompt_tokens"] == 0 for record in second)
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+from test_image_classification import Config
+from video_classification import MAX_TILE_DIFFERENCE, SIGNATURE_WIDTH, VideoClassifier, frame_signature, tile_difference
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_missing_cortalv2i_checkout_raises_a_clear_import_error(tmp_path):
+    result = subprocess.run([sys.executable, '-c', 'import video_classification'], cwd=PROJECT_DIR,
+                            env=dict(os.environ, CORTALV2I_ROOT=str(tmp_path)), capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert f"ImportError: cortalv2i not found in {tmp_path}, set CORTALV2I_ROOT" in result.stderr
+
+
+def background(width=320, height=240):
+    """Smooth gradient, so compression noise stays far below the threshold"""
+    row = np.linspace(40, 200, width, dtype=np.float32)
+    gray = np.tile(row, (height, 1)).astype(np.uint8)
+    return cv2.merge([gray, gray, gray])
+
+
+def with_defect(frame, x=150, y=100, size=30):
+    frame = frame.copy()
+    frame[y:y + size, x:x + size] = 255
+    return frame
+
+
+def test_frame_signature_is_a_small_grayscale_copy():
+    signature = frame_signature(background(640, 480))
+
+    assert signature.shape == (96, SIGNATURE_WIDTH)
+    assert signature.dtype == np.float32
+
+
+def test_tile_difference_catches_small_local_changes():
+    frame = background(640, 480)
+    noise = np.random.default_rng(0).integers(-3, 4, frame.shape)
+    noisy = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    brighter = cv2.add(frame, np.full(frame.shape, 2, dtype=np.uint8))
+
+    assert tile_difference(frame_signature(frame), frame_signature(frame)) == 0
+    assert tile_difference(frame_signature(frame), frame_signature(noisy)) <= MAX_TILE_DIFFERENCE
+    assert tile_difference(frame_signature(frame), frame_signature(brighter)) <= MAX_TILE_DIFFERENCE
+    # 30 px is under 0.3% of the frame, far below what a global hash would notice
+    assert tile_difference(frame_signature(frame), frame_signature(with_defect(frame))) > MAX_TILE_DIFFERENCE
+
+
+def write_video(path, fps=10):
+    """One second of background, one second with a defect, one second of background again"""
+    frame = background()
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, (320, 240))
+    for second in range(3):
+        for _ in range(fps):
+            writer.write(with_defect(frame) if second == 1 else frame)
+    writer.release()
+    return str(path)
+
+
+def test_skipped_frames_take_over_the_answer_of_their_original(tmp_path, mock_server):
+    answers = iter(f"answer {index}" for index in range(100))
+    mock_server.responder = lambda messages: next(answers)
+    video = write_video(tmp_path / 'line.avi')
+    config = Config(api_key='test-key', image_dir=str(tmp_path), base_url=mock_server.base_url)
+    classifier = VideoClassifier(config, 'gpt-4o', 'Classify', frames_config={'method': 'fps', 'params': {'fps': 2}})
+
+    records = classifier.classify_videos([video], output_dir=str(tmp_path / 'predictions'))[video]
+
+    assert [record["frame_index"] for record in records] == [0, 5, 10, 15, 20, 25]
+    assert [record["duplicate_of"] for record in records] == [None, 0, None, 10, None, 20]
+    assert mock_server.completion_count == 3
+    by_index = {record["frame_index"]: record for record in records}
+    for record in records:
+        original = by_index[record["duplicate_of"] if record["duplicate_of"] is not None else record["frame_index"]]
+        assert record["prediction"] == original["prediction"]
+    assert len({record["prediction"] for record in records}) == 3
+
+    with open(classifier.output_path(video, str(tmp_path / 'predictions'))) as f:
+        assert [json.loads(line) for line in f] == records
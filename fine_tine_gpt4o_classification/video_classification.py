@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import base64
+import asyncio
+from typing import List, Optional
+import cv2
+import numpy as np
+from openai import AsyncOpenAI
+from batch_classification import BatchClassifier
+from image_utils import estimate_image_tokens, target_size
+from test_image_classification import MAX_TOKENS, Config
+
+# Frames come from the cortalv2i extractor, by default the checkout in the sibling directory
+CORTALV2I_ROOT = os.path.abspath(os.environ.get(
+    'CORTALV2I_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cortalv2i')))
+if not os.path.isdir(os.path.join(CORTALV2I_ROOT, 'cortalv2i')):
+    raise ImportError(f"cortalv2i not found in {CORTALV2I_ROOT}, set CORTALV2I_ROOT to the directory "
+                      f"that contains the cortalv2i package")
+if CORTALV2I_ROOT not in sys.path:
+    sys.path.insert(0, CORTALV2I_ROOT)
+from cortalv2i.core.video_processor import iter_frames
+
+# Same quality Pillow uses by default, so frames look like the images the model was tuned on
+JPEG_QUALITY = 75
+# Frames are compared on a grayscale copy this wide, split into tiles of TILE_SIZE pixels. A frame is
+# skipped only when no tile's mean absolute difference to the last classified frame exceeds
+# MAX_TILE_DIFFERENCE gray levels, so a small defect appearing in one region still gets classified.
+SIGNATURE_WIDTH = 128
+TILE_SIZE = 8
+MAX_TILE_DIFFERENCE = 4.0
+DEFAULT_FRAMES_CONFIG = {'method': 'fps', 'params': {'fps': 1.0}}
+
+def frame_signature(frame: np.ndarray) -> np.ndarray:
+    """Small grayscale copy of a BGR frame used to compare it with other frames"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    size = (SIGNATURE_WIDTH, max(1, round(SIGNATURE_WIDTH * height / width)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def tile_difference(a: np.ndarray, b: np.ndarray, tile_size: int = TILE_SIZE) -> float:
+    """Largest mean absolute difference of any tile between two signatures"""
+    diff = np.abs(a - b)
+    height, width = diff.shape
+    tiles = cv2.resize(diff, (max(1, width // tile_size), max(1, height // tile_size)),
+                       interpolation=cv2.INTER_AREA)
+    return float(tiles.max())
+
+def frame_to_base64(frame: np.ndarray) -> str:
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode frame as JPEG")
+    return base64.b64encode(buffer.tobytes()).decode('utf-8')
+
+class VideoClassifier(BatchClassifier):
+    """
+    Classify the frames of videos in one streaming pass.
+
+    Frames are sampled by cortalv2i.iter_frames, already resized to the size the
+    model reads images at, and each one is JPEG encoded once in memory. A frame
+    whose tiles all differ from the last classified frame by at most
+    max_tile_difference is not sent, it takes over that frame's answer. Requests
+    share the concurrency and rate limits of BatchClassifier, and every video
+    gets its own JSONL file of (frame_index, timestamp, prediction) records in
+    frame order.
+    """
+    def __init__(self, config: Config, model: str, instruction_prompt: str, frames_config: Optional[dict] = None,
+                 max_tile_difference: Optional[float] = MAX_TILE_DIFFERENCE, decode_workers: int = 2, **kwargs):
+        super().__init__(config, model, instruction_prompt, **kwargs)
+        self.frames_config = dict(frames_config or DEFAULT_FRAMES_CONFIG)
+        # None sends every sampled frame
+        self.max_tile_difference = max_tile_difference
+        self.decode_workers = decode_workers
+
+    def frame_resolution(self, video_path: str) -> Optional[str]:
+        """cortalv2i resolution setting that yields frames at the classification size"""
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video file: {video_path}")
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        finally:
+            cap.release()
+        if not width or not height:
+            return None
+        size = target_size(width, height, self.max_edge, self.short_side)
+        return None if size == (width, height) else f"{size[0]}*{size[1]}"
+
+    def next_frame(self, frames, state: dict):
+        """
+        Pull sampled frames until one has to be classified, runs in a worker thread.
+
+        Returns (record, base64_image, estimated_tokens) for the frame to send, a
+        record with duplicate_of set for a skipped frame, or None at the end.
+        """
+        item = next(frames, None)
+        if item is None:
+            return None
+        frame_index, timestamp, frame = item
+        record = self.new_record(video=state["video"], frame_index=frame_index, timestamp=round(timestamp, 3),
+                                 duplicate_of=None)
+
+        if self.max_tile_difference is not None:
+            signature = frame_signature(frame)
+            if state["last_signature"] is not None and \
+                    tile_difference(signature, state["last_signature"]) <= self.max_tile_difference:
+                record["duplicate_of"] = state["last_index"]
+                return record, None, 0
+            state["last_signature"], state["last_index"] = signature, frame_index
+
+        height, width = frame.shape[:2]
+        estimated_tokens = self.prompt_tokens + estimate_image_tokens(width, height) + MAX_TOKENS
+        return record, frame_to_base64(frame), estimated_tokens
+
+    async def classify_frame(self, client: AsyncOpenAI, record: dict, base64_image: str, estimated_tokens: int):
+        async with self._slots:
+            try:
+                await self.classify_payload(client, base64_image, estimated_tokens, record)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    async def classify_video_frames(self, client: AsyncOpenAI, video_path: str, output_file: str) -> List[dict]:
+        config = dict(self.frames_config, resolution=self.frame_resolution(video_path))
+        frames = iter_frames(video_path, config, max_workers=self.decode_workers)
+        state = {"video": video_path, "last_signature": None, "last_index": None}
+        records, pending = [], set()
+        # Bounds the encoded frames waiting for a request slot when decoding is faster than the API
+        max_pending = self.max_concurrency * 2
+
+        def finish(done):
+            for task in done:
+                record = task.result()
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                status = record["prediction"] if record["error"] is None else f"failed ({record['error']})"
+                print(f"{os.path.basename(video_path)} @ {record['timestamp']:.2f}s: {status}")
+
+        try:
+            with open(output_file, 'w') as f:
+                while True:
+                    item = await asyncio.to_thread(self.next_frame, frames, state)
+                    if item is None:
+                        break
+                    record, base64_image, estimated_tokens = item
+                    records.append(record)
+                    if base64_image is None:
+                        continue
+
+                    pending.add(asyncio.create_task(self.classify_frame(client, record, base64_image,
+                                                                        estimated_tokens)))
+                    if len(pending) >= max_pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        finish(done)
+                if pending:
+                    done, _ = await asyncio.wait(pending)
+                    finish(done)
+        finally:
+            frames.close()
+            for task in pending:
+                task.cancel()
+
+        # Skipped frames take over the answer of the frame they duplicate
+        by_index = {record["frame_index"]: record for record in records}
+        for record in records:
+            if record["duplicate_of"] is not None:
+                source = by_index[record["duplicate_of"]]
+                record["prediction"], record["error"] = source["prediction"], source["error"]
+
+        # The file was written in completion order, rewrite it in frame order with the skipped frames
+        tmp_file = f"{output_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp_file, output_file)
+        return records
+
+    def output_path(self, video_path: str, output_dir: str) -> str:
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        return os.path.join(output_dir, f"{name}.predictions.jsonl")
+
+    async def classify_video_files(self, video_paths: List[str], output_dir: str) -> dict:
+        self.reset_limits()
+        os.makedirs(output_dir, exist_ok=True)
+        results = {}
+        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        try:
+            for video_path in video_paths:
+                results[video_path] = await self.classify_video_frames(
+                    client, video_path, self.output_path(video_path, output_dir))
+        finally:
+            await client.close()
+        return results
+
+    def classify_videos(self, video_paths: List[str], output_dir: str = "video_predictions") -> dict:
+        """Classify every video, returns the frame records of each one"""
+        results = asyncio.run(self.classify_video_files(video_paths, output_dir))
+        for video_path, records in results.items():
+            sent = sum(1 for record in records if record["duplicate_of"] is None)
+            failed = sum(1 for record in records if record["error"])
+            print(f"\n{video_path}: {len(records)} frames, {sent} classified, {len(records) - sent} skipped as "
+                  f"duplicates, {failed} failed, results in {self.output_path(video_path, output_dir)}")
+        return results
+
+if __name__ == "__main__":
+
+    api_key = '{Insert API key here}'
+    config = Config(api_key=api_key, image_dir="videos")
+    model = 'gpt-4o'  # Insert custom fine-tuned model id
+
+    classes = ['pitted_surface', 'inclusion', 'crazing', 'unclear']
+    instruction_prompt = (
+            "You are an inspection assistant for a manufacturing plant. "
+            "Analyze the provided image of steel surfaces and classify it based on the kind of defect. "
+            f"There are four classes: {classes}. "
+            "You must always return only one option from that list."
+            "If you are not sure, choose 'unclear'."
+        )
+
+    # Same options as the 'frames' section of the cortalv2i config, resolution is set automatically
+    frames_config = {'method': 'fps', 'params': {'fps': 2.0}}
+    classifier = VideoClassifier(config, model, instruction_prompt, frames_config=frames_config,
+                                 max_concurrency=8, requests_per_minute=500, tokens_per_minute=30000)
+    video_paths = [os.path.join(config.image_dir, file) for file in sorted(os.listdir(config.image_dir))
+                   if file.lower().endswith(('.mp4', '.mov', '.avi', '.mkv'))]
+    classifier.classify_videos(video_paths, output_dir="video_predictions")